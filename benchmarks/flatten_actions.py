@@ -0,0 +1,54 @@
+"""Times pivoting insights action lists into columns: the 'flat' and 'columnar'
+insights formats (_flatten_insights_rows and _to_columnar).
+
+Usage:
+    python benchmarks/flatten_actions.py [--rows 100000] [--action-types 4] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.argv = sys.argv[:1] + ['--fb-token', 'BENCHMARK_TOKEN', '--no-snapshot'] + sys.argv[1:]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server  # noqa: E402
+
+ACTION_TYPES = ['purchase', 'link_click', 'view_content', 'add_to_cart', 'lead', 'landing_page_view',
+                'initiate_checkout', 'complete_registration']
+
+
+def build_rows(row_count: int, action_type_count: int) -> list:
+    action_types = ACTION_TYPES[:action_type_count]
+    return [{
+        'ad_id': str(10 ** 12 + i), 'spend': f"{i % 97 + 0.5:.2f}", 'impressions': str(i % 1000 + 1),
+        'date_start': '2024-01-01', 'date_stop': '2024-01-01',
+        'actions': [{'action_type': t, 'value': str(i % 7 + 1)} for t in action_types],
+        'action_values': [{'action_type': 'purchase', 'value': f"{i % 50 + 0.25:.2f}"}],
+    } for i in range(row_count)]
+
+
+def best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--action-types', type=int, default=4, choices=range(1, len(ACTION_TYPES) + 1))
+    parser.add_argument('--repeat', type=int, default=3)
+    args, _ = parser.parse_known_args()
+
+    rows = build_rows(args.rows, args.action_types)
+    print(f"{args.rows} rows, {args.action_types} action types each")
+    print(f"pivot only  {best_of(args.repeat, lambda: server._pivot_action_lists(rows)):6.3f} s")
+    print(f"flat        {best_of(args.repeat, lambda: server._flatten_insights_rows(rows)):6.3f} s")
+    print(f"columnar    {best_of(args.repeat, lambda: server._to_columnar(rows)):6.3f} s")
+
+
+if __name__ == '__main__':
+    main()
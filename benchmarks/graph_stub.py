@@ -0,0 +1,61 @@
+"""A minimal local stand-in for the Graph API, used by the benchmarks.
+
+Every /insights request returns one page of ad-level rows (no paging), any other
+path an empty listing. GET /count returns the number of requests served so far.
+
+Usage:
+    python benchmarks/graph_stub.py [--port 9900] [--rows 2000]
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def build_insights_page(row_count: int) -> bytes:
+    return json.dumps({'data': [{
+        'account_id': '1', 'campaign_id': str(i % 50), 'ad_id': str(i),
+        'impressions': str(i * 10), 'clicks': str(i), 'spend': f"{i * 0.37:.2f}",
+        'date_start': '2024-01-01', 'date_stop': '2024-01-31',
+        'actions': [{'action_type': 'link_click', 'value': str(i)}, {'action_type': 'purchase', 'value': '1'}],
+    } for i in range(row_count)]}).encode('utf-8')
+
+
+def make_server(port: int, row_count: int) -> ThreadingHTTPServer:
+    insights_page = build_insights_page(row_count)
+    served = {'requests': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                served['requests'] += 1
+            if self.path.startswith('/count'):
+                body = json.dumps(served).encode('utf-8')
+            elif '/insights' in self.path:
+                body = insights_page
+            else:
+                body = b'{"data": []}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('x-app-usage', json.dumps({'call_count': 1, 'total_cputime': 1, 'total_time': 1}))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ThreadingHTTPServer(('127.0.0.1', port), Handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=9900)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+    make_server(args.port, args.rows).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
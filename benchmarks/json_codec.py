@@ -0,0 +1,52 @@
+"""Times decoding and encoding an insights-shaped payload with the stdlib json
+module and with the server's codec (_json_loads/_json_dumps, orjson when installed).
+
+Usage:
+    python benchmarks/json_codec.py [--rows 50000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.argv = sys.argv[:1] + ['--fb-token', 'BENCHMARK_TOKEN', '--no-snapshot'] + sys.argv[1:]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server  # noqa: E402
+
+
+def build_payload(row_count: int) -> dict:
+    return {'data': [{
+        'ad_id': str(10 ** 12 + i), 'age': '25-34', 'spend': '12.34', 'impressions': '1000',
+        'date_start': '2024-01-01', 'date_stop': '2024-01-01',
+        'actions': [{'action_type': t, 'value': '3'} for t in ('purchase', 'link_click', 'view_content')],
+    } for i in range(row_count)]}
+
+
+def best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args, _ = parser.parse_known_args()
+
+    payload = build_payload(args.rows)
+    body = json.dumps(payload).encode('utf-8')
+    codec = 'orjson' if server.orjson is not None else 'stdlib (orjson not installed)'
+    print(f"{args.rows} rows, {len(body) / 1e6:.1f} MB; server codec: {codec}")
+    print(f"decode  stdlib {best_of(args.repeat, lambda: json.loads(body)):6.3f} s"
+          f"  server {best_of(args.repeat, lambda: server._json_loads(body)):6.3f} s")
+    print(f"encode  stdlib {best_of(args.repeat, lambda: json.dumps(payload)):6.3f} s"
+          f"  server {best_of(args.repeat, lambda: server._json_dumps(payload)):6.3f} s")
+
+
+if __name__ == '__main__':
+    main()
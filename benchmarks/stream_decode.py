@@ -0,0 +1,84 @@
+"""Compares decoding one large insights page with response.json() and with the
+incremental decoder (_stream_graph_page): peak traced memory and wall time.
+
+No network access is needed; requests.get is replaced by an in-memory response.
+
+Usage:
+    python benchmarks/stream_decode.py [--rows 60000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.argv = sys.argv[:1] + ['--fb-token', 'BENCHMARK_TOKEN', '--no-snapshot'] + sys.argv[1:]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server  # noqa: E402
+
+ACTION_TYPES = ['purchase', 'link_click', 'view_content', 'add_to_cart']
+
+
+class InMemoryResponse:
+    """The parts of requests.Response used by the server, serving a fixed body."""
+
+    def __init__(self, body: bytes):
+        self.content = body
+        self.status_code = 200
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_body(row_count: int) -> bytes:
+    rows = [{
+        'ad_id': str(10 ** 12 + i), 'age': '25-34', 'gender': 'female', 'spend': '12.34',
+        'impressions': '1000', 'date_start': '2024-01-01', 'date_stop': '2024-01-01',
+        'actions': [{'action_type': action_type, 'value': '3'} for action_type in ACTION_TYPES],
+    } for i in range(row_count)]
+    return json.dumps({'data': rows, 'paging': {'cursors': {'after': 'x'}}}).encode('utf-8')
+
+
+def measure(name: str, decode) -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = decode()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:18s} rows={rows} peak={peak / 1e6:7.1f} MB time={elapsed:6.2f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=60000)
+    args, _ = parser.parse_known_args()
+
+    body = build_body(args.rows)
+    server.requests.get = lambda *args, **kwargs: InMemoryResponse(body)
+    url = f"{server.FB_GRAPH_URL}/act_1/insights"
+    print(f"body {len(body) / 1e6:.1f} MB")
+    measure('response.json()', lambda: len(server._make_graph_api_call(url, {})['data']))
+    measure('streamed rows', lambda: sum(1 for _ in server._stream_graph_page(url, {})))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Measures tool call throughput of the SSE server with different --workers counts.
+
+Starts benchmarks/graph_stub.py as the Graph API, then for each worker count runs
+server.py with --transport sse --graph-url pointing at the stub and has several
+MCP clients call get_adaccount_insights concurrently. The same query is repeated,
+so after the first call the work is mostly decoding cached responses and shaping
+results, which is what extra workers spread over cores. Throughput can only grow
+with the worker count up to the number of CPU cores available.
+
+Usage:
+    python benchmarks/worker_pool.py [--workers 1,2,4] [--clients 8] [--calls 10] [--rows 2000] [--port 8700]
+
+The server listens on --port and its workers on the ports right after it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_PATH = os.path.join(BENCHMARK_DIR, '..', 'server.py')
+START_TIMEOUT_SECONDS = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_ports(ports, timeout: float = START_TIMEOUT_SECONDS) -> None:
+    deadline = time.time() + timeout
+    for port in ports:
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"Nothing listening on port {port} after {timeout} s")
+                time.sleep(0.2)
+
+
+async def run_client(url: str, calls: int, arguments: dict) -> None:
+    async with sse_client(url) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(calls):
+                result = await session.call_tool('get_adaccount_insights', arguments)
+                if result.isError:
+                    raise RuntimeError(result.content[0].text[:300])
+
+
+async def run_load(url: str, clients: int, calls: int) -> float:
+    arguments = {'act_id': 'act_1', 'fields': ['impressions', 'clicks', 'spend', 'actions'], 'level': 'ad'}
+    # One call first, so every measured call finds the response in the shared cache
+    await run_client(url, 1, arguments)
+    started = time.perf_counter()
+    await asyncio.gather(*[run_client(url, calls, arguments) for _ in range(clients)])
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--calls', type=int, default=10, help='calls per client')
+    parser.add_argument('--rows', type=int, default=2000, help='rows per insights response')
+    parser.add_argument('--port', type=int, default=8700)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU cores, {args.clients} clients x {args.calls} calls, {args.rows} rows per response")
+    stub_port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join(BENCHMARK_DIR, 'graph_stub.py'),
+                             '--port', str(stub_port), '--rows', str(args.rows)])
+    try:
+        wait_for_ports([stub_port])
+        for workers in [int(count) for count in args.workers.split(',')]:
+            with tempfile.TemporaryDirectory() as state_dir:
+                pool = subprocess.Popen(
+                    [sys.executable, SERVER_PATH, '--fb-token', 'BENCHMARK_TOKEN', '--no-snapshot',
+                     '--state-dir', state_dir, '--graph-url', f"http://127.0.0.1:{stub_port}/v22.0",
+                     '--transport', 'sse', '--port', str(args.port), '--workers', str(workers)],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+                try:
+                    worker_ports = range(args.port + 1, args.port + 1 + workers) if workers > 1 else []
+                    wait_for_ports([args.port, *worker_ports])
+                    seconds = asyncio.run(run_load(f"http://127.0.0.1:{args.port}/sse", args.clients, args.calls))
+                finally:
+                    pool.terminate()
+                    pool.wait()
+            calls = args.clients * args.calls
+            print(json.dumps({'workers': workers, 'calls': calls, 'seconds': round(seconds, 2),
+                              'calls_per_second': round(calls / seconds, 2)}))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,205 +1,4515 @@
 # server.py
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 import requests
 from typing import Dict, List, Optional, Any
+import asyncio
+import atexit
+import codecs
+import csv
+import gzip
+import hashlib
+import heapq
+import itertools
 import json
+import math
+import mimetypes
+import os
+import re
 import requests
+import shutil
+import signal
+import sqlite3
+import subprocess
 import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from contextlib import contextmanager, nullcontext
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse
+from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
 
+try:
+    import orjson
+except ImportError: # Faster JSON decoding/encoding is optional
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError: # Parquet export is optional
+    pyarrow = None
+
+try:
+    import fcntl
+except ImportError: # Not on Windows, where activity logs are only locked within a process
+    fcntl = None
+
+    
+
+# --- Constants ---
+FB_API_VERSION = "v22.0"
+FB_GRAPH_URL = f"https://graph.facebook.com/{FB_API_VERSION}"
+DEFAULT_AD_ACCOUNT_FIELDS = [
+    'name', 'business_name', 'age', 'account_status', 'balance',
+    'amount_spent', 'attribution_spec', 'account_id', 'business',
+    'business_city', 'brand_safety_content_filter_levels', 'currency',
+    'created_time', 'id'
+]
+
+# Create an MCP server
+mcp = FastMCP("fb-api-mcp-server")
+
+# Add a global variable to store the token
+FB_ACCESS_TOKEN = None
+
+# Directory for locally persisted state (checkpoints, logs); override with --state-dir
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".fb-ads-mcp-server")
+STATE_DIR = None
+
+# --- Helper Functions ---
+
+def _get_fb_access_token() -> str:
+    """
+    Get Facebook access token from command line arguments.
+    Caches the token in memory after first read.
+
+    Returns:
+        str: The Facebook access token.
+
+    Raises:
+        Exception: If no token is provided in command line arguments.
+    """
+    global FB_ACCESS_TOKEN
+    if FB_ACCESS_TOKEN is None:
+        # Look for --fb-token argument
+        if "--fb-token" in sys.argv:
+            token_index = sys.argv.index("--fb-token") + 1
+            if token_index < len(sys.argv):
+                FB_ACCESS_TOKEN = sys.argv[token_index]
+                print(f"Using Facebook token from command line arguments")
+            else:
+                raise Exception("--fb-token argument provided but no token value followed it")
+        else:
+            raise Exception("Facebook token must be provided via '--fb-token' command line argument")
+
+    return FB_ACCESS_TOKEN
+
+def _token_id() -> str:
+    """Returns a short hash identifying the access token without revealing it."""
+    return hashlib.sha256(_get_fb_access_token().encode('utf-8')).hexdigest()[:16]
+
+def _get_state_dir(*subdirs: str) -> str:
+    """
+    Get the directory used for locally persisted state, creating it if needed.
+    Uses the '--state-dir' command line argument when given, else DEFAULT_STATE_DIR.
+
+    Args:
+        *subdirs: Optional path components appended to the state directory.
+
+    Returns:
+        str: The absolute path of the (sub)directory.
+    """
+    global STATE_DIR
+    if STATE_DIR is None:
+        if "--state-dir" in sys.argv:
+            dir_index = sys.argv.index("--state-dir") + 1
+            if dir_index < len(sys.argv):
+                STATE_DIR = os.path.abspath(sys.argv[dir_index])
+            else:
+                raise Exception("--state-dir argument provided but no directory followed it")
+        else:
+            STATE_DIR = DEFAULT_STATE_DIR
+
+    path = os.path.join(STATE_DIR, *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _load_json_file(path: str, default: Any) -> Any:
+    """Reads a JSON state file, returning `default` if it does not exist yet."""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_json_file(path: str, data: Any) -> None:
+    """Atomically writes a JSON state file so a crash never leaves it half-written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _json_loads(data: Any) -> Any:
+    """Decodes JSON text or bytes with orjson when installed, else with the stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj: Any) -> str:
+    """Encodes an object as compact JSON text with orjson when installed, else with the stdlib.
+
+    Output is not byte-identical between the two, so anything used as a persisted
+    key (cache keys, dedup keys) keeps using json.dumps directly.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, default=str, separators=(',', ':'))
+
+def _make_graph_api_call(url: str, params: Dict[str, Any]) -> Dict:
+    """Makes a GET request to the Facebook Graph API and handles the response.
+
+    Page timings feed the adaptive pager, and requests rejected with "Please reduce the
+    amount of data" are retried in smaller pieces (see `_retry_reduced_query`). Calls
+    fail fast with CircuitOpenError while a matching circuit breaker is open, and with
+    KnownBadObjectError for objects recently reported as deleted or inaccessible.
+    A call identical to one already in flight shares that call's response.
+    """
+    return _singleflight(('graph', _cache_key(url, params)), lambda: _call_graph_api(url, params))
+
+def _call_graph_api(url: str, params: Dict[str, Any]) -> Dict:
+    """Sends one Graph API request for `_make_graph_api_call`."""
+    object_id = _negative_cache_check(url, params)
+    breaker_keys = _breaker_before_request(url)
+    try:
+        started = time.monotonic()
+        try:
+            response = requests.get(url, params=params)
+            _record_rate_usage(url, response.headers)
+            response.raise_for_status()  # Raises HTTPError for bad responses (4xx or 5xx)
+        except requests.exceptions.RequestException as e:
+            _breaker_record(breaker_keys, e)
+            _negative_cache_record(object_id, params, e)
+            raise
+        _breaker_record(breaker_keys)
+        _negative_cache_record(object_id, params)
+        result = _json_loads(response.content)
+        rows = result.get('data') if isinstance(result, dict) else None
+        _record_page_stats(url, params, time.monotonic() - started, len(response.content),
+                           len(rows) if isinstance(rows, list) else None)
+        _ingest_entities(url, params, result)
+        return result
+    except requests.exceptions.RequestException as e:
+        if _is_reduce_data_error(e):
+            reduced = _retry_reduced_query(url, params)
+            if reduced is not None:
+                return reduced
+        # Log the error and re-raise or handle more gracefully
+        print(f"Error making Graph API call to {url} with params {params}: {e}")
+        # Depending on desired behavior, you might want to raise a custom exception
+        # or return a specific error structure. Re-raising keeps the current behavior.
+        raise
+
+
+def _prepare_params(base_params: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+    """Adds optional parameters to a dictionary if they are not None. Handles JSON encoding."""
+    params = base_params.copy()
+    for key, value in kwargs.items():
+        if value is not None:
+            # Parameters that need JSON encoding
+            if key in ['filtering', 'time_range', 'time_ranges', 'effective_status', 
+                       'special_ad_categories', 'objective', 
+                       'buyer_guarantee_agreement_status'] and isinstance(value, (list, dict)):
+                params[key] = json.dumps(value)
+            elif key == 'fields' and isinstance(value, list):
+                 params[key] = ','.join(value)
+            elif key == 'action_attribution_windows' and isinstance(value, list):
+                 params[key] = ','.join(value)
+            elif key == 'action_breakdowns' and isinstance(value, list):
+                 params[key] = ','.join(value)
+            elif key == 'breakdowns' and isinstance(value, list):
+                 params[key] = ','.join(value)
+            else:
+                params[key] = value
+    return params
+
+
+def _fetch_node(node_id: str, **kwargs) -> Dict:
+    """Helper to fetch a single object (node) by its ID."""
+    access_token = _get_fb_access_token()
+    url = f"{FB_GRAPH_URL}/{node_id}"
+    params = _prepare_params({'access_token': access_token}, **kwargs)
+    return _make_graph_api_call(url, params)
+
+def _fetch_edge(parent_id: str, edge_name: str, **kwargs) -> Dict:
+    """Helper to fetch a collection (edge) related to a parent object."""
+    access_token = _get_fb_access_token()
+    url = f"{FB_GRAPH_URL}/{parent_id}/{edge_name}"
+    
+    # Handle time parameters specifically for activities edge if needed
+    time_params = {}
+    if edge_name == 'activities':
+        time_range = kwargs.pop('time_range', None)
+        since = kwargs.pop('since', None)
+        until = kwargs.pop('until', None)
+        if time_range:
+            time_params['time_range'] = time_range
+        else:
+            if since: time_params['since'] = since
+            if until: time_params['until'] = until
+            
+    base_params = {'access_token': access_token}
+    params = _prepare_params(base_params, **kwargs)
+    params.update(_prepare_params({}, **time_params)) # Add specific time params
+
+    return _make_graph_api_call(url, params)
+
+
+def _default_insights_level(object_id: str, level: Optional[str]) -> Optional[str]:
+    """Returns the level an insights query runs at, filling in 'account' for ad accounts
+    so that queries with and without an explicit account level share one cache key."""
+    if level is None and str(object_id).startswith('act_'):
+        return 'account'
+    return level
+
+
+def _build_insights_params(
+    params: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    date_preset: Optional[str] = None,
+    time_range: Optional[Dict[str, str]] = None,
+    time_ranges: Optional[List[Dict[str, str]]] = None,
+    time_increment: Optional[str] = None,
+    level: Optional[str] = None,
+    action_attribution_windows: Optional[List[str]] = None,
+    action_breakdowns: Optional[List[str]] = None,
+    action_report_time: Optional[str] = None,
+    breakdowns: Optional[List[str]] = None,
+    default_summary: bool = False,
+    use_account_attribution_setting: bool = False,
+    use_unified_attribution_setting: bool = True,
+    filtering: Optional[List[dict]] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    offset: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    locale: Optional[str] = None
+) -> Dict[str, Any]:
+    """Builds the common parameter dictionary for insights API calls."""
     
+    # Use the generic parameter builder first
+    params = _prepare_params(
+        params,
+        fields=fields,
+        level=level,
+        action_attribution_windows=action_attribution_windows,
+        action_breakdowns=action_breakdowns,
+        action_report_time=action_report_time,
+        breakdowns=breakdowns,
+        filtering=filtering,
+        sort=sort,
+        limit=limit,
+        after=after,
+        before=before,
+        offset=offset,
+        locale=locale
+    )
+
+    # Handle time parameters (specific logic for insights)
+    time_params_provided = time_range or time_ranges or since or until
+    if not time_params_provided and date_preset:
+        params['date_preset'] = date_preset
+    if time_range:
+        params['time_range'] = json.dumps(time_range)
+    if time_ranges:
+        params['time_ranges'] = json.dumps(time_ranges)
+    if time_increment and time_increment != 'all_days': # API default is all_days
+        params['time_increment'] = time_increment
+        
+    # Time-based pagination (only if specific time range isn't set)
+    if not time_range and not time_ranges:
+        if since:
+            params['since'] = since
+        if until:
+            params['until'] = until
+
+    # Boolean flags need specific handling ('true'/'false' strings)
+    if default_summary:
+        params['default_summary'] = 'true'
+    if use_account_attribution_setting:
+        params['use_account_attribution_setting'] = 'true'
+    # Only add unified if True (it defaults to False in API if omitted)
+    if use_unified_attribution_setting:
+        params['use_unified_attribution_setting'] = 'true'
+
+    return params
+
+
+
+# --- Adaptive Paging ---
+# Page sizes for auto-paginated requests are tuned per endpoint family from the
+# observed response time and size of earlier pages. When Graph rejects a request
+# with "Please reduce the amount of data you're asking for" (error code 1), the
+# request is retried with half the page size, then, for insights, by splitting a
+# daily time range or the field list in two and merging the halves.
+
+ADAPTIVE_PAGE_DEFAULT_LIMIT = 100
+ADAPTIVE_PAGE_MIN_LIMIT = 10
+ADAPTIVE_PAGE_MAX_LIMIT = 1000
+ADAPTIVE_PAGE_TARGET_SECONDS = 5.0
+ADAPTIVE_PAGE_TARGET_BYTES = 4 * 1024 * 1024
+INSIGHTS_JOIN_FIELDS = ['date_start', 'date_stop', 'account_id', 'campaign_id', 'adset_id', 'ad_id']
+INSIGHTS_LEVEL_ID_FIELDS = {'account': 'account_id', 'campaign': 'campaign_id', 'adset': 'adset_id', 'ad': 'ad_id'}
+GRAPH_EDGE_FAMILIES = ['insights', 'activities', 'campaigns', 'adsets', 'ads', 'adcreatives', 'previews']
+
+# endpoint family -> current page size
+_ADAPTIVE_PAGE_LIMITS: Dict[str, int] = {}
+# endpoint family -> smallest page size Graph has rejected as too much data
+_ADAPTIVE_PAGE_CEILINGS: Dict[str, int] = {}
+
+
+def _endpoint_family(url: str) -> str:
+    """Classifies a Graph API URL by the edge it reads ('insights', 'ads', ...) or 'node'."""
+    last_segment = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+    return last_segment if last_segment in GRAPH_EDGE_FAMILIES else 'node'
+
+
+def _split_url_query(url: str, params: Dict[str, Any]):
+    """Moves the query string of a URL (e.g. a 'paging.next' link) into a params dict."""
+    parsed = urlparse(url)
+    merged = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+    merged.update(params or {})
+    return parsed._replace(query='').geturl(), merged
+
+
+def _adaptive_page_limit(family: str) -> int:
+    """Returns the current tuned page size for an endpoint family."""
+    return _ADAPTIVE_PAGE_LIMITS.get(family, ADAPTIVE_PAGE_DEFAULT_LIMIT)
+
+
+def _record_page_stats(url: str, params: Dict[str, Any], elapsed: float, size: int, rows: Optional[int]) -> None:
+    """Shrinks the family's page size after slow or large pages, grows it after fast full ones."""
+    limit = params.get('limit') or parse_qs(urlparse(url).query).get('limit', [None])[0]
+    if not limit:
+        return
+    limit = int(limit)
+    family = _endpoint_family(url)
+    if elapsed > ADAPTIVE_PAGE_TARGET_SECONDS or size > ADAPTIVE_PAGE_TARGET_BYTES:
+        _ADAPTIVE_PAGE_LIMITS[family] = max(ADAPTIVE_PAGE_MIN_LIMIT, limit // 2)
+    elif (rows is not None and rows >= limit
+          and elapsed < ADAPTIVE_PAGE_TARGET_SECONDS / 4 and size < ADAPTIVE_PAGE_TARGET_BYTES / 4):
+        ceiling = _ADAPTIVE_PAGE_CEILINGS.get(family, ADAPTIVE_PAGE_MAX_LIMIT + 1) - 1
+        _ADAPTIVE_PAGE_LIMITS[family] = max(limit, min(ADAPTIVE_PAGE_MAX_LIMIT, ceiling, limit * 2))
+
+
+def _graph_error(e: requests.exceptions.RequestException) -> Dict[str, Any]:
+    """Extracts the Graph API 'error' object from a failed request, if there is one."""
+    response = getattr(e, 'response', None)
+    if response is None:
+        return {}
+    try:
+        return _json_loads(response.content).get('error', {}) or {}
+    except (ValueError, AttributeError):
+        return {}
+
+
+def _is_reduce_data_error(e: requests.exceptions.RequestException) -> bool:
+    """True for Graph's "Please reduce the amount of data you're asking for" error."""
+    error = _graph_error(e)
+    return error.get('code') == 1 or 'reduce the amount of data' in str(error.get('message', '')).lower()
+
+
+def _collect_all_rows(url: str, params: Dict[str, Any]) -> List[Dict]:
+    """Fetches every page of a collection into a list, with reduce-data handling per page."""
+    rows = []
+    page = _make_graph_api_call(url, params)
+    while True:
+        rows.extend(page.get('data', []))
+        next_url = page.get('paging', {}).get('next')
+        if not next_url:
+            return rows
+        page = _make_graph_api_call(next_url, {})
+
+
+def _retry_reduced_query(url: str, params: Dict[str, Any]) -> Optional[Dict]:
+    """Retries a query rejected as too large, or returns None if it cannot be reduced.
+
+    Tries, in order: halving 'limit'; for insights with time_increment=1, splitting the
+    time range in two; for insights, splitting the metric fields in two and joining the
+    rows back on their date, ID and breakdown fields. Split results are fully paginated
+    and returned as a single page.
+    """
+    url, params = _split_url_query(url, params)
+    family = _endpoint_family(url)
+    limit = int(params['limit']) if params.get('limit') else None
+    if limit and limit > ADAPTIVE_PAGE_MIN_LIMIT:
+        smaller = max(ADAPTIVE_PAGE_MIN_LIMIT, limit // 2)
+        _ADAPTIVE_PAGE_LIMITS[family] = min(_adaptive_page_limit(family), smaller)
+        _ADAPTIVE_PAGE_CEILINGS[family] = min(_ADAPTIVE_PAGE_CEILINGS.get(family, limit), limit)
+        print(f"Graph asked to reduce data for {url}; retrying with limit={smaller}", file=sys.stderr)
+        return _make_graph_api_call(url, {**params, 'limit': smaller})
+    if family != 'insights':
+        return None
+
+    time_range = json.loads(params['time_range']) if params.get('time_range') else None
+    if time_range and str(params.get('time_increment')) == '1' and time_range['since'] < time_range['until']:
+        since = datetime.strptime(time_range['since'], '%Y-%m-%d').date()
+        until = datetime.strptime(time_range['until'], '%Y-%m-%d').date()
+        middle = since + timedelta(days=(until - since).days // 2)
+        print(f"Graph asked to reduce data for {url}; splitting {since}..{until} at {middle}", file=sys.stderr)
+        rows = []
+        for part in ({'since': since.isoformat(), 'until': middle.isoformat()},
+                     {'since': (middle + timedelta(days=1)).isoformat(), 'until': until.isoformat()}):
+            rows.extend(_collect_all_rows(url, {**params, 'time_range': json.dumps(part)}))
+        return {'data': rows, 'paging': {}}
+
+    fields = params.get('fields', '').split(',') if params.get('fields') else []
+    join_fields = [f for f in INSIGHTS_JOIN_FIELDS if f in fields]
+    level_id = INSIGHTS_LEVEL_ID_FIELDS.get(params.get('level'))
+    if level_id and level_id not in join_fields:
+        join_fields.append(level_id)
+    metrics = [f for f in fields if f not in join_fields]
+    if len(metrics) < 2:
+        return None
+    print(f"Graph asked to reduce data for {url}; splitting {len(metrics)} fields in two", file=sys.stderr)
+    breakdowns = params['breakdowns'].split(',') if params.get('breakdowns') else []
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    half = len(metrics) // 2
+    for part in (metrics[:half], metrics[half:]):
+        for row in _collect_all_rows(url, {**params, 'fields': ','.join(join_fields + part)}):
+            key = tuple(row.get(f) for f in join_fields + ['date_start', 'date_stop'] + breakdowns)
+            merged.setdefault(key, {}).update(row)
+    dropped = [f for f in join_fields if f not in fields]
+    rows = [{k: v for k, v in row.items() if k not in dropped} for row in merged.values()]
+    return {'data': rows, 'paging': {}}
+
+
+# --- Circuit Breakers ---
+# One breaker per endpoint family (insights, node reads, activities) and one per
+# ad account. A breaker opens when too many recent requests failed with server,
+# network or throttling errors; while open, calls fail immediately with a
+# retry-after hint. After the cool-down a single trial request is let through
+# (half-open): success closes the breaker, failure re-opens it for longer.
+
+BREAKER_WINDOW_SECONDS = 60
+BREAKER_MIN_REQUESTS = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_OPEN_SECONDS = 30
+BREAKER_MAX_OPEN_SECONDS = 600
+# Graph error codes for throttling: app, user, page, custom and business use case limits
+GRAPH_THROTTLING_ERROR_CODES = {4, 17, 32, 613, 80000, 80001, 80002, 80003, 80004, 80005,
+                                80006, 80008, 80009, 80014}
+
+# breaker key -> {'state', 'outcomes': deque of (time, ok), 'opened_at', 'open_seconds', 'trial_in_flight'}
+_BREAKERS: Dict[str, Dict[str, Any]] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the Graph API while a circuit breaker is open."""
+
+    def __init__(self, key: str, retry_after: float):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(
+            f"Circuit breaker '{key}' is open after repeated Graph API failures; "
+            f"retry after {int(math.ceil(retry_after))} seconds"
+        )
+
+
+def _breaker_keys(url: str) -> List[str]:
+    """Returns the family and (if the URL names one) ad account breaker keys for a request."""
+    family = _endpoint_family(url)
+    keys = [f"family:{family if family in ('insights', 'activities') else 'node_reads'}"]
+    match = re.search(r'/(act_\d+)', url)
+    if match:
+        keys.append(f"account:{match.group(1)}")
+    return keys
+
+
+def _new_breaker() -> Dict[str, Any]:
+    return {'state': 'closed', 'outcomes': deque(), 'opened_at': None,
+            'open_seconds': BREAKER_OPEN_SECONDS, 'trial_in_flight': False}
+
+
+def _breaker_before_request(url: str) -> List[str]:
+    """Fails fast if a breaker for this request is open; claims half-open trial slots."""
+    keys = _breaker_keys(url)
+    now = time.time()
+    with _BREAKERS_LOCK:
+        breakers = [_BREAKERS.setdefault(key, _new_breaker()) for key in keys]
+        for key, breaker in zip(keys, breakers):
+            if breaker['state'] == 'closed':
+                continue
+            reopen_at = breaker['opened_at'] + breaker['open_seconds']
+            if now < reopen_at:
+                raise CircuitOpenError(key, reopen_at - now)
+            if breaker['trial_in_flight']:
+                raise CircuitOpenError(key, 1)
+        for breaker in breakers:
+            if breaker['state'] != 'closed':
+                breaker['state'] = 'half_open'
+                breaker['trial_in_flight'] = True
+    return keys
+
+
+def _is_breaker_failure(e: Exception) -> bool:
+    """True for errors that indicate Graph trouble rather than a bad request."""
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(e, 'response', None)
+    if response is None:
+        return False
+    error = _graph_error(e)
+    if error.get('code') in GRAPH_THROTTLING_ERROR_CODES or response.status_code == 429:
+        return True
+    return response.status_code >= 500 and not _is_reduce_data_error(e)
+
+
+def _throttle_retry_after(e: Exception) -> Optional[float]:
+    """Reads Graph's estimated time to regain access (in seconds) from a throttled response."""
+    response = getattr(e, 'response', None)
+    header = response.headers.get('x-business-use-case-usage') if response is not None else None
+    if not header:
+        return None
+    try:
+        usages = _json_loads(header)
+    except ValueError:
+        return None
+    minutes = [u.get('estimated_time_to_regain_access', 0) for entries in usages.values() for u in entries]
+    return max(minutes) * 60 if minutes and max(minutes) else None
+
+
+def _breaker_record(keys: List[str], error: Optional[Exception] = None) -> None:
+    """Records a request outcome on its breakers and opens or closes them as needed."""
+    failed = error is not None and _is_breaker_failure(error)
+    now = time.time()
+    with _BREAKERS_LOCK:
+        for key in keys:
+            breaker = _BREAKERS.setdefault(key, _new_breaker())
+            if breaker['state'] == 'half_open':
+                breaker['trial_in_flight'] = False
+                if failed:
+                    breaker['state'], breaker['opened_at'] = 'open', now
+                    breaker['open_seconds'] = min(BREAKER_MAX_OPEN_SECONDS, breaker['open_seconds'] * 2)
+                else:
+                    breaker.update(_new_breaker())
+                continue
+            outcomes = breaker['outcomes']
+            outcomes.append((now, not failed))
+            while outcomes and outcomes[0][0] < now - BREAKER_WINDOW_SECONDS:
+                outcomes.popleft()
+            failures = sum(1 for _, ok in outcomes if not ok)
+            if len(outcomes) >= BREAKER_MIN_REQUESTS and failures / len(outcomes) >= BREAKER_ERROR_RATE:
+                breaker['state'], breaker['opened_at'] = 'open', now
+                retry_after = _throttle_retry_after(error) if failed else None
+                if retry_after and key.startswith('account:'):
+                    breaker['open_seconds'] = min(BREAKER_MAX_OPEN_SECONDS, retry_after)
+
+
+def _breaker_snapshot() -> Dict[str, Any]:
+    """Describes every breaker for the diagnostics tool."""
+    now = time.time()
+    with _BREAKERS_LOCK:
+        snapshot = {}
+        for key, breaker in _BREAKERS.items():
+            recent = [ok for t, ok in breaker['outcomes'] if t >= now - BREAKER_WINDOW_SECONDS]
+            entry = {
+                'state': breaker['state'],
+                'recent_requests': len(recent),
+                'recent_failures': recent.count(False),
+            }
+            if breaker['state'] != 'closed':
+                entry['retry_after_seconds'] = max(0, int(breaker['opened_at'] + breaker['open_seconds'] - now))
+            snapshot[key] = entry
+        return snapshot
+
+
+# --- Request Coalescing ---
+# Identical reads issued while one is already in flight (e.g. a tool call racing
+# the start-up warm-up) wait for that request and share its result instead of
+# sending a duplicate.
+
+# key -> {'done': Event, 'result', 'error', 'thread': ident of the loading thread}
+_IN_FLIGHT: Dict[Any, Dict[str, Any]] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+_COALESCED_CALLS = 0
+
+
+def _singleflight(key: Any, load):
+    """Runs `load()` unless a call with the same key is in flight, in which case it
+    waits for that call and returns its result (or raises its error)."""
+    global _COALESCED_CALLS
+    with _IN_FLIGHT_LOCK:
+        call = _IN_FLIGHT.get(key)
+        if call is None:
+            call = _IN_FLIGHT[key] = {
+                'done': threading.Event(), 'result': None, 'error': None,
+                'thread': threading.get_ident(),
+            }
+            leader = True
+        else:
+            leader = False
+            # A nested call with the same key from the loading thread would wait on itself
+            if call['thread'] == threading.get_ident():
+                call = None
+            else:
+                _COALESCED_CALLS += 1
+    if call is None:
+        return load()
+    if not leader:
+        call['done'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+    try:
+        call['result'] = load()
+        return call['result']
+    except Exception as e:
+        call['error'] = e
+        raise
+    finally:
+        with _IN_FLIGHT_LOCK:
+            _IN_FLIGHT.pop(key, None)
+        call['done'].set()
+
+
+# --- Shared Cache ---
+# Opt-in (--shared-cache) SQLite database in WAL mode under the state directory,
+# shared by every server process on the machine that uses the same state
+# directory. It holds insights responses (same keys and TTLs as the in-process
+# response cache) and account mirrors, scoped by FB_API_VERSION and access token
+# hash. A process missing a key takes a lease on it before fetching; other
+# processes poll until the value appears or the lease is released or expires, so
+# only one of them calls the Graph API. Entries carry the account and object IDs
+# they depend on so activity-driven invalidation in any process evicts them. As in
+# cache snapshots, the access token (part of cached paging URLs) is stored as a
+# placeholder and put back when an entry is read.
+
+SHARED_CACHE_ENABLED = None # Resolved from the --shared-cache argument on first use
+SHARED_CACHE_FILE = 'shared-cache.sqlite'
+SHARED_CACHE_BUSY_TIMEOUT_SECONDS = 10
+SHARED_CACHE_LEASE_SECONDS = 300 # Lets another process take over if the leaseholder dies
+SHARED_CACHE_POLL_SECONDS = 0.2
+SHARED_CACHE_PURGE_INTERVAL_SECONDS = 300
+SHARED_CACHE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS entries (
+        scope TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+        expires_at REAL NOT NULL, act_id TEXT, PRIMARY KEY (scope, key))""",
+    """CREATE TABLE IF NOT EXISTS entry_objects (
+        scope TEXT NOT NULL, key TEXT NOT NULL, object_id TEXT NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS entry_objects_by_object ON entry_objects (scope, object_id)",
+    "CREATE INDEX IF NOT EXISTS entry_objects_by_key ON entry_objects (scope, key)",
+    """CREATE TABLE IF NOT EXISTS leases (
+        scope TEXT NOT NULL, key TEXT NOT NULL, owner TEXT NOT NULL,
+        expires_at REAL NOT NULL, PRIMARY KEY (scope, key))""",
+]
+
+_SHARED_CACHE_LOCAL = threading.local()
+_SHARED_CACHE_PURGED_AT = 0.0
+
+
+def _shared_cache_enabled() -> bool:
+    global SHARED_CACHE_ENABLED
+    if SHARED_CACHE_ENABLED is None:
+        SHARED_CACHE_ENABLED = '--shared-cache' in sys.argv
+    return SHARED_CACHE_ENABLED
+
+
+def _shared_cache_db() -> Optional[sqlite3.Connection]:
+    """Returns this thread's connection to the shared cache, or None when it is disabled."""
+    if not _shared_cache_enabled():
+        return None
+    db = getattr(_SHARED_CACHE_LOCAL, 'db', None)
+    if db is None:
+        path = os.path.join(_get_state_dir(), SHARED_CACHE_FILE)
+        db = sqlite3.connect(path, timeout=SHARED_CACHE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        for statement in SHARED_CACHE_SCHEMA:
+            db.execute(statement)
+        _SHARED_CACHE_LOCAL.db = db
+    return db
+
+
+def _shared_cache_scope() -> str:
+    return f"{FB_API_VERSION}:{_token_id()}"
+
+
+def _shared_cache_get(key: str) -> Optional[Any]:
+    """Returns the unexpired shared value of a key, or None."""
+    try:
+        db = _shared_cache_db()
+        if db is None:
+            return None
+        row = db.execute(
+            'SELECT value FROM entries WHERE scope = ? AND key = ? AND expires_at > ?',
+            (_shared_cache_scope(), key, time.time())
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Shared cache read of {key} failed: {e}", file=sys.stderr)
+        return None
+    return _json_loads(row[0].replace(SNAPSHOT_TOKEN_PLACEHOLDER, _get_fb_access_token())) if row else None
+
+
+def _shared_cache_put(key: str, value: Any, expires_at: float, act_id: Optional[str] = None, object_ids=()) -> None:
+    """Stores a value for other processes, tagged with the IDs it depends on."""
+    global _SHARED_CACHE_PURGED_AT
+    try:
+        db = _shared_cache_db()
+        if db is None:
+            return
+        scope = _shared_cache_scope()
+        now = time.time()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                       (scope, key, _json_dumps(value).replace(_get_fb_access_token(), SNAPSHOT_TOKEN_PLACEHOLDER),
+                        expires_at, act_id))
+            db.execute('DELETE FROM entry_objects WHERE scope = ? AND key = ?', (scope, key))
+            db.executemany('INSERT INTO entry_objects VALUES (?, ?, ?)',
+                           [(scope, key, str(object_id)) for object_id in object_ids])
+            if now - _SHARED_CACHE_PURGED_AT > SHARED_CACHE_PURGE_INTERVAL_SECONDS:
+                _SHARED_CACHE_PURGED_AT = now
+                db.execute('DELETE FROM entry_objects WHERE rowid IN (SELECT o.rowid FROM entry_objects o '
+                           'JOIN entries e ON e.scope = o.scope AND e.key = o.key WHERE e.expires_at <= ?)', (now,))
+                db.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+    except sqlite3.Error as e:
+        print(f"Shared cache write of {key} failed: {e}", file=sys.stderr)
+
+
+def _shared_cache_scan(prefix: str) -> Dict[str, Any]:
+    """Returns all unexpired shared values whose key starts with `prefix`, by key."""
+    try:
+        db = _shared_cache_db()
+        if db is None:
+            return {}
+        rows = db.execute(
+            'SELECT key, value FROM entries WHERE scope = ? AND key >= ? AND key < ? AND expires_at > ?',
+            (_shared_cache_scope(), prefix, prefix + '\uffff', time.time())
+        ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Shared cache scan of {prefix} failed: {e}", file=sys.stderr)
+        return {}
+    access_token = _get_fb_access_token()
+    return {key: _json_loads(value.replace(SNAPSHOT_TOKEN_PLACEHOLDER, access_token)) for key, value in rows}
+
+
+def _shared_cache_evict(prefix: str, act_id: Optional[str] = None, object_ids=()) -> int:
+    """Drops shared entries under a key prefix that belong to `act_id` or depend on any of `object_ids`."""
+    try:
+        db = _shared_cache_db()
+        if db is None:
+            return 0
+        scope = _shared_cache_scope()
+        keys = set()
+        if act_id:
+            keys.update(row[0] for row in db.execute(
+                'SELECT key FROM entries WHERE scope = ? AND act_id = ?', (scope, act_id)))
+        for object_id in object_ids:
+            keys.update(row[0] for row in db.execute(
+                'SELECT key FROM entry_objects WHERE scope = ? AND object_id = ?', (scope, str(object_id))))
+        keys = [key for key in keys if key.startswith(prefix)]
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            for key in keys:
+                db.execute('DELETE FROM entries WHERE scope = ? AND key = ?', (scope, key))
+                db.execute('DELETE FROM entry_objects WHERE scope = ? AND key = ?', (scope, key))
+        return len(keys)
+    except sqlite3.Error as e:
+        print(f"Shared cache eviction failed: {e}", file=sys.stderr)
+        return 0
+
+
+def _shared_lease(key: str, release: bool = False) -> bool:
+    """Takes (or releases) this process's lease on fetching a key; False if another process holds it."""
+    db = _shared_cache_db()
+    scope, owner = _shared_cache_scope(), f"{os.getpid()}:{threading.get_ident()}"
+    with db:
+        db.execute('BEGIN IMMEDIATE')
+        if release:
+            db.execute('DELETE FROM leases WHERE scope = ? AND key = ? AND owner = ?', (scope, key, owner))
+            return True
+        now = time.time()
+        db.execute('DELETE FROM leases WHERE scope = ? AND key = ? AND expires_at <= ?', (scope, key, now))
+        cursor = db.execute('INSERT OR IGNORE INTO leases VALUES (?, ?, ?, ?)',
+                            (scope, key, owner, now + SHARED_CACHE_LEASE_SECONDS))
+        return cursor.rowcount == 1
+
+
+def _shared_singleflight(key: str, lookup, load):
+    """Returns `lookup()` if it finds a shared value, else runs `load()` in at most one
+    process at a time, the others polling `lookup()` until it succeeds or the lease frees up.
+    Without the shared cache, `load()` simply runs."""
+    try:
+        if _shared_cache_db() is None:
+            return load()
+        while True:
+            found = lookup()
+            if found is not None:
+                return found
+            if _shared_lease(key):
+                break
+            time.sleep(SHARED_CACHE_POLL_SECONDS)
+    except sqlite3.Error as e:
+        print(f"Shared cache lease of {key} failed: {e}", file=sys.stderr)
+        return load()
+    try:
+        return load()
+    finally:
+        try:
+            _shared_lease(key, release=True)
+        except sqlite3.Error as e:
+            print(f"Shared cache lease of {key} could not be released: {e}", file=sys.stderr)
+
+
+# --- Rate Limit Usage ---
+# Graph reports how much of each rate limit has been used in response headers:
+# X-App-Usage (app level), X-Ad-Account-Usage (the requested ad account) and
+# X-Business-Use-Case-Usage (per business object and use case, e.g. ads_insights).
+# The latest value of each is kept so background work can leave headroom for
+# interactive calls. Usage decays over time, so old readings are ignored. With the
+# shared cache enabled (always the case for pool workers) readings are exchanged
+# between processes, so each one sees the usage caused by all of them.
+
+RATE_USAGE_MAX_AGE_SECONDS = 300
+
+# scope ('app', 'account:act_1', 'buc:<object id>:<type>') -> {'pct', 'regain_seconds', 'seen_at'}
+_RATE_USAGE: Dict[str, Dict[str, Any]] = {}
+_RATE_USAGE_LOCK = threading.Lock()
+
+
+def _record_rate_usage(url: str, headers) -> None:
+    """Stores the usage percentages reported in a response's rate limit headers."""
+    readings = {}
+    try:
+        if headers.get('x-app-usage'):
+            usage = _json_loads(headers['x-app-usage'])
+            readings['app'] = (max(usage.get(k, 0) for k in ('call_count', 'total_cputime', 'total_time')), 0)
+        object_id = _url_object_id(url)
+        if headers.get('x-ad-account-usage') and object_id and object_id.startswith('act_'):
+            usage = _json_loads(headers['x-ad-account-usage'])
+            readings[f"account:{object_id}"] = (usage.get('acc_id_util_pct', 0), usage.get('reset_time_duration', 0))
+        if headers.get('x-business-use-case-usage'):
+            for business_id, entries in _json_loads(headers['x-business-use-case-usage']).items():
+                for usage in entries:
+                    pct = max(usage.get(k, 0) for k in ('call_count', 'total_cputime', 'total_time'))
+                    readings[f"buc:{business_id}:{usage.get('type')}"] = (
+                        pct, usage.get('estimated_time_to_regain_access', 0) * 60)
+    except (ValueError, AttributeError, TypeError):
+        return
+    now = time.time()
+    with _RATE_USAGE_LOCK:
+        for scope, (pct, regain_seconds) in readings.items():
+            _RATE_USAGE[scope] = {'pct': float(pct), 'regain_seconds': regain_seconds, 'seen_at': now}
+    for scope in readings:
+        _shared_cache_put(f"rate:{scope}", _RATE_USAGE[scope], now + RATE_USAGE_MAX_AGE_SECONDS)
+
+
+def _merge_shared_rate_usage() -> None:
+    """Takes over readings other processes have seen more recently than this one."""
+    shared = _shared_cache_scan('rate:')
+    with _RATE_USAGE_LOCK:
+        for key, usage in shared.items():
+            scope = key[len('rate:'):]
+            if usage['seen_at'] > _RATE_USAGE.get(scope, {}).get('seen_at', 0):
+                _RATE_USAGE[scope] = usage
+
+
+def _rate_usage_pct(act_id: Optional[str] = None, max_age: float = RATE_USAGE_MAX_AGE_SECONDS) -> float:
+    """Returns the highest usage percentage reported in the last `max_age` seconds
+    that is relevant to an ad account (or to any account)."""
+    _merge_shared_rate_usage()
+    numeric_id = act_id[len('act_'):] if act_id else None
+    oldest = time.time() - max_age
+    with _RATE_USAGE_LOCK:
+        relevant = [
+            usage['pct'] for scope, usage in _RATE_USAGE.items()
+            if usage['seen_at'] >= oldest and (
+                act_id is None or scope in ('app', f"account:{act_id}") or scope.startswith(f"buc:{numeric_id}:")
+            )
+        ]
+    return max(relevant, default=0.0)
+
+
+def _rate_usage_snapshot() -> Dict[str, Any]:
+    _merge_shared_rate_usage()
+    oldest = time.time() - RATE_USAGE_MAX_AGE_SECONDS
+    with _RATE_USAGE_LOCK:
+        return {
+            scope: {'pct': usage['pct'], 'regain_seconds': usage['regain_seconds'],
+                    'age_seconds': round(time.time() - usage['seen_at'], 1)}
+            for scope, usage in _RATE_USAGE.items() if usage['seen_at'] >= oldest
+        }
+
+
+# --- Negative Cache ---
+# Remembers object IDs that Graph reported as deleted or nonexistent, so repeated
+# lookups fail locally instead of making a round trip that is known to fail. Only
+# reads of the object itself (GET /<id>) and multi-ID requests naming missing
+# aliases are recorded: an error from an edge such as /act_1/insights says more
+# about the edge or the token's permissions than about the object, and permission
+# errors are never recorded at all. A Bloom filter answers "definitely not bad"
+# for the common case; possible hits are confirmed against a small exact map
+# whose entries expire per error class.
+
+NEGATIVE_CACHE_TTL_SECONDS = {
+    'not_found_or_inaccessible': 3600,
+    'not_found': 3600,
+}
+NEGATIVE_CACHE_MAX_ENTRIES = 10000
+NEGATIVE_BLOOM_BITS = 1 << 17
+NEGATIVE_BLOOM_HASHES = 4
+
+# object ID -> (error class, expires_at)
+_NEGATIVE_CACHE: 'OrderedDict[str, tuple]' = OrderedDict()
+_NEGATIVE_BLOOM = bytearray(NEGATIVE_BLOOM_BITS // 8)
+_NEGATIVE_CACHE_LOCK = threading.Lock()
+
+
+class KnownBadObjectError(Exception):
+    """Raised instead of calling the Graph API for an ID recently reported as bad."""
+
+    def __init__(self, object_id: str, error_class: str, expires_in: float):
+        self.object_id = object_id
+        self.error_class = error_class
+        super().__init__(
+            f"Object {object_id} was recently reported by the Graph API as {error_class.replace('_', ' ')}; "
+            f"not retrying for another {int(expires_in)} seconds"
+        )
+
+
+def _bloom_positions(object_id: str) -> List[int]:
+    digest = hashlib.blake2b(object_id.encode('utf-8'), digest_size=4 * NEGATIVE_BLOOM_HASHES).digest()
+    return [int.from_bytes(digest[i * 4:(i + 1) * 4], 'little') % NEGATIVE_BLOOM_BITS
+            for i in range(NEGATIVE_BLOOM_HASHES)]
+
+
+def _negative_cache_add(object_id: str, error_class: str) -> None:
+    """Records an object ID as bad for its error class's TTL."""
+    with _NEGATIVE_CACHE_LOCK:
+        _NEGATIVE_CACHE[object_id] = (error_class, time.time() + NEGATIVE_CACHE_TTL_SECONDS[error_class])
+        _NEGATIVE_CACHE.move_to_end(object_id)
+        while len(_NEGATIVE_CACHE) > NEGATIVE_CACHE_MAX_ENTRIES:
+            _NEGATIVE_CACHE.popitem(last=False)
+        for position in _bloom_positions(object_id):
+            _NEGATIVE_BLOOM[position >> 3] |= 1 << (position & 7)
+
+
+def _negative_cache_lookup(object_id: str) -> Optional[tuple]:
+    """Returns (error class, seconds left) if the ID is known bad, else None."""
+    for position in _bloom_positions(object_id):
+        if not _NEGATIVE_BLOOM[position >> 3] & (1 << (position & 7)):
+            return None
+    with _NEGATIVE_CACHE_LOCK:
+        entry = _NEGATIVE_CACHE.get(object_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del _NEGATIVE_CACHE[object_id]
+            return None
+        return entry[0], entry[1] - time.time()
+
+
+def _negative_cache_forget(object_id: str) -> None:
+    """Drops an ID from the exact map after it was fetched successfully."""
+    with _NEGATIVE_CACHE_LOCK:
+        _NEGATIVE_CACHE.pop(object_id, None)
+
+
+def _negative_error_class(e: Exception) -> Optional[str]:
+    """Classifies Graph errors that mean the requested object does not exist.
+
+    100/33 only means that for a read of the object itself; callers pass edge
+    errors through `_negative_cache_record` with no object ID, which ignores it.
+    """
+    error = _graph_error(e)
+    code, subcode = error.get('code'), error.get('error_subcode')
+    if code == 100 and subcode == 33:
+        return 'not_found_or_inaccessible'
+    if code == 803:
+        return 'not_found'
+    return None
+
+
+def _url_object_id(url: str) -> Optional[str]:
+    """Returns the object ID a node or edge URL is rooted at, e.g. '123' in /v22.0/123/ads."""
+    match = re.match(r'/v[\d.]+/((?:act_)?\d+)(?:/|$)', urlparse(url).path)
+    return match.group(1) if match else None
+
+
+def _drop_known_bad_ids(object_ids: List[str]) -> List[str]:
+    """Filters known-bad IDs out of a multi-ID request before it is built."""
+    kept = [object_id for object_id in object_ids if _negative_cache_lookup(object_id) is None]
+    if len(kept) != len(object_ids):
+        print(f"Skipping {len(object_ids) - len(kept)} IDs known to be deleted or inaccessible", file=sys.stderr)
+    return kept
+
+
+def _url_node_id(url: str) -> Optional[str]:
+    """Returns the object ID of a plain node read such as /v22.0/123, or None for edges."""
+    match = re.match(r'/v[\d.]+/((?:act_)?\d+)/?$', urlparse(url).path)
+    return match.group(1) if match else None
+
+
+def _negative_cache_check(url: str, params: Dict[str, Any]) -> Optional[str]:
+    """Raises KnownBadObjectError if the URL's object (node or edge root) is known to be
+    missing; returns the object ID for a node read whose outcome should be recorded."""
+    object_id = _url_object_id(url)
+    if object_id is None:
+        return None
+    known = _negative_cache_lookup(object_id)
+    if known is not None:
+        raise KnownBadObjectError(object_id, known[0], known[1])
+    return _url_node_id(url)
+
+
+def _negative_cache_record(object_id: Optional[str], params: Dict[str, Any], error: Optional[Exception] = None) -> None:
+    """Updates the negative cache from the outcome of a request."""
+    if error is None:
+        if object_id is not None:
+            _negative_cache_forget(object_id)
+        return
+    error_class = _negative_error_class(error)
+    if error_class is None:
+        return
+    if object_id is not None:
+        _negative_cache_add(object_id, error_class)
+    elif error_class == 'not_found' and params.get('ids'):
+        # Multi-ID requests fail as a whole; the message lists the missing aliases
+        message = str(_graph_error(error).get('message', ''))
+        requested = set(str(params['ids']).split(','))
+        for alias in re.findall(r'[\w]+', message.rpartition(':')[2]):
+            if alias in requested:
+                _negative_cache_add(alias, error_class)
+
+
+# --- Entity Store ---
+# Normalized cache of campaigns, ad sets, ads and creatives keyed by object type
+# and ID. Every listing, multi-ID and expanded (hierarchy) response is merged in
+# field by field, recording when each field was last seen and which requested
+# fields Graph left out because they have no value. Single-object lookups are
+# answered locally when every requested field is known and fresh. Fields that
+# change with every impression (VOLATILE_ENTITY_FIELDS) are never answered locally.
+
+ENTITY_FIELD_MAX_AGE_SECONDS = 300
+ENTITY_STORE_MAX_ENTRIES = 50000
+ENTITY_EDGE_TYPES = {'campaigns': 'campaign', 'adsets': 'adset', 'ads': 'ad', 'adcreatives': 'adcreative'}
+# Fields of one entity that hold another entity when expanded, e.g. ad.creative
+ENTITY_REFERENCE_TYPES = {'campaign': 'campaign', 'adset': 'adset', 'creative': 'adcreative'}
+# Fields always fetched from the API, e.g. an account's running spend
+VOLATILE_ENTITY_FIELDS = {'adaccount': {'balance', 'amount_spent', 'spend_cap'}}
+
+# (type, id) -> {'values': {field: value}, 'seen_at': {field: time}}; a field in
+# 'seen_at' but not in 'values' was requested and is known to be unset.
+_ENTITY_STORE: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+_ENTITY_STORE_LOCK = threading.Lock()
+
+
+def _split_field_specs(fields: Optional[str]) -> Optional[List[str]]:
+    """Splits a 'fields' parameter at top-level commas, e.g. 'id,creative{id,name}'."""
+    if not fields:
+        return None
+    specs, depth, start = [], 0, 0
+    for i, char in enumerate(fields):
+        if char in '{(':
+            depth += 1
+        elif char in '})':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            specs.append(fields[start:i].strip())
+            start = i + 1
+    specs.append(fields[start:].strip())
+    return [spec for spec in specs if spec]
+
+
+def _entity_store_put(
+    entity_type: str,
+    row: Dict[str, Any],
+    fields: Optional[str],
+    seen_at: Optional[float] = None
+) -> None:
+    """Merges one Graph object into the entity store.
+
+    Fields requested by plain name are stored as-is (and marked unset when missing
+    from the row). Expanded references such as 'creative{id,name}' or nested
+    'ads{...}' edges are stored as entities of their own.
+    """
+    if not isinstance(row, dict) or not row.get('id'):
+        return
+    seen_at = seen_at or time.time()
+    specs = _split_field_specs(fields)
+    plain = set(row) if specs is None else {spec for spec in specs if re.fullmatch(r'\w+', spec)}
+    for spec in specs or []:
+        match = re.fullmatch(r'(\w+)\{(.*)\}', spec)
+        if match is None or not isinstance(row.get(match.group(1)), dict):
+            continue
+        name, sub_fields = match.groups()
+        value = row[name]
+        if name in ENTITY_REFERENCE_TYPES:
+            _entity_store_put(ENTITY_REFERENCE_TYPES[name], value, sub_fields, seen_at)
+        elif name in ENTITY_EDGE_TYPES and isinstance(value.get('data'), list):
+            for child in value['data']:
+                _entity_store_put(ENTITY_EDGE_TYPES[name], child, sub_fields, seen_at)
+
+    _index_hierarchy(row, entity_type)
+    key = (entity_type, str(row['id']))
+    with _ENTITY_STORE_LOCK:
+        entry = _ENTITY_STORE.get(key)
+        if entry is None:
+            entry = _ENTITY_STORE[key] = {'values': {}, 'seen_at': {}}
+            while len(_ENTITY_STORE) > ENTITY_STORE_MAX_ENTRIES:
+                _ENTITY_STORE.popitem(last=False)
+        else:
+            _ENTITY_STORE.move_to_end(key)
+        for name in plain:
+            if name in row:
+                entry['values'][name] = row[name]
+            else:
+                entry['values'].pop(name, None)
+            entry['seen_at'][name] = seen_at
+
+
+def _response_row_sink(url: str, params: Dict[str, Any]):
+    """Returns a callable feeding rows of a listing or insights response into the
+    entity store and hierarchy index, or None if the response is of neither kind."""
+    url, params = _split_url_query(url, params)
+    family = _endpoint_family(url)
+    if family == 'insights':
+        return _index_hierarchy
+    entity_type = ENTITY_EDGE_TYPES.get(family)
+    # Non-default date formats change field values, so they are not merged
+    if entity_type is None or params.get('date_format'):
+        return None
+    fields = params.get('fields')
+    return lambda row: _entity_store_put(entity_type, row, fields)
+
+
+def _ingest_entities(url: str, params: Dict[str, Any], response: Any) -> None:
+    """Feeds a listing (e.g. /act_123/ads) or insights response into the local indexes."""
+    sink = _response_row_sink(url, params)
+    if sink is None or not isinstance(response, dict):
+        return
+    for row in response.get('data') or []:
+        sink(row)
+
+
+def _entity_store_get(entity_type: str, object_id: str, fields: Optional[str]) -> Optional[Dict]:
+    """Returns the object with the requested fields if all are known and fresh, else None.
+
+    Requests without explicit fields always go to the API, since the default field
+    set is decided by Graph, and so do requests for any VOLATILE_ENTITY_FIELDS.
+    """
+    specs = _split_field_specs(fields)
+    if not specs or not all(re.fullmatch(r'\w+', spec) for spec in specs):
+        return None
+    if VOLATILE_ENTITY_FIELDS.get(entity_type, set()).intersection(specs):
+        return None
+    with _ENTITY_STORE_LOCK:
+        entry = _ENTITY_STORE.get((entity_type, str(object_id)))
+        if entry is None:
+            return None
+        values, seen_at = entry['values'], entry['seen_at']
+        act_id = _normalize_act_id(values.get('account_id'))
+        oldest_allowed = time.time() - max(
+            ENTITY_FIELD_MAX_AGE_SECONDS, _mirror_max_age(act_id) if act_id else 0
+        )
+        if any(spec != 'id' and seen_at.get(spec, 0) < oldest_allowed for spec in specs):
+            return None
+        result = {'id': str(object_id)}
+        result.update((spec, values[spec]) for spec in specs if spec in values)
+        return result
+
+
+def _entity_store_evict(object_ids) -> int:
+    """Drops objects from the entity store, whatever their type."""
+    evicted = 0
+    with _ENTITY_STORE_LOCK:
+        for object_id in object_ids:
+            for entity_type in ENTITY_EDGE_TYPES.values():
+                if _ENTITY_STORE.pop((entity_type, str(object_id)), None) is not None:
+                    evicted += 1
+    return evicted
+
+
+def _fetch_entity(entity_type: str, object_id: str, params: Dict[str, Any]) -> Dict:
+    """Fetches one campaign, ad set, ad or creative, serving it from the entity store when possible."""
+    if not params.get('date_format'):
+        cached = _entity_store_get(entity_type, object_id, params.get('fields'))
+        if cached is not None:
+            return cached
+    result = _make_graph_api_call(f"{FB_GRAPH_URL}/{object_id}", params)
+    if not params.get('date_format'):
+        _entity_store_put(entity_type, result, params.get('fields'))
+    return result
+
+
+# --- Hierarchy Index ---
+# Parent links between ads, ad sets, campaigns and accounts, learned from every
+# entity or insights row that carries adset_id/campaign_id/account_id. Object IDs
+# are interned to integer slots and each ancestor level is an array of parent
+# slots, so ancestor and descendant lookups never need a Graph API round trip.
+# Beyond HIERARCHY_MAX_OBJECTS the least recently seen objects are forgotten and
+# their slots reused.
+
+HIERARCHY_LEVELS = ['ad', 'adset', 'campaign', 'account']
+HIERARCHY_ID_FIELDS = {'ad': 'ad_id', 'adset': 'adset_id', 'campaign': 'campaign_id', 'account': 'account_id'}
+HIERARCHY_MAX_OBJECTS = 200000
+
+_HIERARCHY_SLOTS: Dict[str, int] = {}
+_HIERARCHY_IDS: List[Optional[str]] = [] # None for a freed slot
+_HIERARCHY_LEVELS = array('b')
+# parent level -> array of parent slots (-1 when unknown), indexed by child slot
+_HIERARCHY_PARENTS = {level: array('l') for level in HIERARCHY_LEVELS[1:]}
+# slot -> slots of the objects that named it as a parent
+_HIERARCHY_CHILDREN: Dict[int, set] = {}
+# Slots in least to most recently seen order
+_HIERARCHY_RECENT: 'OrderedDict[int, None]' = OrderedDict()
+_HIERARCHY_FREE_SLOTS: List[int] = []
+_HIERARCHY_LOCK = threading.Lock()
+
+
+def _hierarchy_slot(object_id: str, level: str) -> int:
+    """Returns the slot of an object ID, interning it on first sight. Caller holds the lock."""
+    slot = _HIERARCHY_SLOTS.get(object_id)
+    if slot is not None:
+        _HIERARCHY_RECENT.move_to_end(slot)
+        return slot
+    if _HIERARCHY_FREE_SLOTS:
+        slot = _HIERARCHY_FREE_SLOTS.pop()
+        _HIERARCHY_IDS[slot] = object_id
+        _HIERARCHY_LEVELS[slot] = HIERARCHY_LEVELS.index(level)
+    else:
+        slot = len(_HIERARCHY_IDS)
+        _HIERARCHY_IDS.append(object_id)
+        _HIERARCHY_LEVELS.append(HIERARCHY_LEVELS.index(level))
+        for parents in _HIERARCHY_PARENTS.values():
+            parents.append(-1)
+    _HIERARCHY_SLOTS[object_id] = slot
+    _HIERARCHY_RECENT[slot] = None
+    return slot
+
+
+def _hierarchy_evict() -> None:
+    """Forgets the least recently seen objects beyond HIERARCHY_MAX_OBJECTS. Caller holds the lock."""
+    while len(_HIERARCHY_RECENT) > HIERARCHY_MAX_OBJECTS:
+        slot, _ = _HIERARCHY_RECENT.popitem(last=False)
+        del _HIERARCHY_SLOTS[_HIERARCHY_IDS[slot]]
+        _HIERARCHY_IDS[slot] = None
+        for parents in _HIERARCHY_PARENTS.values():
+            if parents[slot] >= 0:
+                _HIERARCHY_CHILDREN[parents[slot]].discard(slot)
+                parents[slot] = -1
+        for child in _HIERARCHY_CHILDREN.pop(slot, ()):
+            for parents in _HIERARCHY_PARENTS.values():
+                if parents[child] == slot:
+                    parents[child] = -1
+        _HIERARCHY_FREE_SLOTS.append(slot)
+
+
+def _hierarchy_find(object_id: str) -> Optional[int]:
+    """Returns the slot of an indexed object, also trying the 'act_' form of a bare
+    account ID. Caller holds the lock."""
+    slot = _HIERARCHY_SLOTS.get(str(object_id))
+    if slot is None:
+        slot = _HIERARCHY_SLOTS.get(_normalize_act_id(object_id) or '')
+        if slot is not None and HIERARCHY_LEVELS[_HIERARCHY_LEVELS[slot]] != 'account':
+            slot = None
+    return slot
+
+
+def _index_hierarchy(row: Dict[str, Any], level: Optional[str] = None) -> None:
+    """Records the parent links found in one response row.
+
+    For entity rows `level` names the type of row['id']; insights rows are indexed
+    from their ad_id/adset_id/campaign_id/account_id fields alone.
+    """
+    if not isinstance(row, dict):
+        return
+    ids = {}
+    if level in HIERARCHY_ID_FIELDS and row.get('id'):
+        ids[level] = str(row['id'])
+    for id_level, field in HIERARCHY_ID_FIELDS.items():
+        if row.get(field) and id_level not in ids:
+            ids[id_level] = str(row[field])
+    if 'account' in ids:
+        ids['account'] = _normalize_act_id(ids['account'])
+    if len(ids) < 2:
+        return
+
+    with _HIERARCHY_LOCK:
+        slots = {id_level: _hierarchy_slot(object_id, id_level) for id_level, object_id in ids.items()}
+        for child_level, child in slots.items():
+            for parent_level in HIERARCHY_LEVELS[HIERARCHY_LEVELS.index(child_level) + 1:]:
+                parent = slots.get(parent_level)
+                if parent is None:
+                    continue
+                parents = _HIERARCHY_PARENTS[parent_level]
+                if parents[child] != parent:
+                    if parents[child] >= 0:
+                        _HIERARCHY_CHILDREN[parents[child]].discard(child)
+                    parents[child] = parent
+                    _HIERARCHY_CHILDREN.setdefault(parent, set()).add(child)
+        _hierarchy_evict()
+
+
+def _hierarchy_ancestors(object_id: str) -> Dict[str, str]:
+    """Returns the known ancestors of an object, e.g. {'adset_id': ..., 'campaign_id': ..., 'account_id': ...}.
+
+    Missing direct links are filled in through intermediate levels, so an ad whose
+    rows only named its ad set still resolves to the ad set's campaign and account.
+    """
+    with _HIERARCHY_LOCK:
+        slot = _hierarchy_find(object_id)
+        if slot is None:
+            return {}
+        ancestors, chain = {}, [slot]
+        for parent_level, parents in _HIERARCHY_PARENTS.items():
+            for member in reversed(chain):
+                if parents[member] >= 0:
+                    ancestors[HIERARCHY_ID_FIELDS[parent_level]] = _HIERARCHY_IDS[parents[member]]
+                    chain.append(parents[member])
+                    break
+        return ancestors
+
+
+def _hierarchy_descendants(object_id: str, level: Optional[str] = None) -> List[str]:
+    """Returns the IDs of known descendants of an object, optionally only those of one level."""
+    with _HIERARCHY_LOCK:
+        slot = _hierarchy_find(object_id)
+        if slot is None:
+            return []
+        wanted = HIERARCHY_LEVELS.index(level) if level else None
+        seen, pending, found = {slot}, [slot], []
+        while pending:
+            for child in _HIERARCHY_CHILDREN.get(pending.pop(), ()):
+                if child in seen:
+                    continue
+                seen.add(child)
+                pending.append(child)
+                if wanted is None or _HIERARCHY_LEVELS[child] == wanted:
+                    found.append(_HIERARCHY_IDS[child])
+        return found
+
+
+def _hierarchy_level(object_id: str) -> Optional[str]:
+    """Returns 'ad', 'adset', 'campaign' or 'account' for an indexed object ID."""
+    with _HIERARCHY_LOCK:
+        slot = _hierarchy_find(object_id)
+        return HIERARCHY_LEVELS[_HIERARCHY_LEVELS[slot]] if slot is not None else None
+
+
+# --- Streaming Response Decoding ---
+# Large insights pages are decoded incrementally: the body is read in chunks and
+# each element of the top-level 'data' array is decoded and handed on as soon as
+# it is complete, so the raw body, its text and the full object tree never have
+# to be in memory together.
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _stream_graph_page(url: str, params: Dict[str, Any]):
+    """Yields the 'data' rows of one Graph API response as they are decoded.
+
+    The generator's return value (StopIteration.value) is the rest of the response
+    envelope, e.g. {'paging': {...}}, without 'data'.
+    """
+    object_id = _negative_cache_check(url, params)
+    breaker_keys = _breaker_before_request(url)
+    try:
+        started = time.monotonic()
+        response = requests.get(url, params=params, stream=True)
+        _record_rate_usage(url, response.headers)
+        response.raise_for_status()
+        _breaker_record(breaker_keys)
+        _negative_cache_record(object_id, params)
+    except requests.exceptions.RequestException as e:
+        _breaker_record(breaker_keys, e)
+        _negative_cache_record(object_id, params, e)
+        if _is_reduce_data_error(e):
+            reduced = _retry_reduced_query(url, params)
+            if reduced is not None:
+                yield from reduced.get('data', [])
+                return {k: v for k, v in reduced.items() if k != 'data'}
+        logged_params = {k: v for k, v in params.items() if k != 'access_token'}
+        print(f"Error making Graph API call to {url} with params {logged_params}: {e}", file=sys.stderr)
+        raise
+
+    row_sink = _response_row_sink(url, params)
+
+    with response:
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        raw_chunks = response.iter_content(chunk_size=STREAM_CHUNK_BYTES)
+        received_bytes, row_count = 0, 0
+
+        def counted(chunk_iter):
+            nonlocal received_bytes
+            for chunk in chunk_iter:
+                received_bytes += len(chunk)
+                yield chunk
+
+        chunks = counted(raw_chunks)
+        json_decoder = json.JSONDecoder()
+        buf, pos, eof = '', 0, False
+        envelope: Dict[str, Any] = {}
+
+        def read_more() -> None:
+            # Appending copies the buffer anyway, so consumed text is dropped here, once
+            # per chunk, and the buffer stays around one chunk in size
+            nonlocal buf, pos, eof
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                text = text_decoder.decode(b'', final=True)
+            else:
+                text = text_decoder.decode(chunk)
+            buf, pos = buf[pos:] + text, 0
+
+        def next_char() -> str:
+            # Skips whitespace and returns the next significant character
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if eof:
+                    raise ValueError(f"Truncated JSON response from {url}")
+                read_more()
+
+        def decode_value() -> Any:
+            # Decodes one complete JSON value at `pos`, reading more input as needed
+            nonlocal pos
+            next_char()
+            while True:
+                try:
+                    value, end = json_decoder.raw_decode(buf, pos)
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more()
+
+        if next_char() != '{':
+            raise ValueError(f"Expected a JSON object from {url}")
+        pos += 1
+        while next_char() != '}':
+            if buf[pos] == ',':
+                pos += 1
+                continue
+            key = decode_value()
+            if next_char() != ':':
+                raise ValueError(f"Malformed JSON response from {url}")
+            pos += 1
+            if key == 'data' and next_char() == '[':
+                pos += 1
+                while next_char() != ']':
+                    if buf[pos] == ',':
+                        pos += 1
+                        continue
+                    row = decode_value()
+                    if row_sink:
+                        row_sink(row)
+                    yield row
+                    row_count += 1
+                pos += 1
+            else:
+                envelope[key] = decode_value()
+        _record_page_stats(url, params, time.monotonic() - started, received_bytes, row_count)
+        return envelope
+
+
+def _iter_graph_rows(url: str, params: Dict[str, Any], adaptive: bool = False, on_page=None):
+    """Yields every 'data' row of a collection across all pages, decoding them incrementally.
+
+    With adaptive=True the page size of each following page is set to the endpoint
+    family's currently tuned limit instead of repeating the first page's limit.
+    `on_page(next_url, next_params)` is called once all rows of a page have been
+    consumed, with the request for the following page (None when it was the last).
+    """
+    next_url, next_params = url, params
+    while next_url:
+        envelope = yield from _stream_graph_page(next_url, next_params)
+        # The 'next' URL already carries the token and all query parameters
+        next_url, next_params = envelope.get('paging', {}).get('next'), {}
+        if next_url and adaptive:
+            next_url, next_params = _split_url_query(next_url, {})
+            next_params['limit'] = _adaptive_page_limit(_endpoint_family(next_url))
+        if on_page is not None:
+            on_page(next_url, next_params)
+
+
+# --- Account Mirror ---
+# Local copy of an ad account's campaigns, ad sets, ads and creatives. The first
+# sync loads everything; later syncs only ask for objects changed since the last
+# watermark (via `updated_since`) and merge them in by ID.
+
+MIRROR_MAX_AGE_SECONDS = 300
+MIRROR_WATERMARK_OVERLAP_SECONDS = 60 # Re-read a small window to tolerate clock skew
+MIRROR_EDGES = ['campaigns', 'adsets', 'ads', 'adcreatives']
+MIRROR_FIELDS = {
+    'campaigns': [
+        'id', 'name', 'account_id', 'objective', 'status', 'effective_status',
+        'configured_status', 'buying_type', 'bid_strategy', 'daily_budget',
+        'lifetime_budget', 'budget_remaining', 'special_ad_categories',
+        'start_time', 'stop_time', 'created_time', 'updated_time'
+    ],
+    'adsets': [
+        'id', 'name', 'account_id', 'campaign_id', 'status', 'effective_status',
+        'configured_status', 'bid_amount', 'bid_strategy', 'billing_event',
+        'optimization_goal', 'daily_budget', 'lifetime_budget', 'budget_remaining',
+        'targeting', 'start_time', 'end_time', 'created_time', 'updated_time'
+    ],
+    'ads': [
+        'id', 'name', 'account_id', 'campaign_id', 'adset_id', 'status',
+        'effective_status', 'configured_status', 'creative', 'bid_amount',
+        'created_time', 'updated_time'
+    ],
+    'adcreatives': [
+        'id', 'name', 'account_id', 'status', 'title', 'body', 'image_hash',
+        'image_url', 'thumbnail_url', 'video_id', 'link_url', 'url_tags',
+        'call_to_action_type', 'object_story_id', 'effective_object_story_id'
+    ],
+}
+# Deleted and archived objects must be requested explicitly, otherwise a delta
+# sync would never see an object leave the active set.
+MIRROR_EFFECTIVE_STATUSES = [
+    'ACTIVE', 'PAUSED', 'DELETED', 'PENDING_REVIEW', 'DISAPPROVED', 'PREAPPROVED',
+    'PENDING_BILLING_INFO', 'CAMPAIGN_PAUSED', 'ARCHIVED', 'ADSET_PAUSED',
+    'IN_PROCESS', 'WITH_ISSUES'
+]
+MIRROR_CURSOR_PREFIX = 'mirror:'
+
+# act_id -> {'objects': {edge: {id: obj}}, 'watermark': int, 'synced_at': float}
+_ACCOUNT_MIRRORS: Dict[str, Dict[str, Any]] = {}
+_MIRROR_LOCK = threading.RLock()
+# act_id -> lock held while the account's mirror is synced, so syncs of one account
+# queue up without blocking readers or syncs of other accounts
+_MIRROR_SYNC_LOCKS: Dict[str, threading.Lock] = {}
+
+
+def _parse_graph_time(value: Optional[str]) -> Optional[float]:
+    """Converts a Graph API ISO 8601 timestamp (e.g. 2024-01-31T10:00:00+0000) to Unix time."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _fetch_mirror_edge(act_id: str, edge: str, updated_since: Optional[int] = None) -> List[Dict]:
+    """Fetches all objects of one mirrored edge, optionally only those updated since a timestamp."""
+    access_token = _get_fb_access_token()
+    url = f"{FB_GRAPH_URL}/{act_id}/{edge}"
+    extra = {}
+    if edge != 'adcreatives':
+        extra['effective_status'] = MIRROR_EFFECTIVE_STATUSES
+        extra['updated_since'] = updated_since
+    params = _prepare_params(
+        {'access_token': access_token},
+        fields=MIRROR_FIELDS[edge],
+        limit=_adaptive_page_limit(edge),
+        **extra
+    )
+    return list(_iter_graph_rows(url, params, adaptive=True))
+
+
+def _fetch_objects_by_ids(object_ids: List[str], fields: List[str]) -> tuple:
+    """Fetches objects by ID using multi-ID requests of at most 50 IDs each.
+
+    A chunk rejected because some of its objects no longer exist is retried once
+    without the IDs the error names (the negative cache has recorded them by then);
+    if it still fails, or the error names none, its IDs are fetched one at a time.
+    Errors that do not mean a missing object are raised.
+
+    Returns:
+        tuple: ({id: object} of the objects fetched, set of IDs confirmed not to exist).
+        An ID in neither could not be fetched and its state is unknown.
+    """
+    access_token = _get_fb_access_token()
+    objects, missing = {}, set()
+    kept_ids = _drop_known_bad_ids(object_ids)
+    missing.update(set(object_ids) - set(kept_ids))
+    for start in range(0, len(kept_ids), 50):
+        chunk = kept_ids[start:start + 50]
+        params = _prepare_params({'access_token': access_token, 'ids': ','.join(chunk)}, fields=fields)
+        try:
+            objects.update(_make_graph_api_call(f"{FB_GRAPH_URL}/", params))
+            continue
+        except requests.exceptions.RequestException as e:
+            if _negative_error_class(e) is None:
+                raise
+        kept = _drop_known_bad_ids(chunk)
+        missing.update(set(chunk) - set(kept))
+        if kept and len(kept) < len(chunk):
+            params['ids'] = ','.join(kept)
+            try:
+                objects.update(_make_graph_api_call(f"{FB_GRAPH_URL}/", params))
+                continue
+            except requests.exceptions.RequestException as e:
+                if _negative_error_class(e) is None:
+                    raise
+        node_params = {key: value for key, value in params.items() if key != 'ids'}
+        for object_id in kept:
+            try:
+                objects[object_id] = _make_graph_api_call(f"{FB_GRAPH_URL}/{object_id}", node_params)
+            except KnownBadObjectError:
+                missing.add(object_id)
+            except requests.exceptions.RequestException as e:
+                if _negative_error_class(e) is None:
+                    raise
+                missing.add(object_id)
+    return objects, missing
+
+
+def _fetch_creatives_by_ids(creative_ids: List[str], fields: Optional[List[str]] = None) -> List[Dict]:
+    """Fetches creatives by ID (see `_fetch_objects_by_ids`), leaving out those that no longer exist."""
+    fields = fields or MIRROR_FIELDS['adcreatives']
+    creatives, _ = _fetch_objects_by_ids(creative_ids, fields)
+    for creative in creatives.values():
+        _entity_store_put('adcreative', creative, ','.join(fields))
+    return list(creatives.values())
+
+
+def _mirror_sync_lock(act_id: str) -> threading.Lock:
+    """Returns the lock serializing syncs of one account's mirror."""
+    with _MIRROR_LOCK:
+        return _MIRROR_SYNC_LOCKS.setdefault(act_id, threading.Lock())
+
+
+def _sync_account_mirror(act_id: str, full: bool = False) -> Dict[str, Any]:
+    """Loads or refreshes the local mirror of an ad account.
+
+    The first sync (or full=True) downloads every campaign, ad set, ad and creative.
+    Later syncs request only campaigns/ad sets/ads updated since the stored watermark
+    and re-fetch the creatives of updated ads, plus any the mirror lacks.
+    With the shared cache enabled, a fresher mirror synced by another process is
+    adopted instead (unless full=True), and one process at a time syncs an account.
+    """
+    with _mirror_sync_lock(act_id):
+        return _shared_singleflight(
+            f"mirror:{act_id}",
+            lambda: None if full else _adopt_shared_mirror(act_id),
+            lambda: _sync_mirror_from_graph(act_id, full)
+        )
+
+
+def _mirror_summary(act_id: str, sync_type: str, updated_since: Optional[int], changed: Dict[str, int]) -> Dict[str, Any]:
+    """Describes the account's mirror after a sync, as returned by sync_adaccount_mirror."""
+    mirror = _ACCOUNT_MIRRORS[act_id]
+    return {
+        'act_id': act_id,
+        'sync_type': sync_type,
+        'updated_since': updated_since,
+        'changed': changed,
+        'totals': {edge: len(objs) for edge, objs in mirror['objects'].items()},
+        'synced_at': mirror['synced_at'],
+    }
+
+
+def _publish_account_mirror(act_id: str) -> None:
+    """Stores the account's mirror in the shared cache for other processes."""
+    if not _shared_cache_enabled():
+        return
+    with _MIRROR_LOCK:
+        mirror = _ACCOUNT_MIRRORS[act_id]
+        mirror = {**mirror, 'objects': {edge: list(objs.values()) for edge, objs in mirror['objects'].items()}}
+    _shared_cache_put(f"mirror:{act_id}", mirror, mirror['synced_at'] + MIRROR_MAX_AGE_INVALIDATED_SECONDS, act_id)
+
+
+def _adopt_shared_mirror(act_id: str) -> Optional[Dict[str, Any]]:
+    """Replaces the local mirror with the shared one if that is fresh and newer, returning
+    a sync summary, or None if the account still needs a sync."""
+    shared = _shared_cache_get(f"mirror:{act_id}")
+    with _MIRROR_LOCK:
+        local = _ACCOUNT_MIRRORS.get(act_id)
+    if shared is None or time.time() - shared['synced_at'] > _mirror_max_age(act_id):
+        return None
+    if local is not None and local['synced_at'] >= shared['synced_at']:
+        return None
+    shared['objects'] = {edge: {row['id']: row for row in rows} for edge, rows in shared['objects'].items()}
+    with _MIRROR_LOCK:
+        _ACCOUNT_MIRRORS[act_id] = shared
+        summary = _mirror_summary(act_id, 'shared', local['watermark'] if local else None, {})
+    _register_invalidation_account(act_id)
+    return summary
+
+
+def _sync_mirror_from_graph(act_id: str, full: bool = False) -> Dict[str, Any]:
+    """Runs a full or delta mirror sync against the Graph API for `_sync_account_mirror`.
+
+    Runs with the account's sync lock held. The Graph requests are made without
+    _MIRROR_LOCK, which is only taken to read the watermark and to merge the results.
+    """
+    with _MIRROR_LOCK:
+        mirror = None if full else _ACCOUNT_MIRRORS.get(act_id)
+        updated_since = mirror['watermark'] if mirror else None
+        known_creatives = set(mirror['objects']['adcreatives']) if mirror else set()
+        referenced_creatives = {
+            ad['creative']['id'] for ad in mirror['objects']['ads'].values() if ad.get('creative', {}).get('id')
+        } if mirror else set()
+    started_at = int(time.time())
+
+    fetched = {edge: _fetch_mirror_edge(act_id, edge, updated_since=updated_since)
+               for edge in ['campaigns', 'adsets', 'ads']}
+    if updated_since is None:
+        fetched['adcreatives'] = _fetch_mirror_edge(act_id, 'adcreatives')
+    else:
+        # Creatives cannot be filtered by update time. Updated ads may point at an
+        # edited creative, so those are re-fetched along with any the mirror lacks
+        updated_creatives = {ad['creative']['id'] for ad in fetched['ads'] if ad.get('creative', {}).get('id')}
+        creative_ids = updated_creatives | (referenced_creatives - known_creatives)
+        fetched['adcreatives'] = _fetch_creatives_by_ids(sorted(creative_ids)) if creative_ids else []
+
+    with _MIRROR_LOCK:
+        mirror = None if full else _ACCOUNT_MIRRORS.get(act_id)
+        if mirror is None:
+            mirror = {'objects': {edge: {} for edge in MIRROR_EDGES}, 'watermark': None, 'synced_at': None}
+        for edge, rows in fetched.items():
+            for row in rows:
+                mirror['objects'][edge][row['id']] = row
+
+        mirror['watermark'] = started_at - MIRROR_WATERMARK_OVERLAP_SECONDS
+        mirror['synced_at'] = time.time()
+        _ACCOUNT_MIRRORS[act_id] = mirror
+        summary = _mirror_summary(
+            act_id, 'full' if updated_since is None else 'delta', updated_since,
+            {edge: len(rows) for edge, rows in fetched.items()}
+        )
+    # Only rows fetched by this sync are stamped; the entity store may hold newer
+    # values of the objects it did not return than the mirror does
+    for edge, rows in fetched.items():
+        fields = ','.join(MIRROR_FIELDS[edge])
+        for row in rows:
+            _entity_store_put(ENTITY_EDGE_TYPES[edge], row, fields, seen_at=started_at)
+    _register_invalidation_account(act_id)
+    _publish_account_mirror(act_id)
+    return summary
+
+
+def _read_from_mirror(
+    act_id: str,
+    edge: str,
+    fields: Optional[List[str]],
+    limit: Optional[int],
+    after: Optional[str],
+    updated_since: Optional[int],
+    effective_status: Optional[List[str]],
+) -> Optional[Dict]:
+    """Answers a listing request from the account mirror, or returns None if it cannot.
+
+    The mirror is used only after an initial sync, when the requested fields are all
+    mirrored and any 'after' cursor is one the mirror issued itself. A stale mirror
+    is brought up to date with a delta sync first; if that sync fails the request
+    goes to the API instead, except when paging on with a mirror cursor, which the
+    API cannot resolve: then the stale mirror is served.
+
+    Raises:
+        ValueError: If a mirror cursor is malformed.
+    """
+    if after and not after.startswith(MIRROR_CURSOR_PREFIX):
+        return None
+    offset = 0
+    if after:
+        offset_text = after[len(MIRROR_CURSOR_PREFIX):]
+        if not offset_text.isdigit():
+            raise ValueError(f"Invalid cursor '{after}': use a cursor returned by an earlier page of this listing")
+        offset = int(offset_text)
+    requested_fields = fields or ['id']
+    if not set(requested_fields).issubset(MIRROR_FIELDS[edge]):
+        return None
+
+    with _MIRROR_LOCK:
+        mirror = _ACCOUNT_MIRRORS.get(act_id)
+        if mirror is None:
+            return None
+        stale = time.time() - mirror['synced_at'] > _mirror_max_age(act_id)
+    _register_invalidation_account(act_id)
+    if stale:
+        try:
+            _sync_account_mirror(act_id)
+        except (requests.exceptions.RequestException, CircuitOpenError, KnownBadObjectError) as e:
+            print(f"Delta sync of the {act_id} mirror failed: {e}", file=sys.stderr)
+            if not after:
+                return None
+    with _MIRROR_LOCK:
+        objects = list(_ACCOUNT_MIRRORS[act_id]['objects'][edge].values())
+
+    if effective_status:
+        objects = [obj for obj in objects if obj.get('effective_status') in effective_status]
+    else:
+        # Match the Graph API default of leaving deleted objects out of listings
+        objects = [obj for obj in objects if obj.get('effective_status') != 'DELETED']
+    if updated_since:
+        objects = [
+            obj for obj in objects
+            if (_parse_graph_time(obj.get('updated_time')) or 0) >= updated_since
+        ]
+
+    page_size = limit if limit else len(objects)
+    page = objects[offset:offset + page_size]
+    paging = {'cursors': {'before': f"{MIRROR_CURSOR_PREFIX}{offset}"}}
+    if offset + page_size < len(objects):
+        paging['cursors']['after'] = f"{MIRROR_CURSOR_PREFIX}{offset + page_size}"
+
+    return {
+        'data': [{key: obj[key] for key in requested_fields if key in obj} for obj in page],
+        'paging': paging,
+    }
+
+
+# --- Activity Tail ---
+# Incremental polling of the 'activities' edge. Each object keeps a persisted
+# high-water mark (latest event_time plus the dedup keys seen at that time), so a
+# poll only downloads newer events. New events are appended to a local NDJSON log,
+# and each consumer remembers how far into the log it has read. Once every
+# consumer has read past the first ACTIVITY_LOG_COMPACT_BYTES of the log, that
+# part is cut off. Checkpoint and log updates take a file lock, so server
+# processes sharing the state directory can tail the same object.
+
+ACTIVITY_TAIL_FIELDS = [
+    'event_time', 'event_type', 'translated_event_type', 'object_id', 'object_name',
+    'object_type', 'actor_id', 'actor_name', 'extra_data', 'date_time_in_timezone'
+]
+
+ACTIVITY_CONSUMER_IDLE_SECONDS = 7 * 86400 # Read positions unused for longer are dropped
+ACTIVITY_LOG_COMPACT_BYTES = 1024 * 1024
+
+_ACTIVITY_TAIL_LOCK = threading.RLock()
+
+
+@contextmanager
+def _activity_log_lock(object_id: str):
+    """Holds the lock on an object's activity checkpoint and log, across processes where possible."""
+    with _ACTIVITY_TAIL_LOCK:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(_get_state_dir('activities'), f"{object_id}.lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _activity_dedup_key(event: Dict[str, Any]) -> str:
+    """Builds a stable key identifying an activity event."""
+    raw = json.dumps(
+        [event.get('event_time'), event.get('event_type'), event.get('object_id'),
+         event.get('actor_id'), event.get('extra_data')],
+        sort_keys=True
+    )
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _log_offset_at_time(log_path: str, end: int, start_time: float) -> int:
+    """Returns the byte offset of the first logged event at or after `start_time`
+    (the log is in chronological order), or `end` if there is none."""
+    offset = 0
+    with open(log_path, 'rb') as log_file:
+        while offset < end:
+            line = log_file.readline()
+            event_time = _parse_graph_time(_json_loads(line).get('event_time'))
+            if event_time is not None and event_time >= start_time:
+                return offset
+            offset += len(line)
+    return end
+
+
+def _load_activity_checkpoint(checkpoint_path: str, log_path: str) -> Dict[str, Any]:
+    """Loads an object's tail checkpoint and cuts the log back to what it covers.
+
+    Offsets in the checkpoint count from the start of the log as first written;
+    'log_start' is the offset of the first byte still in the file. Events are
+    appended to the log before the checkpoint is saved, so a crash in between
+    leaves lines the checkpoint does not know about; they are dropped here and
+    fetched again by the next poll. A compaction cut short is finished or undone.
+    """
+    checkpoint = _load_json_file(checkpoint_path, {
+        'event_time': None, 'keys': [], 'logged_events': 0, 'log_start': 0, 'log_bytes': 0,
+        'consumer_offsets': {}, 'consumer_seen': {},
+    })
+    log_dir, prefix = os.path.split(log_path)
+    for name in os.listdir(log_dir):
+        if name.startswith(f"{prefix}.") and name.endswith('.tmp'):
+            # <log>.<start>.tmp is a compacted copy; it is current once the checkpoint says so
+            if name[len(prefix) + 1:-len('.tmp')] == str(checkpoint['log_start']):
+                os.replace(os.path.join(log_dir, name), log_path)
+            else:
+                os.remove(os.path.join(log_dir, name))
+    log_size = checkpoint['log_bytes'] - checkpoint['log_start']
+    if os.path.exists(log_path) and os.path.getsize(log_path) > log_size:
+        with open(log_path, 'r+b') as log_file:
+            log_file.truncate(log_size)
+    return checkpoint
+
+
+def _compact_activity_log(checkpoint_path: str, log_path: str, checkpoint: Dict[str, Any]) -> None:
+    """Cuts off the start of the log that every consumer has read, once it is large
+    enough. Saves the checkpoint. Caller holds the object's log lock."""
+    start = min(checkpoint['consumer_offsets'].values(), default=checkpoint['log_start'])
+    if start - checkpoint['log_start'] < ACTIVITY_LOG_COMPACT_BYTES:
+        _save_json_file(checkpoint_path, checkpoint)
+        return
+    compacted_path = f"{log_path}.{start}.tmp"
+    with open(log_path, 'rb') as log_file, open(compacted_path, 'wb') as compacted:
+        log_file.seek(start - checkpoint['log_start'])
+        shutil.copyfileobj(log_file, compacted)
+    checkpoint['log_start'] = start
+    _save_json_file(checkpoint_path, checkpoint)
+    os.replace(compacted_path, log_path)
+
+
+def _drop_activity_consumer(object_id: str, consumer: str) -> None:
+    """Forgets a consumer's read position so it no longer holds back log compaction."""
+    state_dir = _get_state_dir('activities')
+    checkpoint_path = os.path.join(state_dir, f"{object_id}.checkpoint.json")
+    log_path = os.path.join(state_dir, f"{object_id}.ndjson")
+    with _activity_log_lock(object_id):
+        if not os.path.exists(checkpoint_path):
+            return
+        checkpoint = _load_activity_checkpoint(checkpoint_path, log_path)
+        checkpoint['consumer_offsets'].pop(consumer, None)
+        checkpoint['consumer_seen'].pop(consumer, None)
+        _compact_activity_log(checkpoint_path, log_path, checkpoint)
+
+
+def _tail_activities(
+    object_id: str,
+    fields: Optional[List[str]] = None,
+    since: Optional[str] = None,
+    consumer: str = 'default',
+    start_time: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Fetches activities newer than the object's checkpoint and returns unread log entries.
+
+    Args:
+        object_id: Ad account (act_...) or ad set ID whose 'activities' edge is tailed.
+        fields: Extra activity fields to request on top of ACTIVITY_TAIL_FIELDS.
+        since: Start of the first poll when no checkpoint exists yet. Ignored afterwards.
+        consumer: Name of the reader. Every consumer sees each logged event exactly once.
+        start_time: Unix time of the first logged event a consumer new to the log
+            reads. By default a new consumer reads all of the log that is left
+            after compaction.
+    """
+    state_dir = _get_state_dir('activities')
+    checkpoint_path = os.path.join(state_dir, f"{object_id}.checkpoint.json")
+    log_path = os.path.join(state_dir, f"{object_id}.ndjson")
+
+    with _activity_log_lock(object_id):
+        high_water = _load_activity_checkpoint(checkpoint_path, log_path)['event_time']
+
+    # The Graph requests run without the lock; events another poll logged meanwhile
+    # are filtered out below against the checkpoint as it is then
+    access_token = _get_fb_access_token()
+    url = f"{FB_GRAPH_URL}/{object_id}/activities"
+    request_fields = ACTIVITY_TAIL_FIELDS + [f for f in (fields or []) if f not in ACTIVITY_TAIL_FIELDS]
+    params = _prepare_params(
+        {'access_token': access_token},
+        fields=request_fields,
+        limit=_adaptive_page_limit('activities'),
+        since=int(high_water) if high_water is not None else since
+    )
+    fetched_events = []
+    for event in _iter_graph_rows(url, params, adaptive=True):
+        event_time = _parse_graph_time(event.get('event_time'))
+        if event_time is not None:
+            event['dedup_key'] = _activity_dedup_key(event)
+            fetched_events.append((event_time, event))
+
+    with _activity_log_lock(object_id):
+        checkpoint = _load_activity_checkpoint(checkpoint_path, log_path)
+        log_bytes_before = checkpoint['log_bytes']
+        high_water = checkpoint['event_time']
+        seen_keys = set(checkpoint['keys'])
+        new_events = [
+            (event_time, event) for event_time, event in fetched_events
+            if high_water is None or event_time > high_water
+            or (event_time == high_water and event['dedup_key'] not in seen_keys)
+        ]
+
+        # The edge returns newest first; the log is kept in chronological order
+        new_events.sort(key=lambda item: item[0])
+        if new_events:
+            data = b''.join((_json_dumps(event) + '\n').encode('utf-8') for _, event in new_events)
+            with open(log_path, 'ab') as log_file:
+                log_file.write(data)
+            latest = new_events[-1][0]
+            latest_keys = {event['dedup_key'] for event_time, event in new_events if event_time == latest}
+            if latest == high_water:
+                latest_keys |= seen_keys
+            checkpoint['event_time'] = latest
+            checkpoint['keys'] = sorted(latest_keys)
+            checkpoint['logged_events'] += len(new_events)
+            checkpoint['log_bytes'] += len(data)
+
+        log_start = checkpoint['log_start']
+        read_from = checkpoint['consumer_offsets'].get(consumer)
+        if read_from is None:
+            read_from = log_start
+            if start_time is not None and log_bytes_before > log_start:
+                read_from += _log_offset_at_time(log_path, log_bytes_before - log_start, start_time)
+        unread = []
+        if checkpoint['log_bytes'] > read_from:
+            with open(log_path, 'rb') as log_file:
+                log_file.seek(read_from - log_start)
+                unread = [_json_loads(line) for line in log_file.read(checkpoint['log_bytes'] - read_from).splitlines()]
+        now = time.time()
+        offsets, seen = checkpoint['consumer_offsets'], checkpoint['consumer_seen']
+        for name in list(offsets):
+            if now - seen.get(name, now) > ACTIVITY_CONSUMER_IDLE_SECONDS:
+                offsets.pop(name)
+                seen.pop(name, None)
+        offsets[consumer] = checkpoint['log_bytes']
+        seen[consumer] = now
+        _compact_activity_log(checkpoint_path, log_path, checkpoint)
+
+    return {
+        'object_id': object_id,
+        'data': unread,
+        'fetched': len(new_events),
+        'checkpoint': {
+            'event_time': checkpoint['event_time'],
+            'dedup_keys': len(checkpoint['keys']),
+            'logged_events': checkpoint['logged_events'],
+        },
+        'log_path': log_path,
+    }
+
+
+# --- Response Cache & Activity-Driven Invalidation ---
+# Insights responses are cached for a short time and tagged with every object ID
+# they depend on. With --activity-invalidation a background poller tails the
+# activities of each account in use and evicts exactly the mirror objects and
+# insights entries that the change events name, which is what allows mirrored
+# structure to be trusted for much longer. Accounts not used for
+# ACTIVITY_INVALIDATION_IDLE_SECONDS are no longer polled.
+
+INSIGHTS_CACHE_TTL_SECONDS = 300
+MIRROR_MAX_AGE_INVALIDATED_SECONDS = 3600 # Used while activity polling covers the account
+ACTIVITY_INVALIDATION_ENABLED = None # Set from --activity-invalidation on first use
+ACTIVITY_INVALIDATION_INTERVAL_SECONDS = 60
+ACTIVITY_INVALIDATION_IDLE_SECONDS = 3600
+ACTIVITY_OBJECT_TYPE_EDGES = {
+    'CAMPAIGN': 'campaigns',
+    'CAMPAIGN_GROUP': 'campaigns',
+    'ADSET': 'adsets',
+    'AD_SET': 'adsets',
+    'CAMPAIGN_SET': 'adsets',
+    'AD': 'ads',
+    'AD_GROUP': 'ads',
+}
+INSIGHTS_ROW_ID_FIELDS = ['account_id', 'campaign_id', 'adset_id', 'ad_id']
+
+# cache key -> {'url', 'params', 'response', 'expires_at', 'object_ids': set, 'act_id'}
+_RESPONSE_CACHE: Dict[str, Dict[str, Any]] = {}
+_RESPONSE_CACHE_LOCK = threading.RLock()
+# act_id -> Unix time of the last successful activity poll (0 until the first one)
+_INVALIDATION_ACCOUNTS: Dict[str, float] = {}
+# act_id -> Unix time the account's cached data was last used
+_INVALIDATION_LAST_USED: Dict[str, float] = {}
+_INVALIDATION_STARTED_AT = time.time()
+_INVALIDATION_THREAD = None
+
+
+def _cache_key(url: str, params: Dict[str, Any]) -> str:
+    """Builds a cache key from a request URL and its parameters, leaving out the token."""
+    relevant = {k: v for k, v in params.items() if k != 'access_token'}
+    return f"{url}?{json.dumps(relevant, sort_keys=True, default=str)}"
+
+
+def _normalize_act_id(account_id: Optional[str]) -> Optional[str]:
+    """Returns the 'act_' prefixed form of an ad account ID."""
+    if not account_id:
+        return None
+    account_id = str(account_id)
+    return account_id if account_id.startswith('act_') else f"act_{account_id}"
+
+
+def _cached_insights_call(object_id: str, url: str, params: Dict[str, Any]) -> Dict:
+    """Serves an insights request from the response cache, calling the Graph API on a miss.
+
+    On a miss, finer cached rows are rolled up locally when possible (see
+    `_rollup_from_cache`). Each entry records the queried object and every
+    account/campaign/ad set/ad ID in its rows so the activity poller can evict
+    it when one of those objects changes.
+    """
+    key = _cache_key(url, params)
+    with _RESPONSE_CACHE_LOCK:
+        entry = _RESPONSE_CACHE.get(key)
+        if entry and entry['expires_at'] > time.time():
+            if entry['act_id']:
+                _register_invalidation_account(entry['act_id'])
+            return entry['response']
+    return _singleflight(('insights', key), lambda: _load_insights_response(key, object_id, url, params))
+
+
+def _load_insights_response(key: str, object_id: str, url: str, params: Dict[str, Any]) -> Dict:
+    """Answers a response cache miss for `_cached_insights_call` from the shared cache
+    or the Graph API, storing the result."""
+    with _RESPONSE_CACHE_LOCK:
+        entry = _RESPONSE_CACHE.get(key)
+        if entry and entry['expires_at'] > time.time():
+            return entry['response']
+    return _shared_singleflight(
+        f"insights:{key}",
+        lambda: _adopt_shared_insights(key),
+        lambda: _fetch_insights_response(key, object_id, url, params)
+    )
+
+
+def _adopt_shared_insights(key: str) -> Optional[Dict]:
+    """Copies an insights entry another process stored into the response cache."""
+    entry = _shared_cache_get(f"insights:{key}")
+    if entry is None:
+        return None
+    entry['object_ids'] = set(entry['object_ids'])
+    for row in entry['response'].get('data', []):
+        _index_hierarchy(row)
+    if entry['act_id']:
+        _register_invalidation_account(entry['act_id'])
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[key] = entry
+    return entry['response']
+
+
+def _fetch_insights_response(key: str, object_id: str, url: str, params: Dict[str, Any]) -> Dict:
+    """Rolls up or fetches an insights response and stores it locally and in the shared cache."""
+    response = _rollup_from_cache(url, params)
+    if response is None:
+        response = _make_graph_api_call(url, params)
+
+    object_ids = {object_id}
+    act_id = object_id if object_id.startswith('act_') else None
+    for row in response.get('data', []):
+        for field in INSIGHTS_ROW_ID_FIELDS:
+            if row.get(field):
+                object_ids.add(str(row[field]))
+        if act_id is None and row.get('account_id'):
+            act_id = _normalize_act_id(row['account_id'])
+    if act_id:
+        object_ids.add(act_id)
+        _register_invalidation_account(act_id)
+
+    entry = {
+        'url': url,
+        'params': {k: v for k, v in params.items() if k != 'access_token'},
+        'response': response,
+        'expires_at': time.time() + INSIGHTS_CACHE_TTL_SECONDS,
+        'object_ids': object_ids,
+        'act_id': act_id,
+    }
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[key] = entry
+    _shared_cache_put(f"insights:{key}", {**entry, 'object_ids': sorted(object_ids)},
+                      entry['expires_at'], act_id, object_ids)
+    return response
+
+
+def _mirror_max_age(act_id: str) -> float:
+    """Returns how long the account's mirror may be served without a delta sync."""
+    last_poll = _INVALIDATION_ACCOUNTS.get(act_id)
+    if last_poll and time.time() - last_poll < 2 * ACTIVITY_INVALIDATION_INTERVAL_SECONDS:
+        return MIRROR_MAX_AGE_INVALIDATED_SECONDS
+    return MIRROR_MAX_AGE_SECONDS
+
+
+def _activity_invalidation_enabled() -> bool:
+    global ACTIVITY_INVALIDATION_ENABLED
+    if ACTIVITY_INVALIDATION_ENABLED is None:
+        ACTIVITY_INVALIDATION_ENABLED = '--activity-invalidation' in sys.argv
+    return ACTIVITY_INVALIDATION_ENABLED
+
+
+def _invalidation_consumer() -> str:
+    """Names this process's reader of the shared activity logs."""
+    return f"invalidation:{os.getpid()}"
+
+
+def _register_invalidation_account(act_id: str) -> None:
+    """Marks an account's cached data as in use, adding the account to the activity
+    poller (and starting the poller thread) if needed."""
+    global _INVALIDATION_THREAD
+    if not _activity_invalidation_enabled():
+        return
+    _INVALIDATION_LAST_USED[act_id] = time.time()
+    _INVALIDATION_ACCOUNTS.setdefault(act_id, 0)
+    if _INVALIDATION_THREAD is None:
+        _INVALIDATION_THREAD = threading.Thread(
+            target=_invalidation_loop, name='activity-invalidation', daemon=True
+        )
+        _INVALIDATION_THREAD.start()
+
+
+def _expire_idle_invalidation_accounts() -> List[str]:
+    """Stops polling accounts not used for ACTIVITY_INVALIDATION_IDLE_SECONDS and
+    releases their activity logs for compaction. Returns the expired accounts."""
+    idle_since = time.time() - ACTIVITY_INVALIDATION_IDLE_SECONDS
+    expired = [act_id for act_id in list(_INVALIDATION_ACCOUNTS)
+               if _INVALIDATION_LAST_USED.get(act_id, 0) < idle_since]
+    for act_id in expired:
+        _INVALIDATION_ACCOUNTS.pop(act_id, None)
+        _INVALIDATION_LAST_USED.pop(act_id, None)
+        try:
+            _drop_activity_consumer(act_id, _invalidation_consumer())
+        except OSError as e:
+            print(f"Releasing the activity log of {act_id} failed: {e}", file=sys.stderr)
+    return expired
+
+
+def _invalidation_loop() -> None:
+    """Polls the activities of every account in use forever."""
+    while True:
+        time.sleep(ACTIVITY_INVALIDATION_INTERVAL_SECONDS)
+        _expire_idle_invalidation_accounts()
+        for act_id in list(_INVALIDATION_ACCOUNTS):
+            try:
+                _invalidate_from_activities(act_id)
+            except Exception as e:
+                print(f"Activity invalidation for {act_id} failed: {e}", file=sys.stderr)
+
+
+def _invalidate_from_activities(act_id: str) -> Dict[str, Any]:
+    """Applies the account's new activity events to the mirror and the insights cache.
+
+    Mirror objects named by an event are re-fetched (or added, for newly created
+    objects); insights entries depending on a changed object or one of its
+    mirrored parents are evicted. An account-level event evicts all of the
+    account's insights entries.
+
+    Every process reads the shared activity log as its own consumer, since each
+    has its own caches to evict. A process starts with the events of the last
+    MIRROR_MAX_AGE_INVALIDATED_SECONDS before it started, which covers anything it
+    restored from a snapshot or adopted from the shared cache.
+    """
+    events = _tail_activities(
+        act_id,
+        consumer=_invalidation_consumer(),
+        start_time=_INVALIDATION_STARTED_AT - MIRROR_MAX_AGE_INVALIDATED_SECONDS
+    )['data']
+    changed: Dict[str, str] = {}
+    account_changed = False
+    for event in events:
+        object_id = event.get('object_id')
+        edge = ACTIVITY_OBJECT_TYPE_EDGES.get(str(event.get('object_type', '')).upper())
+        if edge and object_id:
+            changed[str(object_id)] = edge
+        elif str(event.get('object_type', '')).upper() == 'ACCOUNT':
+            account_changed = True
+
+    affected_ids = set(changed)
+    refreshed = 0
+    _entity_store_evict(changed)
+    with _MIRROR_LOCK:
+        mirrored = act_id in _ACCOUNT_MIRRORS
+    if mirrored and changed:
+        # The sync lock keeps a concurrent sync from replacing the mirror under the
+        # refresh; _MIRROR_LOCK is only held while the mirror is read or updated
+        with _mirror_sync_lock(act_id):
+            by_edge: Dict[str, List[str]] = {}
+            with _MIRROR_LOCK:
+                mirror = _ACCOUNT_MIRRORS[act_id]
+                for object_id, edge in changed.items():
+                    current = mirror['objects'][edge].get(object_id, {})
+                    affected_ids.update(str(current[f]) for f in ('campaign_id', 'adset_id') if current.get(f))
+                    by_edge.setdefault(edge, []).append(object_id)
+            for edge, ids in by_edge.items():
+                try:
+                    fetched, missing = _fetch_objects_by_ids(ids, MIRROR_FIELDS[edge])
+                except (requests.exceptions.RequestException, CircuitOpenError) as e:
+                    # Keep the objects, but have the next read delta-sync the mirror
+                    print(f"Refreshing changed {edge} of {act_id} failed: {e}", file=sys.stderr)
+                    with _MIRROR_LOCK:
+                        mirror['synced_at'] = 0
+                    continue
+                for row in fetched.values():
+                    _entity_store_put(ENTITY_EDGE_TYPES[edge], row, ','.join(MIRROR_FIELDS[edge]))
+                with _MIRROR_LOCK:
+                    mirror['objects'][edge].update(fetched)
+                    for object_id in missing:
+                        mirror['objects'][edge].pop(object_id, None)
+                    if len(fetched) + len(missing) < len(ids):
+                        mirror['synced_at'] = 0
+                refreshed += len(fetched)
+            _publish_account_mirror(act_id)
+
+    evicted = 0
+    with _RESPONSE_CACHE_LOCK:
+        for key, entry in list(_RESPONSE_CACHE.items()):
+            if (account_changed and entry['act_id'] == act_id) or entry['object_ids'] & affected_ids:
+                del _RESPONSE_CACHE[key]
+                evicted += 1
+    _shared_cache_evict('insights:', act_id if account_changed else None, affected_ids)
+
+    _INVALIDATION_ACCOUNTS[act_id] = time.time()
+    return {
+        'act_id': act_id,
+        'events': len(events),
+        'changed_objects': sorted(changed),
+        'account_changed': account_changed,
+        'mirror_objects_refreshed': refreshed,
+        'insights_entries_evicted': evicted,
+    }
+
+
+# --- Local Insights Roll-up ---
+# Answers a coarser insights query (higher level and/or coarser time_increment)
+# by aggregating finer rows that are already in the response cache. Only additive
+# metrics are summed; ratios are recomputed from their summed numerators. Queries
+# touching non-additive metrics such as reach or frequency are left to the API.
+
+INSIGHTS_LEVEL_RANK = {'ad': 0, 'adset': 1, 'campaign': 2, 'account': 3}
+INSIGHTS_LEVEL_DIMENSIONS = {
+    'ad': ['ad_id', 'ad_name'],
+    'adset': ['adset_id', 'adset_name'],
+    'campaign': ['campaign_id', 'campaign_name'],
+    'account': ['account_id', 'account_name', 'account_currency'],
+}
+ADDITIVE_INSIGHTS_FIELDS = {
+    'impressions', 'clicks', 'spend', 'inline_link_clicks', 'inline_post_engagement',
+    'social_spend',
+}
+ADDITIVE_ACTION_FIELDS = {
+    'actions', 'action_values', 'conversions', 'conversion_values', 'outbound_clicks',
+    'video_play_actions', 'video_thruplay_watched_actions', 'video_30_sec_watched_actions',
+    'video_p25_watched_actions', 'video_p50_watched_actions', 'video_p75_watched_actions',
+    'video_p95_watched_actions', 'video_p100_watched_actions',
+}
+# Derived ratio -> (numerator, denominator, multiplier)
+DERIVED_INSIGHTS_FIELDS = {
+    'ctr': ('clicks', 'impressions', 100),
+    'cpc': ('spend', 'clicks', 1),
+    'cpm': ('spend', 'impressions', 1000),
+    'inline_link_click_ctr': ('inline_link_clicks', 'impressions', 100),
+    'cost_per_inline_link_click': ('spend', 'inline_link_clicks', 1),
+}
+# Derived per-action cost list -> the action list it divides spend by
+DERIVED_ACTION_COST_FIELDS = {
+    'cost_per_action_type': 'actions',
+    'cost_per_conversion': 'conversions',
+    'cost_per_outbound_click': 'outbound_clicks',
+}
+# Parameters that may differ between the cached and the requested query
+ROLLUP_FLEXIBLE_PARAMS = {'fields', 'level', 'time_increment', 'time_range', 'date_preset', 'limit', 'sort'}
+
+
+def _format_metric(value: float) -> str:
+    """Formats a number the way the Graph API returns metrics: as a string."""
+    if value == int(value):
+        return str(int(value))
+    return f"{value:.6f}".rstrip('0').rstrip('.')
+
+
+def _rollup_bucket(date_start: str, time_increment: str, range_start: str, range_stop: str):
+    """Returns the (date_start, date_stop) bucket a daily row falls into."""
+    day = datetime.strptime(date_start, '%Y-%m-%d').date()
+    first = datetime.strptime(range_start, '%Y-%m-%d').date()
+    last = datetime.strptime(range_stop, '%Y-%m-%d').date()
+    if time_increment == 'all_days':
+        return range_start, range_stop
+    if time_increment == 'monthly':
+        month_start = day.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        return (max(month_start, first).isoformat(),
+                min(next_month - timedelta(days=1), last).isoformat())
+    days = int(time_increment)
+    bucket_start = first + timedelta(days=((day - first).days // days) * days)
+    return bucket_start.isoformat(), min(bucket_start + timedelta(days=days - 1), last).isoformat()
+
+
+def _sum_action_list(target: Dict[tuple, Dict[str, Any]], actions: List[Dict], identity_keys: List[str]) -> None:
+    """Adds an action list (e.g. 'actions') into `target`, keyed by its identity keys."""
+    for action in actions:
+        key = tuple(action.get(k) for k in identity_keys)
+        merged = target.setdefault(key, {k: action.get(k) for k in identity_keys if k in action})
+        for k, v in action.items():
+            if k not in identity_keys:
+                merged[k] = merged.get(k, 0.0) + float(v)
+
+
+def _rollup_from_cache(url: str, params: Dict[str, Any]) -> Optional[Dict]:
+    """Builds an insights response by rolling up finer cached rows, or returns None.
+
+    A cached response qualifies when it is for the same insights edge, was fully
+    paginated, matches every non-flexible parameter, is at the same or a finer level,
+    covers the requested dates with daily (or identical) granularity and contains
+    every field needed to derive the requested ones.
+    """
+    if any(params.get(p) for p in ('after', 'before', 'offset')) or not params.get('fields'):
+        return None
+    level = params.get('level')
+    if level not in INSIGHTS_LEVEL_RANK:
+        return None
+    requested_fields = params['fields'].split(',')
+    time_increment = str(params.get('time_increment', 'all_days'))
+
+    allowed_dimensions = {'date_start', 'date_stop'}
+    for dim_level, dims in INSIGHTS_LEVEL_DIMENSIONS.items():
+        if INSIGHTS_LEVEL_RANK[dim_level] >= INSIGHTS_LEVEL_RANK[level]:
+            allowed_dimensions.update(dims)
+    needed = set()
+    for field in requested_fields:
+        if field in ADDITIVE_INSIGHTS_FIELDS or field in ADDITIVE_ACTION_FIELDS or field in allowed_dimensions:
+            needed.add(field)
+        elif field in DERIVED_INSIGHTS_FIELDS:
+            needed.update(DERIVED_INSIGHTS_FIELDS[field][:2])
+        elif field in DERIVED_ACTION_COST_FIELDS:
+            needed.update(['spend', DERIVED_ACTION_COST_FIELDS[field]])
+        else:
+            # reach, frequency, unique_* and other non-additive metrics
+            return None
+
+    rigid = {k: v for k, v in params.items() if k not in ROLLUP_FLEXIBLE_PARAMS and k != 'access_token'}
+    requested_range = json.loads(params['time_range']) if params.get('time_range') else None
+
+    with _RESPONSE_CACHE_LOCK:
+        candidates = [entry for entry in _RESPONSE_CACHE.values() if entry['expires_at'] > time.time()]
+
+    source = None
+    for entry in candidates:
+        cached = entry['params']
+        if entry['url'] != url or entry['response'].get('paging', {}).get('next'):
+            continue
+        if {k: v for k, v in cached.items() if k not in ROLLUP_FLEXIBLE_PARAMS} != rigid:
+            continue
+        cached_level = cached.get('level')
+        if cached_level not in INSIGHTS_LEVEL_RANK or INSIGHTS_LEVEL_RANK[cached_level] > INSIGHTS_LEVEL_RANK[level]:
+            continue
+        cached_fields = cached.get('fields', '').split(',')
+        group_field = INSIGHTS_LEVEL_DIMENSIONS[level][0] if level != 'account' else None
+        if not (needed - {group_field}).issubset(cached_fields):
+            continue
+        if group_field and group_field not in cached_fields:
+            # Finer rows without the group ID can still be grouped through the
+            # hierarchy index when every row's own ID maps to a known parent
+            own_field = INSIGHTS_LEVEL_DIMENSIONS[cached_level][0] if cached_level != 'account' else None
+            if cached_level == level or own_field not in cached_fields or not all(
+                _hierarchy_ancestors(row.get(own_field, '')).get(group_field)
+                for row in entry['response'].get('data', [])
+            ):
+                continue
+        cached_increment = str(cached.get('time_increment', 'all_days'))
+        same_dates = (cached.get('time_range') == params.get('time_range')
+                      and cached.get('date_preset') == params.get('date_preset'))
+        if same_dates and (cached_increment in ('1', time_increment) or time_increment == 'all_days'):
+            source = (entry, None)
+            break
+        if cached_increment == '1' and requested_range and cached.get('time_range'):
+            cached_range = json.loads(cached['time_range'])
+            if cached_range['since'] <= requested_range['since'] and requested_range['until'] <= cached_range['until']:
+                source = (entry, requested_range)
+                break
+    if source is None:
+        return None
+
+    entry, date_filter = source
+    rows = entry['response'].get('data', [])
+    if date_filter:
+        rows = [r for r in rows if date_filter['since'] <= r.get('date_start', '') <= date_filter['until']]
+    if requested_range:
+        range_start, range_stop = requested_range['since'], requested_range['until']
+    else:
+        range_start = min((r['date_start'] for r in rows), default=None)
+        range_stop = max((r['date_stop'] for r in rows), default=None)
+
+    breakdowns = params['breakdowns'].split(',') if params.get('breakdowns') else []
+    action_identity = ['action_type'] + (params['action_breakdowns'].split(',') if params.get('action_breakdowns') else [])
+    group_field = INSIGHTS_LEVEL_DIMENSIONS[level][0] if level != 'account' else None
+    cached_level = entry['params']['level']
+    own_field = INSIGHTS_LEVEL_DIMENSIONS[cached_level][0] if cached_level != 'account' else None
+    cached_increment = str(entry['params'].get('time_increment', 'all_days'))
+
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        if cached_increment == time_increment:
+            bucket = (row.get('date_start'), row.get('date_stop'))
+        else:
+            bucket = _rollup_bucket(row['date_start'], time_increment, range_start, range_stop)
+        group_id = None
+        if group_field:
+            group_id = row.get(group_field) or _hierarchy_ancestors(row.get(own_field, '')).get(group_field)
+        key = (group_id, bucket) + tuple(row.get(b) for b in breakdowns)
+        group = groups.get(key)
+        if group is None:
+            dims = row if not group_field or group_field in row else dict(row, **{group_field: group_id})
+            group = {'dims': dims, 'bucket': bucket, 'sums': {}, 'lists': {}}
+            groups[key] = group
+        for field in needed:
+            if field in ADDITIVE_INSIGHTS_FIELDS:
+                group['sums'][field] = group['sums'].get(field, 0.0) + float(row.get(field, 0) or 0)
+            elif field in ADDITIVE_ACTION_FIELDS:
+                _sum_action_list(group['lists'].setdefault(field, {}), row.get(field, []), action_identity)
+
+    result_rows = []
+    for group in groups.values():
+        out = {}
+        for field in requested_fields:
+            if field in ADDITIVE_INSIGHTS_FIELDS:
+                out[field] = _format_metric(group['sums'][field])
+            elif field in ADDITIVE_ACTION_FIELDS:
+                out[field] = [
+                    {k: (_format_metric(v) if isinstance(v, float) else v) for k, v in action.items()}
+                    for action in group['lists'].get(field, {}).values()
+                ]
+            elif field in DERIVED_INSIGHTS_FIELDS:
+                numerator, denominator, multiplier = DERIVED_INSIGHTS_FIELDS[field]
+                if group['sums'].get(denominator):
+                    out[field] = _format_metric(group['sums'][numerator] / group['sums'][denominator] * multiplier)
+            elif field in DERIVED_ACTION_COST_FIELDS:
+                spend = group['sums']['spend']
+                costs = []
+                for action in group['lists'].get(DERIVED_ACTION_COST_FIELDS[field], {}).values():
+                    cost = {k: v for k, v in action.items() if k in action_identity}
+                    cost.update({k: _format_metric(spend / v) for k, v in action.items()
+                                 if k not in action_identity and v})
+                    costs.append(cost)
+                out[field] = costs
+            elif field in group['dims']:
+                out[field] = group['dims'][field]
+        for b in breakdowns:
+            if b in group['dims']:
+                out[b] = group['dims'][b]
+        out['date_start'], out['date_stop'] = group['bucket']
+        result_rows.append(out)
+
+    if params.get('sort'):
+        sort_field, _, direction = params['sort'].rpartition('_')
+        result_rows.sort(
+            key=lambda r: float(r.get(sort_field, 0) or 0) if sort_field in r else 0.0,
+            reverse=(direction == 'descending')
+        )
+
+    return {'data': result_rows, 'paging': {}}
+
+
+# --- Insights Query Planner ---
+# Estimates how many rows, pages and requests an insights query will take before
+# it is run, from locally known object counts (account mirror, hierarchy index)
+# and typical breakdown cardinalities. The planner then picks one execution
+# strategy: the local caches, one call, a fan-out per campaign, splitting the
+# date range, or an asynchronous report job for very large reports.
+
+PLANNER_MAX_ROWS_PER_CALL = 10000 # Larger synchronous reports tend to hit "reduce data" errors
+PLANNER_ASYNC_MIN_ROWS = 200000
+PLANNER_ASYNC_POLL_REQUESTS = 5
+PLANNER_ASYNC_PAGE_SIZE = 500
+PLANNER_MAX_LISTED_CALLS = 100
+PLANNER_MAXIMUM_PRESET_DAYS = 37 * 30 # Graph keeps 37 months of insights
+# Typical number of children per parent, used when no local counts are known
+PLANNER_DEFAULT_FANOUT = {'campaign': 10, 'adset': 3, 'ad': 3}
+BREAKDOWN_CARDINALITY = {
+    'age': 7, 'gender': 3, 'country': 50, 'region': 100, 'dma': 210,
+    'impression_device': 8, 'device_platform': 2, 'publisher_platform': 4,
+    'platform_position': 15, 'frequency_value': 20, 'product_id': 100,
+    'hourly_stats_aggregated_by_advertiser_time_zone': 24,
+    'hourly_stats_aggregated_by_audience_time_zone': 24,
+}
+BREAKDOWN_DEFAULT_CARDINALITY = 10
+
+
+def _date_preset_days(date_preset: str, today: Optional[datetime] = None) -> int:
+    """Returns the number of days a date preset covers as of today."""
+    today = today or datetime.now()
+    fixed = {
+        'today': 1, 'yesterday': 1, 'last_3d': 3, 'last_7d': 7, 'last_14d': 14,
+        'last_28d': 28, 'last_30d': 30, 'last_90d': 90, 'last_week_mon_sun': 7,
+        'last_week_sun_sat': 7, 'last_month': 30, 'last_quarter': 91, 'last_year': 365,
+        'maximum': PLANNER_MAXIMUM_PRESET_DAYS, 'data_maximum': PLANNER_MAXIMUM_PRESET_DAYS,
+    }
+    if date_preset in fixed:
+        return fixed[date_preset]
+    if date_preset == 'this_month':
+        return today.day
+    if date_preset == 'this_quarter':
+        quarter_start = datetime(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+        return (today - quarter_start).days + 1
+    if date_preset == 'this_year':
+        return today.timetuple().tm_yday
+    if date_preset == 'this_week_mon_today':
+        return today.weekday() + 1
+    if date_preset == 'this_week_sun_today':
+        return (today.weekday() + 1) % 7 + 1
+    return 30
+
+
+def _query_date_range(params: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Returns the query's {'since', 'until'} dates if it covers a single known range."""
+    if params.get('time_range'):
+        return json.loads(params['time_range'])
+    if params.get('date_preset') and not params.get('time_ranges'):
+        today = datetime.now()
+        days = _date_preset_days(params['date_preset'], today)
+        # Presets other than today/this_* end yesterday
+        until = today if params['date_preset'] == 'today' or params['date_preset'].startswith('this_') else today - timedelta(days=1)
+        since = until - timedelta(days=days - 1)
+        return {'since': since.strftime('%Y-%m-%d'), 'until': until.strftime('%Y-%m-%d')}
+    return None
+
+
+def _time_buckets(days: int, time_increment: str) -> int:
+    """Returns how many rows per object a date range yields at a time_increment."""
+    if time_increment == 'monthly':
+        return max(1, math.ceil(days / 30))
+    if str(time_increment).isdigit():
+        return max(1, math.ceil(days / int(time_increment)))
+    return 1
+
+
+def _planner_object_count(object_id: str, object_level: str, level: str) -> tuple:
+    """Estimates how many objects of `level` lie under the queried object.
+
+    Returns (count, source), where source is 'exact', 'account_mirror',
+    'hierarchy_index' or 'default'.
+    """
+    if INSIGHTS_LEVEL_RANK[level] >= INSIGHTS_LEVEL_RANK[object_level]:
+        return 1, 'exact'
+    with _MIRROR_LOCK:
+        mirror = _ACCOUNT_MIRRORS.get(object_id)
+        if mirror is not None:
+            objects = mirror['objects'][f"{level}s"].values()
+            return sum(1 for obj in objects if obj.get('effective_status') not in ('DELETED', 'ARCHIVED')), 'account_mirror'
+    descendants = _hierarchy_descendants(object_id, level)
+    if descendants:
+        return len(descendants), 'hierarchy_index'
+    count = 1
+    for child_level in ('campaign', 'adset', 'ad'):
+        if INSIGHTS_LEVEL_RANK[level] <= INSIGHTS_LEVEL_RANK[child_level] < INSIGHTS_LEVEL_RANK[object_level]:
+            count *= PLANNER_DEFAULT_FANOUT[child_level]
+    return count, 'default'
+
+
+def _plan_insights_query(object_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Estimates the cost of an insights query built by `_build_insights_params` and picks a strategy.
+
+    Nothing is fetched from the Graph API. Row counts are upper bounds: objects without
+    delivery in the date range return no rows.
+    """
+    url = f"{FB_GRAPH_URL}/{object_id}/insights"
+    object_level = 'account' if object_id.startswith('act_') else (_hierarchy_level(object_id) or 'campaign')
+    level = params.get('level') or object_level
+    if level not in INSIGHTS_LEVEL_RANK:
+        raise ValueError(f"Unsupported level '{level}'. Use one of: {', '.join(INSIGHTS_LEVEL_RANK)}")
+    level = level if INSIGHTS_LEVEL_RANK[level] <= INSIGHTS_LEVEL_RANK[object_level] else object_level
+
+    date_range = _query_date_range(params)
+    time_increment = str(params.get('time_increment', 'all_days'))
+    if params.get('time_ranges'):
+        time_ranges = json.loads(params['time_ranges'])
+        days = sum((datetime.strptime(r['until'], '%Y-%m-%d') - datetime.strptime(r['since'], '%Y-%m-%d')).days + 1
+                   for r in time_ranges)
+        buckets = len(time_ranges)
+    else:
+        days = ((datetime.strptime(date_range['until'], '%Y-%m-%d')
+                 - datetime.strptime(date_range['since'], '%Y-%m-%d')).days + 1) if date_range else 30
+        buckets = _time_buckets(days, time_increment)
+    objects, object_source = _planner_object_count(object_id, object_level, level)
+    breakdown_cardinality = 1
+    for breakdown in (params.get('breakdowns') or '').split(','):
+        if breakdown:
+            breakdown_cardinality *= BREAKDOWN_CARDINALITY.get(breakdown, BREAKDOWN_DEFAULT_CARDINALITY)
+    rows = objects * buckets * breakdown_cardinality
+    page_size = int(params.get('limit') or _adaptive_page_limit('insights'))
+
+    def pages(row_count: float) -> int:
+        return max(1, math.ceil(row_count / page_size))
+
+    estimate = {
+        'rows': rows,
+        'days': days,
+        'time_buckets_per_object': buckets,
+        'objects': objects,
+        'object_count_source': object_source,
+        'breakdown_cardinality': breakdown_cardinality,
+        'page_size': page_size,
+    }
+    plan = {'object_id': object_id, 'level': level, 'estimate': estimate, 'calls': [], 'alternatives': []}
+
+    def choose(strategy: str, reason: str, requests_needed: int, calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        plan.update(strategy=strategy, reason=reason)
+        estimate.update(api_calls=len(calls), requests=requests_needed,
+                        # Graph counts each read request as one call against the app and ad account limits
+                        rate_limit_points=requests_needed)
+        plan['calls'] = calls[:PLANNER_MAX_LISTED_CALLS]
+        plan['calls_truncated'] = len(calls) > PLANNER_MAX_LISTED_CALLS
+        return plan
+
+    with _RESPONSE_CACHE_LOCK:
+        entry = _RESPONSE_CACHE.get(_cache_key(url, params))
+        cached = entry is not None and entry['expires_at'] > time.time()
+    if cached:
+        return choose('local_cache', 'An identical query is in the insights response cache.', 0, [])
+    if _rollup_from_cache(url, params) is not None:
+        return choose('local_rollup', 'The answer can be rolled up from finer cached insights rows.', 0, [])
+
+    if rows <= PLANNER_MAX_ROWS_PER_CALL:
+        return choose('single_call', f"About {rows} rows fit in one paginated request.",
+                      pages(rows), [{}])
+
+    candidates = []
+    split_range = date_range if not params.get('time_ranges') and time_increment != 'all_days' else None
+    if split_range and days > 1:
+        step = 30 if time_increment == 'monthly' else int(time_increment)
+        chunk_days = max(step, int(days * PLANNER_MAX_ROWS_PER_CALL / rows) // step * step)
+        calls = []
+        start = datetime.strptime(split_range['since'], '%Y-%m-%d')
+        end = datetime.strptime(split_range['until'], '%Y-%m-%d')
+        while start <= end:
+            stop = min(end, start + timedelta(days=chunk_days - 1))
+            calls.append({'time_range': {'since': start.strftime('%Y-%m-%d'), 'until': stop.strftime('%Y-%m-%d')}})
+            start = stop + timedelta(days=1)
+        rows_per_call = rows / len(calls)
+        if rows_per_call <= PLANNER_MAX_ROWS_PER_CALL:
+            candidates.append(('time_split', f"Split the date range into {len(calls)} chunks of up to {chunk_days} days.",
+                               len(calls) * pages(rows_per_call), calls))
+
+    if object_level == 'account' and level in ('adset', 'ad'):
+        with _MIRROR_LOCK:
+            mirror = _ACCOUNT_MIRRORS.get(object_id)
+            campaign_ids = sorted(
+                campaign_id for campaign_id, campaign in mirror['objects']['campaigns'].items()
+                if campaign.get('effective_status') not in ('DELETED', 'ARCHIVED')
+            ) if mirror else sorted(_hierarchy_descendants(object_id, 'campaign'))
+        if campaign_ids and rows / len(campaign_ids) <= PLANNER_MAX_ROWS_PER_CALL:
+            calls = [{'filtering': [{'field': 'campaign.id', 'operator': 'IN', 'value': [campaign_id]}]}
+                     for campaign_id in campaign_ids]
+            candidates.append(('per_campaign_fanout', f"Query each of the {len(calls)} campaigns separately.",
+                               len(calls) * pages(rows / len(calls)), calls))
+
+    if candidates and rows < PLANNER_ASYNC_MIN_ROWS:
+        candidates.sort(key=lambda candidate: candidate[2])
+        plan['alternatives'] = [{'strategy': c[0], 'requests': c[2]} for c in candidates[1:]]
+        return choose(*candidates[0])
+
+    plan['alternatives'] = [{'strategy': c[0], 'requests': c[2]} for c in candidates]
+    async_requests = 1 + PLANNER_ASYNC_POLL_REQUESTS + math.ceil(rows / PLANNER_ASYNC_PAGE_SIZE)
+    return choose('async_report',
+                  f"About {rows} rows is too large for synchronous requests; run it as an asynchronous "
+                  f"report job (POST {object_id}/insights, poll the report_run_id, then page its insights edge).",
+                  async_requests, [{}])
+
+
+# --- Insights Output Shaping ---
+# Optional response formats for the insights tools. 'flat' pivots the nested
+# {action_type, value} lists (actions, action_values, cost_per_action_type, ...)
+# into one numeric column per action type, filled into preallocated float arrays
+# in a single pure-Python pass. This is a plain loop over rows and actions, not a
+# vectorized kernel: about 0.4 s per 100k rows with a few action types each (see
+# benchmarks/flatten_actions.py).
+# 'columnar' sends a column header plus one value array per column, with numbers
+# parsed and repetitive string columns dictionary-encoded.
+
+INSIGHTS_FORMATS = ['json', 'flat', 'columnar']
+COLUMNAR_DICTIONARY_MAX_RATIO = 0.5 # Dictionary-encode when distinct values <= ratio * rows
+ACTION_IDENTITY_KEYS = {'action_type', 'action_device', 'action_destination', 'action_target_id',
+                        'action_reaction', 'action_video_sound', 'action_video_type',
+                        'action_carousel_card_id', 'action_carousel_card_name', 'action_canvas_component_name'}
+
+
+def _is_action_list(value: Any) -> bool:
+    """True for a non-empty list of {action_type, value} dicts, the lists the pivot handles."""
+    return type(value) is list and bool(value) and type(value[0]) is dict and 'action_type' in value[0]
+
+
+def _pivot_action_lists(
+    rows: List[Dict[str, Any]],
+    flat_rows: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, array]:
+    """Pivots every {action_type, value} list in `rows` into per-action float columns.
+
+    Columns are named '<field>:<action_type>' for the value and
+    '<field>:<action_type>:<window>' for each attribution window present (e.g. when
+    'action_attribution_windows' was requested). Missing cells are NaN, as are
+    values that are not numbers. ROAS ('roas:<type>' = action_values / spend) and
+    CPA ('cpa:<type>' = spend / actions) columns are filled in the same pass. If
+    `flat_rows` (one dict per row) is given, every cell is also set there.
+    """
+    row_count = len(rows)
+    nan_column = array('d', [math.nan])
+    columns: Dict[str, array] = {}
+    # (field, identity values...) -> [column name, value column, roas/cpa column name or
+    # None, roas/cpa column once created]
+    targets: Dict[tuple, list] = {}
+
+    def column(name: str) -> array:
+        col = columns.get(name)
+        if col is None:
+            col = columns[name] = nan_column * row_count
+        return col
+
+    for i, row in enumerate(rows):
+        cells = flat_rows[i] if flat_rows is not None else None
+        spend = None
+        for field, value in row.items():
+            if type(value) is not list or not _is_action_list(value):
+                continue
+            if spend is None:
+                try:
+                    spend = float(row.get('spend'))
+                except (TypeError, ValueError):
+                    spend = 0.0
+            for action in value:
+                if len(action) == 2 and 'action_type' in action and 'value' in action:
+                    # The usual shape, without breakdowns or attribution windows
+                    identity = (field, action['action_type'])
+                    metrics = (('value', action['value']),)
+                else:
+                    identity = (field, *[action[k] for k in action if k in ACTION_IDENTITY_KEYS])
+                    metrics = [(k, v) for k, v in action.items() if k not in ACTION_IDENTITY_KEYS]
+                target = targets.get(identity)
+                if target is None:
+                    name = ':'.join(map(str, identity))
+                    derived = {'action_values': 'roas', 'actions': 'cpa'}.get(field)
+                    target = targets[identity] = [name, column(name), derived and f"{derived}:{name[len(field) + 1:]}", None]
+                name, value_column, derived_name, derived_column = target
+                for key, metric in metrics:
+                    try:
+                        amount = float(metric)
+                    except (TypeError, ValueError):
+                        continue
+                    if key != 'value':
+                        window_name = f"{name}:{key}"
+                        column(window_name)[i] = amount
+                        if cells is not None:
+                            cells[window_name] = amount
+                        continue
+                    value_column[i] = amount
+                    if cells is not None:
+                        cells[name] = amount
+                    if not spend or derived_name is None:
+                        continue
+                    if field == 'action_values':
+                        derived_value = amount / spend
+                    elif amount:
+                        derived_value = spend / amount
+                    else:
+                        continue
+                    if derived_column is None:
+                        derived_column = target[3] = column(derived_name)
+                    derived_column[i] = derived_value
+                    if cells is not None:
+                        cells[derived_name] = derived_value
+    return columns
+
+
+def _flatten_insights_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Returns `rows` with action lists replaced by their pivoted numeric columns.
+
+    Other nested values (e.g. 'adlabels' or 'tracking_specs' lists) are kept as-is.
+    """
+    flat_rows = [{k: v for k, v in row.items() if type(v) is not list or not _is_action_list(v)} for row in rows]
+    _pivot_action_lists(rows, flat_rows)
+    return flat_rows
+
+
+def _parse_metric(value: Any) -> Any:
+    """Parses a Graph API numeric string ('12', '3.45') into a number, else returns None."""
+    if not isinstance(value, str):
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _is_identifier_field(field: str) -> bool:
+    """True for ID and date fields, whose numeric-looking strings must stay strings."""
+    return field == 'id' or field.endswith('_id') or field.startswith('date_')
+
+
+def _to_columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Converts insights rows to a column-oriented payload.
+
+    Returns a dict with 'columns' (names in order), 'data' (one value list per
+    column) and 'dictionaries' (for dictionary-encoded columns, the distinct values
+    that the integer codes in 'data' index into). Metric strings become numbers and
+    action lists are pivoted as in the 'flat' format (missing cells are None).
+    """
+    row_count = len(rows)
+    names: List[str] = []
+    seen = set()
+    for row in rows:
+        for field, value in row.items():
+            if field in seen or _is_action_list(value):
+                continue
+            seen.add(field)
+            names.append(field)
+
+    data: Dict[str, List[Any]] = {}
+    dictionaries: Dict[str, List[Any]] = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if not _is_identifier_field(name):
+            parsed = [_parse_metric(v) for v in values]
+            if all(p is not None or v is None for p, v in zip(parsed, values)):
+                data[name] = parsed
+                continue
+        if all(v is None or isinstance(v, str) for v in values):
+            distinct = list(dict.fromkeys(values))
+            if len(distinct) <= max(1, row_count * COLUMNAR_DICTIONARY_MAX_RATIO):
+                codes = {v: i for i, v in enumerate(distinct)}
+                dictionaries[name] = distinct
+                data[name] = [codes[v] for v in values]
+                continue
+        data[name] = values
+
+    for name, col in _pivot_action_lists(rows).items():
+        names.append(name)
+        data[name] = [None if math.isnan(v) else v for v in col]
+
+    return {'columns': names, 'data': data, 'dictionaries': dictionaries, 'row_count': row_count}
+
+
+def _shape_insights_response(response: Dict, format: str) -> Dict:
+    """Converts an insights response to the requested output format."""
+    if format not in INSIGHTS_FORMATS:
+        raise ValueError(f"Unsupported format '{format}'. Use one of: {', '.join(INSIGHTS_FORMATS)}")
+    if format == 'json':
+        return response
+    shaped = {k: v for k, v in response.items() if k != 'data'}
+    if format == 'flat':
+        shaped['data'] = _flatten_insights_rows(response.get('data', []))
+    else:
+        shaped.update(_to_columnar(response.get('data', [])))
+    return shaped
+
+
+# --- Streaming Export ---
+# Runs an insights or listing query with automatic pagination and writes each row
+# to a local file as soon as it is decoded, so memory use does not grow with the
+# result size. Only the file path, row count and schema are returned.
+
+EXPORT_FORMATS = {'ndjson': 'ndjson', 'csv': 'csv', 'parquet': 'parquet'}
+EXPORT_LISTING_EDGES = ['campaigns', 'adsets', 'ads', 'adcreatives', 'activities']
+PARQUET_ROW_GROUP_ROWS = 500
+
+
+def _build_export_request(query: str, object_id: str, params: Optional[Dict[str, Any]]):
+    """Returns the (url, params) for an export query using the regular parameter builders."""
+    access_token = _get_fb_access_token()
+    query_params = dict(params or {})
+    query_params.setdefault('limit', _adaptive_page_limit(query))
+    if query == 'insights':
+        return (f"{FB_GRAPH_URL}/{object_id}/insights",
+                _build_insights_params({'access_token': access_token}, **query_params))
+    if query in EXPORT_LISTING_EDGES:
+        return (f"{FB_GRAPH_URL}/{object_id}/{query}",
+                _prepare_params({'access_token': access_token}, **query_params))
+    raise ValueError(f"Unsupported query '{query}'. Use 'insights' or one of: {', '.join(EXPORT_LISTING_EDGES)}")
+
+
+def _tabular_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns a row with nested values into flat scalar columns for CSV/Parquet output."""
+    flat = _flatten_insights_rows([row])[0]
+    for key, value in flat.items():
+        if isinstance(value, (dict, list)):
+            flat[key] = json.dumps(value)
+    return flat
+
+
+def _schema_type(field: str, value: Any) -> str:
+    """Names the column type of a value for the export schema."""
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)) or (not _is_identifier_field(field) and _parse_metric(value) is not None):
+        return 'number'
+    if isinstance(value, list):
+        return 'list'
+    if isinstance(value, dict):
+        return 'object'
+    return 'string'
+
+
+def _widen_schema_type(current: Optional[str], new: str) -> str:
+    """Combines the column types of two values, e.g. 'number' and 'string' -> 'string'."""
+    if current in (None, 'null') or current == new:
+        return new
+    return current if new == 'null' else 'string'
+
+
+def _export_rows(
+    rows,
+    file_format: str,
+    output_path: str,
+    append: bool = False,
+    schema: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """Writes an iterable of rows to `output_path`, returning the row count and schema.
+
+    NDJSON exports can continue an existing file (append=True), updating the schema
+    dict passed in; the dict is also kept current while rows are written. CSV and
+    Parquet need every column and its type up front, so their flattened rows are
+    first spooled to a temporary NDJSON file while the schema is collected, then
+    written out in a second pass.
+    """
+    row_count = 0
+    schema = schema if schema is not None else {}
+
+    def observe(row):
+        for key, value in row.items():
+            schema[key] = _widen_schema_type(schema.get(key), _schema_type(key, value) if value is not None else 'null')
+
+    if file_format == 'ndjson':
+        with open(output_path, 'a' if append else 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(_json_dumps(row) + '\n')
+                row_count += 1
+                observe(row)
+        return {'row_count': row_count, 'schema': schema}
+
+    spool_path = f"{output_path}.rows.tmp"
+    try:
+        with open(spool_path, 'w', encoding='utf-8') as spool:
+            for row in rows:
+                flat = _tabular_row(row)
+                spool.write(_json_dumps(flat) + '\n')
+                row_count += 1
+                observe(flat)
+
+        with open(spool_path, 'r', encoding='utf-8') as spool:
+            flat_rows = (_json_loads(line) for line in spool)
+            if file_format == 'csv':
+                with open(output_path, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=list(schema))
+                    writer.writeheader()
+                    writer.writerows(flat_rows)
+            else:
+                writer = None
+                while True:
+                    batch = list(itertools.islice(flat_rows, PARQUET_ROW_GROUP_ROWS))
+                    if batch or writer is None:
+                        writer = _write_parquet_batch(writer, batch, schema, output_path)
+                    if len(batch) < PARQUET_ROW_GROUP_ROWS:
+                        break
+                writer.close()
+    finally:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+    return {'row_count': row_count, 'schema': schema}
+
+
+def _write_parquet_batch(writer, batch: List[Dict[str, Any]], schema: Dict[str, str], output_path: str):
+    """Appends a batch of flat rows to a Parquet file as one row group."""
+    arrow_types = {'number': pyarrow.float64(), 'boolean': pyarrow.bool_()}
+    arrow_schema = pyarrow.schema([(name, arrow_types.get(kind, pyarrow.string())) for name, kind in schema.items()])
+    columns = {}
+    for name, kind in schema.items():
+        values = [row.get(name) for row in batch]
+        if kind == 'number':
+            values = [_parse_metric(v) for v in values]
+            values = [float(v) if v is not None else None for v in values]
+        elif kind != 'boolean':
+            values = [str(v) if v is not None else None for v in values]
+        columns[name] = values
+    table = pyarrow.table(columns, schema=arrow_schema)
+    if writer is None:
+        writer = pyarrow.parquet.ParquetWriter(output_path, arrow_schema)
+    writer.write_table(table)
+    return writer
+
+
+def _export_query(
+    query: str,
+    object_id: str,
+    params: Optional[Dict[str, Any]] = None,
+    file_format: str = 'ndjson',
+    output_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Streams every row of a query into a local file and describes the result."""
+    _check_export_format(file_format)
+    url, request_params = _build_export_request(query, object_id, params)
+    if output_path is None:
+        output_path = _default_export_path(query, object_id, file_format)
+
+    pages = 0
+
+    def on_page(next_url, next_params):
+        nonlocal pages
+        pages += 1
+
+    rows = _iter_graph_rows(url, request_params, adaptive=not (params or {}).get('limit'), on_page=on_page)
+    result = _export_rows(rows, file_format, output_path)
+    return {**_describe_export(output_path, file_format, result), 'pages': pages}
+
+
+def _check_export_format(file_format: str) -> None:
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported file_format '{file_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if file_format == 'parquet' and pyarrow is None:
+        raise Exception("Parquet export requires the 'pyarrow' package: pip install pyarrow")
+
+
+def _default_export_path(query: str, object_id: str, file_format: str) -> str:
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(_get_state_dir('exports'), f"{query}_{object_id}_{stamp}.{EXPORT_FORMATS[file_format]}")
+
+
+def _describe_export(output_path: str, file_format: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the summary returned for a finished export."""
+    return {
+        'path': os.path.abspath(output_path),
+        'format': file_format,
+        'row_count': result['row_count'],
+        'bytes': os.path.getsize(output_path),
+        'schema': [{'name': name, 'type': kind} for name, kind in result['schema'].items()],
+    }
+
+
+# --- Creative Asset Cache ---
+# Creative images and thumbnails are downloaded concurrently over one pooled HTTP
+# session and stored on disk under their content hash, so an asset shared by many
+# ads (same image_hash, or same CDN file behind differently signed URLs) is fetched
+# and stored once. The cache is size-bounded and evicts least recently used files.
+
+ASSET_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+ASSET_DOWNLOAD_WORKERS = 8
+ASSET_DOWNLOAD_TIMEOUT_SECONDS = 30
+ASSET_CREATIVE_FIELDS = 'image_hash,image_url,thumbnail_url'
+# Query parameters of Facebook CDN URLs that sign or route a request without
+# changing the file served; all other parameters (e.g. size or crop) are kept
+ASSET_SIGNATURE_PARAMS = {'oh', 'oe'}
+ASSET_SIGNATURE_PARAM_PREFIX = '_nc_'
+
+_ASSET_INDEX_LOCK = threading.Lock()
+_ASSET_SESSION = None
+
+
+def _asset_session() -> requests.Session:
+    """Returns the shared HTTP session, sized for the download worker pool."""
+    global _ASSET_SESSION
+    if _ASSET_SESSION is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=ASSET_DOWNLOAD_WORKERS, pool_maxsize=ASSET_DOWNLOAD_WORKERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _ASSET_SESSION = session
+    return _ASSET_SESSION
+
+
+def _asset_index_path() -> str:
+    return os.path.join(_get_state_dir('assets'), 'index.json')
+
+
+def _load_asset_index() -> Dict[str, Any]:
+    # 'keys': dedup key -> sha256; 'files': sha256 -> file metadata
+    return _load_json_file(_asset_index_path(), {'keys': {}, 'files': {}})
+
+
+def _asset_key(url: str, image_hash: Optional[str] = None) -> str:
+    """Returns the dedup key of an asset: its image_hash, or its URL without the signature parameters."""
+    if image_hash:
+        return f"hash:{image_hash}"
+    parsed = urlparse(url)
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name not in ASSET_SIGNATURE_PARAMS and not name.startswith(ASSET_SIGNATURE_PARAM_PREFIX)
+    )
+    return f"url:{parsed.netloc}{parsed.path}" + (f"?{urlencode(query)}" if query else '')
+
+
+def _download_asset(url: str) -> Dict[str, Any]:
+    """Streams one asset to a temporary file while hashing it, then stores it by content hash."""
+    asset_dir = _get_state_dir('assets')
+    temp_path = os.path.join(asset_dir, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with _asset_session().get(url, stream=True, timeout=ASSET_DOWNLOAD_TIMEOUT_SECONDS) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+            with open(temp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+        sha256 = digest.hexdigest()
+        extension = mimetypes.guess_extension(content_type) or os.path.splitext(urlparse(url).path)[1] or '.bin'
+        path = os.path.join(asset_dir, f"{sha256}{extension}")
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return {'sha256': sha256, 'path': path, 'bytes': size, 'content_type': content_type, 'source_url': url}
+
+
+def _enforce_asset_cache_limit(index: Dict[str, Any], keep: set) -> int:
+    """Deletes least recently used asset files until the cache fits ASSET_CACHE_MAX_BYTES."""
+    files = index['files']
+    total = sum(meta['bytes'] for meta in files.values())
+    evicted = 0
+    for sha256 in sorted(files, key=lambda s: files[s]['last_used']):
+        if total <= ASSET_CACHE_MAX_BYTES:
+            break
+        if sha256 in keep:
+            continue
+        meta = files.pop(sha256)
+        total -= meta['bytes']
+        evicted += 1
+        if os.path.exists(meta['path']):
+            os.remove(meta['path'])
+    if evicted:
+        index['keys'] = {key: sha256 for key, sha256 in index['keys'].items() if sha256 in files}
+    return evicted
+
+
+def _fetch_assets(assets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resolves asset descriptors ({'url', 'image_hash'?}) to cached local files.
+
+    Each distinct dedup key is downloaded at most once, concurrently with the others;
+    keys already in the cache are served from disk. Every descriptor gets 'path',
+    'sha256', 'bytes', 'content_type' and 'cached' added, or 'error' on failure.
+    """
+    with _ASSET_INDEX_LOCK:
+        index = _load_asset_index()
+    pending: Dict[str, str] = {}
+    for asset in assets:
+        asset['key'] = _asset_key(asset['url'], asset.get('image_hash'))
+        sha256 = index['keys'].get(asset['key'])
+        meta = index['files'].get(sha256) if sha256 else None
+        if not (meta and os.path.exists(meta['path'])) and asset['key'] not in pending:
+            pending[asset['key']] = asset['url']
+
+    results: Dict[str, Any] = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(ASSET_DOWNLOAD_WORKERS, len(pending))) as pool:
+            futures = {key: pool.submit(_download_asset, url) for key, url in pending.items()}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except (requests.exceptions.RequestException, OSError) as e:
+                    results[key] = {'error': str(e)}
+
+    now = time.time()
+    summary = {'downloaded': 0, 'cache_hits': 0, 'failed': 0, 'bytes_downloaded': 0, 'evicted': 0}
+    with _ASSET_INDEX_LOCK:
+        index = _load_asset_index()
+        for key, result in results.items():
+            if 'error' in result:
+                continue
+            index['keys'][key] = result['sha256']
+            index['files'].setdefault(result['sha256'], {
+                'path': result['path'], 'bytes': result['bytes'],
+                'content_type': result['content_type'], 'source_url': result['source_url'],
+            })
+            summary['downloaded'] += 1
+            summary['bytes_downloaded'] += result['bytes']
+        used = set()
+        for asset in assets:
+            key = asset.pop('key')
+            if 'error' in results.get(key, {}):
+                asset['error'] = results[key]['error']
+                summary['failed'] += 1
+                continue
+            sha256 = index['keys'].get(key)
+            meta = index['files'].get(sha256)
+            if meta is None:
+                asset['error'] = 'Asset is missing from the cache index'
+                summary['failed'] += 1
+                continue
+            meta['last_used'] = now
+            used.add(sha256)
+            cached = key not in results
+            summary['cache_hits'] += cached
+            asset.update(sha256=sha256, path=meta['path'], bytes=meta['bytes'],
+                         content_type=meta['content_type'], cached=cached)
+        summary['evicted'] = _enforce_asset_cache_limit(index, used)
+        summary['cache_bytes'] = sum(meta['bytes'] for meta in index['files'].values())
+        _save_json_file(_asset_index_path(), index)
+    return summary
+
+
+def _resolve_creative_assets(creative_ids: List[str], include_thumbnails: bool) -> List[Dict[str, Any]]:
+    """Builds asset descriptors for creatives, reading their image fields from the entity store or the API."""
+    creatives, missing = {}, []
+    for creative_id in dict.fromkeys(creative_ids):
+        creative = _entity_store_get('adcreative', creative_id, ASSET_CREATIVE_FIELDS)
+        if creative is not None:
+            creatives[creative_id] = creative
+        else:
+            missing.append(creative_id)
+    for creative in _fetch_creatives_by_ids(missing) if missing else []:
+        creatives[creative['id']] = creative
+
+    assets = []
+    for creative_id in dict.fromkeys(creative_ids):
+        creative = creatives.get(creative_id, {})
+        if creative.get('image_url'):
+            assets.append({'creative_id': creative_id, 'kind': 'image',
+                           'url': creative['image_url'], 'image_hash': creative.get('image_hash')})
+        if include_thumbnails and creative.get('thumbnail_url'):
+            assets.append({'creative_id': creative_id, 'kind': 'thumbnail', 'url': creative['thumbnail_url']})
+    return assets
+
+
+# --- Bulk Creative Retrieval ---
+# Many ads share one creative, so creatives for a set of ads are fetched by
+# resolving ad -> creative ID first (one expanded listing of the parent's ads, or
+# multi-ID lookups) and then requesting each distinct creative once.
+
+def _resolve_ad_creative_ids(
+    ad_ids: Optional[List[str]] = None,
+    parent_id: Optional[str] = None
+) -> tuple:
+    """Maps ads to their creative IDs, from a parent's ads listing and/or explicit ad IDs.
+
+    Returns:
+        tuple: ({ad_id: creative_id or None}, list of explicit ad IDs that are deleted
+        or inaccessible).
+    """
+    mapping: Dict[str, Optional[str]] = {}
+    if parent_id:
+        params = {'access_token': _get_fb_access_token(), 'fields': 'id,creative',
+                  'limit': _adaptive_page_limit('ads')}
+        for ad in _iter_graph_rows(f"{FB_GRAPH_URL}/{parent_id}/ads", params, adaptive=True):
+            mapping[ad['id']] = (ad.get('creative') or {}).get('id')
+
+    unresolved = []
+    for ad_id in dict.fromkeys(ad_ids or []):
+        if ad_id in mapping:
+            continue
+        ad = _entity_store_get('ad', ad_id, 'creative')
+        if ad is not None:
+            mapping[ad_id] = (ad.get('creative') or {}).get('id')
+        else:
+            unresolved.append(ad_id)
+    ads, missing = _fetch_objects_by_ids(unresolved, ['creative']) if unresolved else ({}, set())
+    for ad_id, ad in ads.items():
+        _entity_store_put('ad', ad, 'creative')
+        mapping[ad_id] = (ad.get('creative') or {}).get('id')
+    return mapping, [ad_id for ad_id in unresolved if ad_id in missing]
+
+
+# --- Ad Previews ---
+# Rendered previews come from the 'previews' edge, one ad format per request.
+# Requests for many creatives and formats run concurrently, and the returned
+# iframe bodies are cached by (creative, format) so repeat renders are free.
+
+PREVIEW_CACHE_TTL_SECONDS = 3600 # Preview iframes embed a signed URL that eventually expires
+PREVIEW_CACHE_MAX_ENTRIES = 2000
+PREVIEW_WORKERS = 8
+
+# (creative_id, ad_format) -> {'body': str, 'expires_at': float}
+_PREVIEW_CACHE: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+_PREVIEW_CACHE_LOCK = threading.Lock()
+
+
+def _fetch_preview(creative_id: str, ad_format: str) -> str:
+    """Fetches the rendered preview iframe of one creative in one ad format."""
+    params = {'access_token': _get_fb_access_token(), 'ad_format': ad_format}
+    response = _make_graph_api_call(f"{FB_GRAPH_URL}/{creative_id}/previews", params)
+    return ''.join(preview.get('body', '') for preview in response.get('data', []))
+
+
+def _render_previews(creative_ids: List[str], ad_formats: List[str]) -> Dict[str, Any]:
+    """Returns preview bodies for every (creative, format) pair, fetching uncached ones concurrently."""
+    previews: Dict[str, Dict[str, str]] = {creative_id: {} for creative_id in creative_ids}
+    pending = []
+    with _PREVIEW_CACHE_LOCK:
+        for creative_id in creative_ids:
+            for ad_format in ad_formats:
+                entry = _PREVIEW_CACHE.get((creative_id, ad_format))
+                if entry and entry['expires_at'] > time.time():
+                    _PREVIEW_CACHE.move_to_end((creative_id, ad_format))
+                    previews[creative_id][ad_format] = entry['body']
+                else:
+                    pending.append((creative_id, ad_format))
+    from_cache = len(creative_ids) * len(ad_formats) - len(pending)
+
+    errors = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(PREVIEW_WORKERS, len(pending))) as pool:
+            futures = {key: pool.submit(_fetch_preview, *key) for key in pending}
+            for (creative_id, ad_format), future in futures.items():
+                try:
+                    body = future.result()
+                except (requests.exceptions.RequestException, CircuitOpenError, KnownBadObjectError) as e:
+                    errors.append({'creative_id': creative_id, 'ad_format': ad_format, 'error': str(e)})
+                    continue
+                previews[creative_id][ad_format] = body
+                with _PREVIEW_CACHE_LOCK:
+                    _PREVIEW_CACHE[(creative_id, ad_format)] = {
+                        'body': body, 'expires_at': time.time() + PREVIEW_CACHE_TTL_SECONDS
+                    }
+                    while len(_PREVIEW_CACHE) > PREVIEW_CACHE_MAX_ENTRIES:
+                        _PREVIEW_CACHE.popitem(last=False)
+
+    return {
+        'previews': previews,
+        'errors': errors,
+        'summary': {'requested': len(creative_ids) * len(ad_formats), 'from_cache': from_cache,
+                    'fetched': len(pending) - len(errors), 'failed': len(errors)},
+    }
+
+
+# --- Result Handles ---
+# Large query results are kept server-side under a handle so an agent can read
+# different slices of them without re-running the query. Results live in memory
+# until the in-memory budget is exceeded, then the least recently used ones are
+# spilled to NDJSON files; past the total budget the least recently used handles
+# are dropped entirely.
+
+RESULT_STORE_MEMORY_BYTES = 64 * 1024 * 1024
+RESULT_STORE_MAX_BYTES = 512 * 1024 * 1024
+RESULT_HANDLE_PREVIEW_ROWS = 3
+RESULT_FILTER_OPERATORS = ['EQUAL', 'NOT_EQUAL', 'GREATER_THAN', 'GREATER_THAN_OR_EQUAL',
+                           'LESS_THAN', 'LESS_THAN_OR_EQUAL', 'IN', 'NOT_IN', 'CONTAIN', 'NOT_CONTAIN']
+
+# handle -> {'query', 'object_id', 'rows' (None once spilled), 'path', 'bytes', 'row_count', 'columns', 'created_at'}
+_RESULT_HANDLES: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_RESULT_HANDLES_LOCK = threading.RLock()
+
+
+def _enforce_result_store_limits() -> None:
+    """Spills and evicts least recently used results until both budgets are met."""
+    with _RESULT_HANDLES_LOCK:
+        in_memory = sum(r['bytes'] for r in _RESULT_HANDLES.values() if r['rows'] is not None)
+        for handle, result in _RESULT_HANDLES.items():
+            if in_memory <= RESULT_STORE_MEMORY_BYTES:
+                break
+            if result['rows'] is not None:
+                path = os.path.join(_get_state_dir('results'), f"{handle}.ndjson")
+                with open(path, 'w', encoding='utf-8') as f:
+                    for row in result['rows']:
+                        f.write(_json_dumps(row) + '\n')
+                result['rows'], result['path'] = None, path
+                in_memory -= result['bytes']
+
+        total = sum(r['bytes'] for r in _RESULT_HANDLES.values())
+        while total > RESULT_STORE_MAX_BYTES and len(_RESULT_HANDLES) > 1:
+            _, evicted = _RESULT_HANDLES.popitem(last=False)
+            total -= evicted['bytes']
+            if evicted['path'] and os.path.exists(evicted['path']):
+                os.remove(evicted['path'])
+
+
+def _store_result(query: str, object_id: str, rows) -> Dict[str, Any]:
+    """Stores an iterable of rows under a new handle and returns its summary."""
+    handle = f"res_{uuid.uuid4().hex[:12]}"
+    stored, preview, columns, size, row_count = [], [], {}, 0, 0
+    path, spill_file = None, None
+    try:
+        for row in rows:
+            encoded = _json_dumps(row)
+            size += len(encoded)
+            row_count += 1
+            columns.update(dict.fromkeys(row))
+            if len(preview) < RESULT_HANDLE_PREVIEW_ROWS:
+                preview.append(row)
+            if spill_file is None and size > RESULT_STORE_MEMORY_BYTES:
+                # Too big to keep in memory at all: continue straight to disk
+                path = os.path.join(_get_state_dir('results'), f"{handle}.ndjson")
+                spill_file = open(path, 'w', encoding='utf-8')
+                for kept in stored:
+                    spill_file.write(_json_dumps(kept) + '\n')
+                stored = None
+            if spill_file is None:
+                stored.append(row)
+            else:
+                spill_file.write(encoded + '\n')
+    finally:
+        if spill_file is not None:
+            spill_file.close()
+    result = {
+        'query': query,
+        'object_id': object_id,
+        'rows': stored,
+        'path': path,
+        'bytes': size,
+        'row_count': row_count,
+        'columns': list(columns),
+        'created_at': time.time(),
+    }
+    with _RESULT_HANDLES_LOCK:
+        _RESULT_HANDLES[handle] = result
+    _enforce_result_store_limits()
+    return {
+        'handle': handle,
+        'query': query,
+        'object_id': object_id,
+        'row_count': result['row_count'],
+        'bytes': size,
+        'columns': result['columns'],
+        'preview': preview,
+    }
+
+
+def _iter_result_rows(handle: str):
+    """Yields the rows of a stored result, from memory or from its spill file."""
+    with _RESULT_HANDLES_LOCK:
+        result = _RESULT_HANDLES.get(handle)
+        if result is None:
+            raise Exception(f"Unknown or expired result handle '{handle}'")
+        _RESULT_HANDLES.move_to_end(handle)
+        rows, path = result['rows'], result['path']
+    if rows is not None:
+        yield from rows
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield _json_loads(line)
+
+
+def _row_matches(row: Dict[str, Any], filters: List[Dict[str, Any]]) -> bool:
+    """Checks a row against filters in the Graph API 'filtering' shape."""
+    for flt in filters:
+        field, operator, expected = flt['field'], flt['operator'].upper(), flt.get('value')
+        actual = row.get(field)
+        if operator in ('GREATER_THAN', 'GREATER_THAN_OR_EQUAL', 'LESS_THAN', 'LESS_THAN_OR_EQUAL'):
+            actual_number, expected_number = _parse_metric(actual), _parse_metric(expected)
+            if actual_number is None or expected_number is None:
+                return False
+            if operator == 'GREATER_THAN' and not actual_number > expected_number:
+                return False
+            if operator == 'GREATER_THAN_OR_EQUAL' and not actual_number >= expected_number:
+                return False
+            if operator == 'LESS_THAN' and not actual_number < expected_number:
+                return False
+            if operator == 'LESS_THAN_OR_EQUAL' and not actual_number <= expected_number:
+                return False
+        elif operator == 'EQUAL' and str(actual) != str(expected):
+            return False
+        elif operator == 'NOT_EQUAL' and str(actual) == str(expected):
+            return False
+        elif operator == 'IN' and str(actual) not in [str(v) for v in expected]:
+            return False
+        elif operator == 'NOT_IN' and str(actual) in [str(v) for v in expected]:
+            return False
+        elif operator == 'CONTAIN' and str(expected).lower() not in str(actual or '').lower():
+            return False
+        elif operator == 'NOT_CONTAIN' and str(expected).lower() in str(actual or '').lower():
+            return False
+        elif operator not in RESULT_FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator '{operator}'. Use one of: {', '.join(RESULT_FILTER_OPERATORS)}")
+    return True
+
+
+def _read_result(
+    handle: str,
+    offset: int = 0,
+    limit: int = 100,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Returns a filtered, projected slice of a stored result."""
+    data, matched = [], 0
+    for row in _iter_result_rows(handle):
+        if filters and not _row_matches(row, filters):
+            continue
+        if offset <= matched < offset + limit:
+            data.append({k: row[k] for k in columns if k in row} if columns else row)
+        matched += 1
+    return {
+        'handle': handle,
+        'offset': offset,
+        'data': data,
+        'matched_rows': matched,
+        'next_offset': offset + limit if offset + limit < matched else None,
+    }
+
+
+# --- Background Jobs ---
+# Long operations (full exports, fan-outs over many objects) run as jobs on a
+# small worker pool instead of inside one blocking tool call. Each job's status,
+# progress and checkpoint are written to <state-dir>/jobs/<job_id>.json after
+# every step, so a job cut short by a server restart can be resumed from its
+# last checkpoint. Access tokens are never written to job files.
+
+JOB_WORKERS = 4
+JOB_WAIT_POLL_SECONDS = 1.0
+JOB_CHECKPOINT_PAGES = 50 # Page boundaries remembered for resuming NDJSON exports
+JOB_ACTIVE_STATUSES = ('queued', 'running')
+JOB_RESUMABLE_STATUSES = ('interrupted', 'failed', 'cancelled')
+
+_JOBS: Dict[str, Dict[str, Any]] = {}
+_JOB_CANCEL_EVENTS: Dict[str, threading.Event] = {}
+_JOBS_LOCK = threading.RLock()
+_JOB_POOL = None
+_JOBS_LOADED = False
+
+
+class JobCancelledError(Exception):
+    """Raised inside a job's runner once cancellation was requested."""
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(_get_state_dir('jobs'), f"{job_id}.json")
+
+
+def _load_jobs() -> None:
+    """Loads persisted jobs once; jobs that were active when the server stopped become 'interrupted'."""
+    global _JOBS_LOADED
+    with _JOBS_LOCK:
+        if _JOBS_LOADED:
+            return
+        _JOBS_LOADED = True
+        jobs_dir = _get_state_dir('jobs')
+        for name in os.listdir(jobs_dir):
+            if not name.endswith('.json'):
+                continue
+            job = _load_json_file(os.path.join(jobs_dir, name), None)
+            if not isinstance(job, dict) or job.get('id') in _JOBS:
+                continue
+            if job['status'] in JOB_ACTIVE_STATUSES:
+                job['status'] = 'interrupted'
+                _save_json_file(_job_path(job['id']), job)
+            _JOBS[job['id']] = job
+
+
+def _get_job(job_id: str) -> Dict[str, Any]:
+    _load_jobs()
+    job = _JOBS.get(job_id)
+    if job is None:
+        raise ValueError(f"Unknown job '{job_id}'")
+    return job
+
+
+def _job_update(job: Dict[str, Any], **changes) -> None:
+    """Applies changes to a job and persists it."""
+    with _JOBS_LOCK:
+        job.update(changes)
+        job['updated_at'] = time.time()
+        _save_json_file(_job_path(job['id']), job)
+
+
+def _job_step(job: Dict[str, Any], done: float, total: Optional[float] = None, message: Optional[str] = None,
+              checkpoint: Optional[Dict[str, Any]] = None, partial_result: Optional[Dict[str, Any]] = None) -> None:
+    """Records a job's progress (and checkpoint), raising JobCancelledError if it was cancelled."""
+    changes = {'progress': {'done': done, 'total': total, 'message': message}}
+    if checkpoint is not None:
+        changes['checkpoint'] = checkpoint
+    if partial_result is not None:
+        changes['partial_result'] = partial_result
+    _job_update(job, **changes)
+    if _JOB_CANCEL_EVENTS[job['id']].is_set():
+        raise JobCancelledError(job['id'])
+
+
+def _run_job(job_id: str) -> None:
+    """Worker entry point: runs a job's runner and records how it ended."""
+    job = _JOBS[job_id]
+    if _JOB_CANCEL_EVENTS[job_id].is_set():
+        _job_update(job, status='cancelled', finished_at=time.time())
+        return
+    _job_update(job, status='running', started_at=time.time(), error=None)
+    try:
+        result = JOB_KINDS[job['kind']](job)
+    except JobCancelledError:
+        _job_update(job, status='cancelled', finished_at=time.time())
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}", file=sys.stderr)
+        _job_update(job, status='failed', error=str(e), finished_at=time.time())
+    else:
+        _job_update(job, status='completed', result=result, finished_at=time.time())
+
+
+def _submit_job(job: Dict[str, Any]) -> None:
+    global _JOB_POOL
+    with _JOBS_LOCK:
+        if _JOB_POOL is None:
+            _JOB_POOL = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        _JOB_CANCEL_EVENTS[job['id']] = threading.Event()
+        _job_update(job, status='queued')
+        _JOB_POOL.submit(_run_job, job['id'])
+
+
+def _start_job(kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates and queues a new job, returning its public summary."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unsupported job kind '{kind}'. Use one of: {', '.join(JOB_KINDS)}")
+    params = JOB_PARAM_CHECKS[kind](dict(params or {}))
+    _load_jobs()
+    now = time.time()
+    job = {
+        'id': f"job_{uuid.uuid4().hex[:12]}", 'kind': kind, 'params': params, 'status': 'queued',
+        'progress': {'done': 0, 'total': None, 'message': None}, 'checkpoint': None,
+        'partial_result': None, 'result': None, 'error': None,
+        'created_at': now, 'updated_at': now, 'started_at': None, 'finished_at': None,
+    }
+    with _JOBS_LOCK:
+        _JOBS[job['id']] = job
+    _submit_job(job)
+    return _job_summary(job)
+
+
+def _job_summary(job: Dict[str, Any], preview_rows: int = 0) -> Dict[str, Any]:
+    """Returns the public view of a job, optionally with the first rows written so far."""
+    summary = {key: job.get(key) for key in (
+        'id', 'kind', 'status', 'params', 'progress', 'partial_result', 'result', 'error',
+        'created_at', 'started_at', 'finished_at'
+    )}
+    path = (job.get('result') or job.get('partial_result') or {}).get('path')
+    if preview_rows and path and path.endswith('.ndjson') and os.path.exists(path):
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if len(rows) >= preview_rows or not line.endswith('\n'):
+                    break
+                rows.append(_json_loads(line))
+        summary['preview'] = rows
+    return summary
+
+
+def _strip_token(url: str, params: Dict[str, Any]) -> List[Any]:
+    """Returns a page request as [url, params] without the access token, for checkpoints."""
+    url, params = _split_url_query(url, params)
+    return [url, {k: v for k, v in params.items() if k != 'access_token'}]
+
+
+def _check_export_job(params: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get('query') or not params.get('object_id'):
+        raise ValueError("Export jobs need 'query' and 'object_id'")
+    params.setdefault('file_format', 'ndjson')
+    _check_export_format(params['file_format'])
+    # Fixed at submission so a resumed job continues the same file
+    params.setdefault('output_path', _default_export_path(params['query'], params['object_id'], params['file_format']))
+    return params
+
+
+def _run_export_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Exports a query to a file, checkpointing after every page.
+
+    NDJSON exports resume from the last page boundary fully present in the file;
+    CSV and Parquet exports restart from the beginning.
+    """
+    params = job['params']
+    output_path, file_format = params['output_path'], params['file_format']
+    url, request_params = _build_export_request(params['query'], params['object_id'], params.get('params'))
+    checkpoint = job.get('checkpoint') or {}
+    schema: Dict[str, str] = {}
+    rows_done, append = 0, False
+
+    if file_format == 'ndjson' and checkpoint.get('pages') and os.path.exists(output_path):
+        with open(output_path, 'rb') as f:
+            content_lines = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(STREAM_CHUNK_BYTES), b''))
+        usable = [page for page in checkpoint['pages'] if page['rows'] <= content_lines]
+        if usable:
+            page = usable[-1]
+            if page['next'] is None:
+                return _describe_export(output_path, file_format, {'row_count': page['rows'], 'schema': page['schema']})
+            with open(output_path, 'rb+') as f:
+                for _ in range(page['rows']):
+                    f.readline()
+                f.truncate(f.tell())
+            url, request_params = page['next'][0], dict(page['next'][1], access_token=_get_fb_access_token())
+            rows_done, append, schema = page['rows'], True, dict(page['schema'])
+
+    pages = [page for page in checkpoint.get('pages', []) if page['rows'] <= rows_done]
+    counter = {'rows': rows_done}
+
+    def counted(rows):
+        for row in rows:
+            counter['rows'] += 1
+            yield row
+
+    def on_page(next_url, next_params):
+        pages.append({'rows': counter['rows'], 'schema': dict(schema),
+                      'next': _strip_token(next_url, next_params) if next_url else None})
+        del pages[:-JOB_CHECKPOINT_PAGES]
+        _job_step(job, counter['rows'], message=f"{counter['rows']} rows written",
+                  checkpoint={'pages': pages}, partial_result={'path': output_path, 'row_count': counter['rows']})
+
+    rows = _iter_graph_rows(url, request_params, adaptive=not (params.get('params') or {}).get('limit'), on_page=on_page)
+    result = _export_rows(counted(rows), file_format, output_path, append=append, schema=schema)
+    result['row_count'] = counter['rows']
+    return _describe_export(output_path, file_format, result)
+
+
+def _check_fanout_job(params: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get('query') or not params.get('object_ids'):
+        raise ValueError("Fan-out jobs need 'query' and a non-empty 'object_ids' list")
+    # Validates the query name and parameters before the job is queued
+    _build_export_request(params['query'], params['object_ids'][0], params.get('params'))
+    return params
+
+
+def _run_fanout_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one query for each of many objects, appending all rows to one NDJSON file.
+
+    Each row gets a 'source_id' field naming the object it was fetched for. The file
+    offset after every completed object is checkpointed, so a resumed job drops any
+    half-written object and skips the completed ones. Objects that fail are recorded
+    and skipped.
+    """
+    params = job['params']
+    output_path = os.path.join(_get_state_dir('jobs'), f"{job['id']}.ndjson")
+    checkpoint = job.get('checkpoint') or {'completed': [], 'failed': {}, 'rows': 0, 'offset': 0}
+    completed, failed = list(checkpoint['completed']), dict(checkpoint['failed'])
+    row_count = checkpoint['rows']
+    object_ids = list(dict.fromkeys(params['object_ids']))
+
+    with open(output_path, 'ab') as f:
+        f.truncate(checkpoint['offset'])
+    with open(output_path, 'ab') as f:
+        for object_id in object_ids:
+            if object_id in completed or object_id in failed:
+                continue
+            try:
+                url, request_params = _build_export_request(params['query'], object_id, params.get('params'))
+                for row in _iter_graph_rows(url, request_params, adaptive=not (params.get('params') or {}).get('limit')):
+                    f.write((_json_dumps(dict(row, source_id=object_id)) + '\n').encode('utf-8'))
+                    row_count += 1
+            except (requests.exceptions.RequestException, CircuitOpenError, KnownBadObjectError) as e:
+                failed[object_id] = str(e)
+            else:
+                completed.append(object_id)
+            f.flush()
+            done = len(completed) + len(failed)
+            _job_step(job, done, len(object_ids), message=f"{done} of {len(object_ids)} objects",
+                      checkpoint={'completed': completed, 'failed': failed, 'rows': row_count, 'offset': f.tell()},
+                      partial_result={'path': output_path, 'row_count': row_count, 'objects_done': done})
+
+    return {'path': output_path, 'row_count': row_count, 'objects': len(object_ids),
+            'completed': len(completed), 'failed': failed}
+
+
+JOB_KINDS = {'export': _run_export_job, 'fanout': _run_fanout_job}
+JOB_PARAM_CHECKS = {'export': _check_export_job, 'fanout': _check_fanout_job}
+
+
+# --- Historical Backfill ---
+# Pulls long histories of daily insights as a background job. History is split
+# into month (or day) chunks per account and level; chunks are queued newest
+# first and run on a few concurrent workers that pause while recent rate limit
+# usage leaves less than the reserved share free for interactive calls. Every
+# finished chunk is written to its own file and checkpointed, so a resumed job
+# only runs the chunks still missing.
+
+BACKFILL_WORKERS = 3
+BACKFILL_RESERVED_BUDGET_PCT = 25
+BACKFILL_MAX_HISTORY_DAYS = 37 * 30 # Graph keeps 37 months of insights
+BACKFILL_THROTTLE_POLL_SECONDS = 15
+# Usage readings older than this no longer hold workers back, so an otherwise idle
+# server lets a request through to learn the current usage
+BACKFILL_USAGE_FRESH_SECONDS = 60
+BACKFILL_CHUNKS = ['month', 'day']
+BACKFILL_DEFAULT_METRICS = ['impressions', 'clicks', 'spend', 'reach', 'frequency', 'actions', 'action_values']
+# Insights parameters the backfill sets for every chunk, which 'params' must not override
+BACKFILL_CHUNK_PARAMS = ['fields', 'level', 'time_range', 'time_ranges', 'time_increment', 'date_preset',
+                         'since', 'until', 'limit', 'after', 'before', 'offset']
+
+
+def _backfill_chunks(since: str, until: str, chunk: str) -> List[Dict[str, str]]:
+    """Splits an inclusive date range into calendar month or single day ranges."""
+    start = datetime.strptime(since, '%Y-%m-%d')
+    end = datetime.strptime(until, '%Y-%m-%d')
+    ranges = []
+    while start <= end:
+        if chunk == 'day':
+            stop = start
+        else:
+            next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            stop = min(end, next_month - timedelta(days=1))
+        ranges.append({'since': start.strftime('%Y-%m-%d'), 'until': stop.strftime('%Y-%m-%d')})
+        start = stop + timedelta(days=1)
+    return ranges
+
+
+def _check_backfill_job(params: Dict[str, Any]) -> Dict[str, Any]:
+    if not params.get('act_ids') or not params.get('since'):
+        raise ValueError("Backfill jobs need 'act_ids' and 'since'")
+    params['act_ids'] = [_normalize_act_id(act_id) for act_id in params['act_ids']]
+    params['until'] = params.get('until') or (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    params['levels'] = params.get('levels') or ['ad']
+    params['chunk'] = params.get('chunk') or 'month'
+    if params.get('reserved_budget_pct') is None:
+        params['reserved_budget_pct'] = BACKFILL_RESERVED_BUDGET_PCT
+    if params['chunk'] not in BACKFILL_CHUNKS:
+        raise ValueError(f"Unsupported chunk '{params['chunk']}'. Use one of: {', '.join(BACKFILL_CHUNKS)}")
+    unknown_levels = [level for level in params['levels'] if level not in INSIGHTS_LEVEL_RANK]
+    if unknown_levels:
+        raise ValueError(f"Unsupported levels {unknown_levels}. Use: {', '.join(INSIGHTS_LEVEL_RANK)}")
+    for name in ('since', 'until'):
+        try:
+            datetime.strptime(params[name], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format, got {params[name]!r}")
+    earliest = (datetime.now() - timedelta(days=BACKFILL_MAX_HISTORY_DAYS)).strftime('%Y-%m-%d')
+    params['since'] = max(params['since'], earliest)
+    if params['since'] > params['until']:
+        raise ValueError(f"Empty date range {params['since']} to {params['until']}")
+    extra = params.get('params') or {}
+    if not isinstance(extra, dict):
+        raise ValueError("'params' must be a dict of insights parameters")
+    overridden = [name for name in BACKFILL_CHUNK_PARAMS if name in extra]
+    if overridden:
+        raise ValueError(f"'params' cannot set {overridden}; use the backfill's own arguments instead")
+    try:
+        # Rejects unknown parameter names before the job is queued
+        _build_insights_params({}, **extra)
+    except TypeError as e:
+        raise ValueError(f"Invalid insights parameters in 'params': {e}")
+    return params
+
+
+def _backfill_fields(level: str, fields: Optional[List[str]]) -> List[str]:
+    """Returns the requested fields plus the ID and name columns of the level and its parents."""
+    dimensions = []
+    for dim_level, dims in INSIGHTS_LEVEL_DIMENSIONS.items():
+        if INSIGHTS_LEVEL_RANK[dim_level] >= INSIGHTS_LEVEL_RANK[level]:
+            dimensions.extend(dims[:2])
+    return list(dict.fromkeys(dimensions + (fields or BACKFILL_DEFAULT_METRICS)))
+
+
+def _run_backfill_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs the backfill's chunks by priority on BACKFILL_WORKERS threads under the rate budget."""
+    params = job['params']
+    directory = _get_state_dir('backfill', job['id'])
+    checkpoint = job.get('checkpoint') or {'done': {}, 'failed': {}}
+    done, failed = dict(checkpoint['done']), {}
+    ranges = _backfill_chunks(params['since'], params['until'], params['chunk'])
+
+    queue = []
+    for range_index, date_range in enumerate(reversed(ranges)): # newest first
+        for level_index, level in enumerate(params['levels']):
+            for act_id in params['act_ids']:
+                key = f"{act_id}/{level}/{date_range['since']}_{date_range['until']}"
+                if key not in done:
+                    heapq.heappush(queue, ((range_index, level_index), len(queue), key, act_id, level, date_range))
+    total = len(done) + len(queue)
+    lock = threading.Lock()
+    cancelled = _JOB_CANCEL_EVENTS[job['id']]
+    max_usage = 100 - params['reserved_budget_pct']
+
+    def record_progress() -> None:
+        rows = sum(done.values())
+        _job_update(job, progress={'done': len(done), 'total': total, 'message': f"{len(done)} of {total} chunks, {rows} rows"},
+                    checkpoint={'done': dict(done), 'failed': dict(failed)},
+                    partial_result={'directory': directory, 'chunks_done': len(done), 'row_count': rows})
+
+    def run_chunk(key: str, act_id: str, level: str, date_range: Dict[str, str]) -> None:
+        url = f"{FB_GRAPH_URL}/{act_id}/insights"
+        query_params = dict(
+            params.get('params') or {},
+            fields=_backfill_fields(level, params.get('fields')),
+            time_range=date_range, time_increment='1', level=level,
+            limit=_adaptive_page_limit('insights')
+        )
+        request_params = _build_insights_params({'access_token': _get_fb_access_token()}, **query_params)
+        path = os.path.join(directory, key.replace('/', '__') + '.ndjson')
+        row_count = 0
+        with open(path + '.part', 'w', encoding='utf-8') as f:
+            for row in _iter_graph_rows(url, request_params, adaptive=True):
+                f.write(_json_dumps(row) + '\n')
+                row_count += 1
+        os.replace(path + '.part', path)
+        with lock:
+            done[key] = row_count
+            failed.pop(key, None)
+            record_progress()
+
+    def worker() -> None:
+        while not cancelled.is_set():
+            with lock:
+                if not queue:
+                    return
+                priority, seq, key, act_id, level, date_range = heapq.heappop(queue)
+            # Leave the reserved share of the rate limits to interactive calls
+            while _rate_usage_pct(act_id, BACKFILL_USAGE_FRESH_SECONDS) >= max_usage and not cancelled.is_set():
+                cancelled.wait(BACKFILL_THROTTLE_POLL_SECONDS)
+            if cancelled.is_set():
+                return
+            try:
+                run_chunk(key, act_id, level, date_range)
+            except CircuitOpenError as e:
+                # Throttled or failing: put the chunk back and wait out the breaker
+                with lock:
+                    heapq.heappush(queue, (priority, seq, key, act_id, level, date_range))
+                cancelled.wait(min(e.retry_after, BREAKER_MAX_OPEN_SECONDS))
+            except Exception as e:
+                # Any other error fails only this chunk; the worker moves on to the next
+                with lock:
+                    failed[key] = f"{type(e).__name__}: {e}"
+                    record_progress()
+
+    record_progress()
+    workers = [threading.Thread(target=worker, name=f"backfill-{i}", daemon=True) for i in range(BACKFILL_WORKERS)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if cancelled.is_set():
+        raise JobCancelledError(job['id'])
+    return {'directory': directory, 'chunks': total, 'completed': len(done), 'failed': failed,
+            'row_count': sum(done.values())}
+
+
+JOB_KINDS['backfill'] = _run_backfill_job
+JOB_PARAM_CHECKS['backfill'] = _check_backfill_job
+
+
+# --- Cache Warm-up ---
+# Right after start-up a background thread loads what the first tool calls usually
+# ask for: the account list, each account's details and mirror (campaigns, ad sets,
+# ads, creatives) and any "hot" insights queries configured in
+# <state dir>/warmup.json. Tool calls are served meanwhile; one that needs an item
+# still loading waits for that fetch (see `_singleflight` and the per-account sync
+# lock). It is off by default: pass --warmup or set "enabled": true in warmup.json
+# to turn it on. --no-warmup turns it off whatever warmup.json says.
+
+WARMUP_WORKERS = 4
+WARMUP_MAX_ACCOUNTS = 5
+WARMUP_CONFIG_FILE = 'warmup.json'
+WARMUP_DEFAULTS = {
+    'enabled': False,
+    'accounts': None, # None warms the first max_accounts accounts of list_ad_accounts
+    'max_accounts': WARMUP_MAX_ACCOUNTS,
+    'account_details': True,
+    'mirror': True,
+    'insights': [], # e.g. [{"tool": "get_adaccount_insights", "args": {"act_id": "act_1", "date_preset": "last_7d"}}]
+}
+# Balance and spend are always fetched live, so only the other details are worth warming
+WARMUP_ACCOUNT_FIELDS = [field for field in DEFAULT_AD_ACCOUNT_FIELDS if field not in VOLATILE_ENTITY_FIELDS['adaccount']]
+WARMUP_INSIGHTS_TOOLS = ['get_adaccount_insights', 'get_campaign_insights', 'get_adset_insights', 'get_ad_insights']
+ACCOUNT_LIST_CACHE_TTL_SECONDS = 300
+
+# {'response', 'expires_at'} of the last list_ad_accounts call
+_ACCOUNT_LIST_CACHE: Dict[str, Any] = {}
+# {'state': 'disabled'|'running'|'done', 'started_at', 'finished_at', 'items': {name: status}}
+_WARMUP_STATUS: Dict[str, Any] = {'state': 'disabled', 'items': {}}
+
+
+def _warmup_config() -> Dict[str, Any]:
+    """Returns the warm-up settings from the state directory merged over WARMUP_DEFAULTS."""
+    config = dict(WARMUP_DEFAULTS)
+    config.update(_load_json_file(os.path.join(_get_state_dir(), WARMUP_CONFIG_FILE), {}))
+    if '--warmup' in sys.argv:
+        config['enabled'] = True
+    if '--no-warmup' in sys.argv:
+        config['enabled'] = False
+    return config
+
+
+def _warmup_insights_query(query: Dict[str, Any]) -> Dict:
+    """Runs one configured hot insights query through its tool, filling the response cache."""
+    tool_name = query.get('tool')
+    if tool_name not in WARMUP_INSIGHTS_TOOLS:
+        raise ValueError(f"Warm-up queries must use one of {WARMUP_INSIGHTS_TOOLS}, got {tool_name!r}")
+    return globals()[tool_name](**query.get('args', {}))
 
-# --- Constants ---
-FB_API_VERSION = "v22.0"
-FB_GRAPH_URL = f"https://graph.facebook.com/{FB_API_VERSION}"
-DEFAULT_AD_ACCOUNT_FIELDS = [
-    'name', 'business_name', 'age', 'account_status', 'balance',
-    'amount_spent', 'attribution_spec', 'account_id', 'business',
-    'business_city', 'brand_safety_content_filter_levels', 'currency',
-    'created_time', 'id'
-]
 
-# Create an MCP server
-mcp = FastMCP("fb-api-mcp-server")
+def _run_warmup(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Loads the configured accounts, mirrors and insights queries concurrently."""
+    items = {}
+    _WARMUP_STATUS.update(state='running', started_at=time.time(), finished_at=None, items=items)
 
-# Add a global variable to store the token
-FB_ACCESS_TOKEN = None
+    def step(name, load, *args):
+        items[name] = 'running'
+        try:
+            result = load(*args)
+        except Exception as e:
+            items[name] = f"error: {e}"
+            print(f"Warm-up of {name} failed: {e}", file=sys.stderr)
+            return None
+        items[name] = 'ok'
+        return result
 
-# --- Helper Functions ---
+    with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix='warmup') as pool:
+        for i, query in enumerate(config['insights']):
+            pool.submit(step, f"insights:{i}", _warmup_insights_query, query)
 
-def _get_fb_access_token() -> str:
-    """
-    Get Facebook access token from command line arguments.
-    Caches the token in memory after first read.
+        act_ids = config['accounts']
+        if act_ids is None:
+            accounts = step('list_ad_accounts', list_ad_accounts) or {}
+            listed = accounts.get('adaccounts', {}).get('data', [])
+            act_ids = [account['id'] for account in listed][:config['max_accounts']]
+        act_ids = [_normalize_act_id(act_id) for act_id in act_ids]
+        if config['account_details']:
+            for act_id in act_ids:
+                pool.submit(step, f"account:{act_id}", get_details_of_ad_account, act_id, WARMUP_ACCOUNT_FIELDS)
+        if config['mirror']:
+            for act_id in act_ids:
+                pool.submit(step, f"mirror:{act_id}", _sync_account_mirror, act_id)
 
-    Returns:
-        str: The Facebook access token.
+    _WARMUP_STATUS.update(state='done', finished_at=time.time())
+    return _WARMUP_STATUS
 
-    Raises:
-        Exception: If no token is provided in command line arguments.
+
+def _start_warmup() -> None:
+    """Starts the warm-up in a daemon thread unless it is disabled."""
+    config = _warmup_config()
+    if not config['enabled']:
+        return
+    _WARMUP_STATUS['state'] = 'running'
+    threading.Thread(target=_run_warmup, args=(config,), name='cache-warmup', daemon=True).start()
+
+
+# --- Cache Snapshots ---
+# The in-memory caches (insights responses, entity store, account mirrors with
+# their delta-sync watermarks, previews, known-bad IDs, the account list and tuned
+# page sizes) are written to a gzip-compressed JSON file every
+# SNAPSHOT_INTERVAL_SECONDS and on shutdown, and loaded again at start-up. Each
+# snapshot is tied to FB_API_VERSION and a hash of the access token; a snapshot
+# for another version or token is ignored. Expiry times are wall-clock, so restored
+# entries keep their original TTLs. The token itself is never written: it is
+# replaced by a placeholder (it appears in cached paging URLs) and put back on load.
+# Pass --no-snapshot to disable.
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_INTERVAL_SECONDS = 300
+SNAPSHOT_COMPRESS_LEVEL = 3 # Snapshots are rewritten often; favour speed over size
+SNAPSHOT_TOKEN_PLACEHOLDER = '__FB_ACCESS_TOKEN__'
+SNAPSHOT_LOCK_TIMEOUT_SECONDS = 5 # Mirrors are left out rather than delaying shutdown
+
+# {'path', 'saved_at', 'bytes', 'restored_at', 'restored'}
+_SNAPSHOT_STATUS: Dict[str, Any] = {}
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def _snapshot_path() -> str:
+    """Returns the snapshot file for the current API version and access token."""
+    return os.path.join(_get_state_dir('snapshots'), f"cache-{FB_API_VERSION}-{_token_id()}.json.gz")
+
+
+def _collect_cache_snapshot() -> Dict[str, Any]:
+    """Copies the unexpired contents of the in-memory caches into plain JSON types."""
+    now = time.time()
+    with _RESPONSE_CACHE_LOCK:
+        responses = [
+            {**entry, 'key': key, 'object_ids': sorted(entry['object_ids'])}
+            for key, entry in _RESPONSE_CACHE.items() if entry['expires_at'] > now
+        ]
+    with _ENTITY_STORE_LOCK:
+        entities = [
+            [entity_type, object_id, dict(entry['values']), dict(entry['seen_at'])]
+            for (entity_type, object_id), entry in _ENTITY_STORE.items()
+        ]
+    mirrors = {}
+    if _MIRROR_LOCK.acquire(timeout=SNAPSHOT_LOCK_TIMEOUT_SECONDS):
+        try:
+            mirrors = {
+                act_id: {**mirror, 'objects': {edge: list(objs.values()) for edge, objs in mirror['objects'].items()}}
+                for act_id, mirror in _ACCOUNT_MIRRORS.items()
+            }
+        finally:
+            _MIRROR_LOCK.release()
+    else:
+        print("Account mirrors are busy; leaving them out of the cache snapshot", file=sys.stderr)
+    with _PREVIEW_CACHE_LOCK:
+        previews = [[creative_id, ad_format, entry] for (creative_id, ad_format), entry in _PREVIEW_CACHE.items()
+                    if entry['expires_at'] > now]
+    with _NEGATIVE_CACHE_LOCK:
+        known_bad = [[object_id, error_class, expires_at] for object_id, (error_class, expires_at)
+                     in _NEGATIVE_CACHE.items() if expires_at > now]
+    return {
+        'format': SNAPSHOT_FORMAT_VERSION,
+        'api_version': FB_API_VERSION,
+        'saved_at': now,
+        'responses': responses,
+        'entities': entities,
+        'mirrors': mirrors,
+        'previews': previews,
+        'known_bad': known_bad,
+        'account_list': dict(_ACCOUNT_LIST_CACHE) if _ACCOUNT_LIST_CACHE.get('expires_at', 0) > now else None,
+        'page_limits': dict(_ADAPTIVE_PAGE_LIMITS),
+        'page_ceilings': dict(_ADAPTIVE_PAGE_CEILINGS),
+    }
+
+
+def _save_cache_snapshot() -> Dict[str, Any]:
+    """Writes the current caches to the snapshot file, atomically."""
+    with _SNAPSHOT_LOCK:
+        path = _snapshot_path()
+        text = _json_dumps(_collect_cache_snapshot()).replace(_get_fb_access_token(), SNAPSHOT_TOKEN_PLACEHOLDER)
+        data = gzip.compress(text.encode('utf-8'), compresslevel=SNAPSHOT_COMPRESS_LEVEL)
+        tmp_path = f"{path}.{os.getpid()}.tmp" # Pool workers share the snapshot file
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        _SNAPSHOT_STATUS.update(path=path, saved_at=time.time(), bytes=len(data))
+        return _SNAPSHOT_STATUS
+
+
+def _restore_cache_snapshot() -> Dict[str, int]:
+    """Loads the snapshot of the current API version and token into the (empty) caches.
+
+    Returns:
+        Dict[str, int]: How many entries of each kind were restored; empty if there
+        was no usable snapshot.
     """
-    global FB_ACCESS_TOKEN
-    if FB_ACCESS_TOKEN is None:
-        # Look for --fb-token argument
-        if "--fb-token" in sys.argv:
-            token_index = sys.argv.index("--fb-token") + 1
-            if token_index < len(sys.argv):
-                FB_ACCESS_TOKEN = sys.argv[token_index]
-                print(f"Using Facebook token from command line arguments")
-            else:
-                raise Exception("--fb-token argument provided but no token value followed it")
-        else:
-            raise Exception("Facebook token must be provided via '--fb-token' command line argument")
+    path = _snapshot_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            text = gzip.decompress(f.read())
+        snapshot = _json_loads(text.replace(SNAPSHOT_TOKEN_PLACEHOLDER.encode('utf-8'),
+                                            _get_fb_access_token().encode('utf-8')))
+    except (OSError, EOFError, ValueError) as e:
+        print(f"Ignoring unreadable cache snapshot {path}: {e}", file=sys.stderr)
+        return {}
+    if snapshot.get('format') != SNAPSHOT_FORMAT_VERSION or snapshot.get('api_version') != FB_API_VERSION:
+        return {}
 
-    return FB_ACCESS_TOKEN
+    now = time.time()
+    act_ids = set()
+    with _RESPONSE_CACHE_LOCK:
+        for entry in snapshot['responses']:
+            if entry['expires_at'] <= now:
+                continue
+            key = entry.pop('key')
+            entry['object_ids'] = set(entry['object_ids'])
+            _RESPONSE_CACHE.setdefault(key, entry)
+            for row in entry['response'].get('data', []):
+                _index_hierarchy(row)
+            if entry['act_id']:
+                act_ids.add(entry['act_id'])
+    for entity_type, object_id, values, seen_at in snapshot['entities']:
+        _index_hierarchy({**values, 'id': object_id}, entity_type)
+        with _ENTITY_STORE_LOCK:
+            if (entity_type, object_id) not in _ENTITY_STORE:
+                _ENTITY_STORE[(entity_type, object_id)] = {'values': values, 'seen_at': seen_at}
+    with _MIRROR_LOCK:
+        for act_id, mirror in snapshot['mirrors'].items():
+            if act_id in _ACCOUNT_MIRRORS:
+                continue
+            mirror['objects'] = {edge: {row['id']: row for row in rows} for edge, rows in mirror['objects'].items()}
+            _ACCOUNT_MIRRORS[act_id] = mirror
+            act_ids.add(act_id)
+    with _PREVIEW_CACHE_LOCK:
+        for creative_id, ad_format, entry in snapshot['previews']:
+            if entry['expires_at'] > now:
+                _PREVIEW_CACHE.setdefault((creative_id, ad_format), entry)
+    for object_id, error_class, expires_at in snapshot['known_bad']:
+        if expires_at > now and error_class in NEGATIVE_CACHE_TTL_SECONDS:
+            _negative_cache_add(object_id, error_class)
+            with _NEGATIVE_CACHE_LOCK:
+                _NEGATIVE_CACHE[object_id] = (error_class, expires_at)
+    account_list = snapshot.get('account_list')
+    if account_list and account_list['expires_at'] > now and not _ACCOUNT_LIST_CACHE:
+        _ACCOUNT_LIST_CACHE.update(account_list)
+    for family, limit in snapshot['page_limits'].items():
+        _ADAPTIVE_PAGE_LIMITS.setdefault(family, limit)
+    for family, ceiling in snapshot['page_ceilings'].items():
+        _ADAPTIVE_PAGE_CEILINGS.setdefault(family, ceiling)
+    # Changes made while no process was running are picked up by the activity poller
+    for act_id in act_ids:
+        _register_invalidation_account(act_id)
 
-def _make_graph_api_call(url: str, params: Dict[str, Any]) -> Dict:
-    """Makes a GET request to the Facebook Graph API and handles the response."""
+    restored = {
+        'responses': len(snapshot['responses']),
+        'entities': len(snapshot['entities']),
+        'mirrors': len(snapshot['mirrors']),
+        'previews': len(snapshot['previews']),
+        'known_bad': len(snapshot['known_bad']),
+    }
+    _SNAPSHOT_STATUS.update(path=path, restored_at=now, restored=restored)
+    return restored
+
+
+def _snapshot_loop() -> None:
+    """Saves a snapshot every SNAPSHOT_INTERVAL_SECONDS forever."""
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            _save_cache_snapshot()
+        except Exception as e:
+            print(f"Saving the cache snapshot failed: {e}", file=sys.stderr)
+
+
+def _start_cache_snapshots() -> None:
+    """Restores the last snapshot and arranges periodic and shutdown snapshots,
+    unless --no-snapshot was given."""
+    if '--no-snapshot' in sys.argv:
+        return
+    _restore_cache_snapshot()
+    threading.Thread(target=_snapshot_loop, name='cache-snapshot', daemon=True).start()
+    atexit.register(_save_cache_snapshot)
+    # Clients usually stop the server with SIGTERM; exit normally so the atexit hook runs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+# --- HTTP Worker Pool ---
+# `--transport sse` serves MCP over HTTP with Server-Sent Events on --host/--port
+# instead of stdio. With `--workers N` (N > 1) this process only runs a small proxy
+# on that address and starts N worker processes listening on 127.0.0.1, ports
+# port+1 to port+N, so JSON decoding and result shaping use several cores. Worker i
+# advertises its message endpoint as /w<i>/messages/, which pins every request of
+# an MCP session to the worker holding the session; new SSE connections go to the
+# worker with the fewest open connections. Workers always use the shared cache,
+# which also pools rate limit usage readings and coalesces Graph requests. A worker
+# that exits is started again (MCP sessions it held are lost; clients reconnect).
+
+MCP_TRANSPORTS = ['stdio', 'sse']
+WORKER_ROUTE_PATTERN = re.compile(r'/w(\d+)/')
+WORKER_CONNECT_RETRIES = 50 # Workers may still be starting when the first clients arrive
+WORKER_CONNECT_RETRY_SECONDS = 0.1
+WORKER_HOP_BY_HOP_HEADERS = {b'connection', b'keep-alive', b'proxy-connection'}
+WORKER_CHECK_SECONDS = 1
+# A worker that keeps crashing right after start is restarted at most this often
+WORKER_RESTART_DELAY_SECONDS = 5
+
+
+def _get_cli_option(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Returns the value following a command line option, or `default` if it is absent."""
+    if name not in sys.argv:
+        return default
+    value_index = sys.argv.index(name) + 1
+    if value_index >= len(sys.argv):
+        raise Exception(f"{name} argument provided but no value followed it")
+    return sys.argv[value_index]
+
+
+async def _pipe_stream(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Copies bytes from one connection to another until the reading side closes."""
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raises HTTPError for bad responses (4xx or 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        # Log the error and re-raise or handle more gracefully
-        print(f"Error making Graph API call to {url} with params {params}: {e}")
-        # Depending on desired behavior, you might want to raise a custom exception
-        # or return a specific error structure. Re-raising keeps the current behavior.
-        raise
+        while True:
+            data = await reader.read(STREAM_CHUNK_BYTES)
+            if not data:
+                return
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        return
 
 
-def _prepare_params(base_params: Dict[str, Any], **kwargs) -> Dict[str, Any]:
-    """Adds optional parameters to a dictionary if they are not None. Handles JSON encoding."""
-    params = base_params.copy()
-    for key, value in kwargs.items():
-        if value is not None:
-            # Parameters that need JSON encoding
-            if key in ['filtering', 'time_range', 'time_ranges', 'effective_status', 
-                       'special_ad_categories', 'objective', 
-                       'buyer_guarantee_agreement_status'] and isinstance(value, (list, dict)):
-                params[key] = json.dumps(value)
-            elif key == 'fields' and isinstance(value, list):
-                 params[key] = ','.join(value)
-            elif key == 'action_attribution_windows' and isinstance(value, list):
-                 params[key] = ','.join(value)
-            elif key == 'action_breakdowns' and isinstance(value, list):
-                 params[key] = ','.join(value)
-            elif key == 'breakdowns' and isinstance(value, list):
-                 params[key] = ','.join(value)
-            else:
-                params[key] = value
-    return params
+async def _proxy_to_worker(
+    client_reader: asyncio.StreamReader,
+    client_writer: asyncio.StreamWriter,
+    port: int,
+    open_connections: List[int]
+) -> None:
+    """Forwards one client connection to the worker owning its session, or to the least busy one."""
+    try:
+        head = await client_reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        client_writer.close()
+        return
+    request_line, *header_lines = head[:-4].split(b'\r\n')
+    parts = request_line.split(b' ')
+    match = WORKER_ROUTE_PATTERN.match(parts[1].decode('latin-1')) if len(parts) == 3 else None
+    if match and int(match.group(1)) < len(open_connections):
+        index = int(match.group(1))
+    else:
+        index = min(range(len(open_connections)), key=open_connections.__getitem__)
+    # One request per connection, so a kept-alive connection never reaches the wrong worker
+    header_lines = [line for line in header_lines
+                    if line.split(b':', 1)[0].strip().lower() not in WORKER_HOP_BY_HOP_HEADERS]
+    forwarded = b'\r\n'.join([request_line, *header_lines, b'Connection: close']) + b'\r\n\r\n'
 
+    # Counted before connecting, so clients arriving together spread across workers
+    open_connections[index] += 1
+    upstream_writer = None
+    try:
+        for _ in range(WORKER_CONNECT_RETRIES):
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', port + 1 + index)
+                break
+            except OSError:
+                await asyncio.sleep(WORKER_CONNECT_RETRY_SECONDS)
+        if upstream_writer is None:
+            client_writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            return
+        upstream_writer.write(forwarded)
+        pipes = [asyncio.ensure_future(_pipe_stream(client_reader, upstream_writer)),
+                 asyncio.ensure_future(_pipe_stream(upstream_reader, client_writer))]
+        # Either side closing ends the exchange (a client leaving ends its SSE stream)
+        await asyncio.wait(pipes, return_when=asyncio.FIRST_COMPLETED)
+        for pipe in pipes:
+            pipe.cancel()
+    finally:
+        open_connections[index] -= 1
+        if upstream_writer is not None:
+            upstream_writer.close()
+        client_writer.close()
 
-def _fetch_node(node_id: str, **kwargs) -> Dict:
-    """Helper to fetch a single object (node) by its ID."""
-    access_token = _get_fb_access_token()
-    url = f"{FB_GRAPH_URL}/{node_id}"
-    params = _prepare_params({'access_token': access_token}, **kwargs)
-    return _make_graph_api_call(url, params)
 
-def _fetch_edge(parent_id: str, edge_name: str, **kwargs) -> Dict:
-    """Helper to fetch a collection (edge) related to a parent object."""
-    access_token = _get_fb_access_token()
-    url = f"{FB_GRAPH_URL}/{parent_id}/{edge_name}"
-    
-    # Handle time parameters specifically for activities edge if needed
-    time_params = {}
-    if edge_name == 'activities':
-        time_range = kwargs.pop('time_range', None)
-        since = kwargs.pop('since', None)
-        until = kwargs.pop('until', None)
-        if time_range:
-            time_params['time_range'] = time_range
-        else:
-            if since: time_params['since'] = since
-            if until: time_params['until'] = until
-            
-    base_params = {'access_token': access_token}
-    params = _prepare_params(base_params, **kwargs)
-    params.update(_prepare_params({}, **time_params)) # Add specific time params
+def _start_worker(index: int) -> subprocess.Popen:
+    """Starts worker process `index` with this process's command line."""
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *sys.argv[1:], '--worker-index', str(index)])
 
-    return _make_graph_api_call(url, params)
 
+def _restart_exited_workers(processes: List[Any], started_at: List[float], start_worker) -> List[int]:
+    """Replaces each exited worker process in place with a new one; returns their indexes.
 
-def _build_insights_params(
-    params: Dict[str, Any],
-    fields: Optional[List[str]] = None,
-    date_preset: Optional[str] = None,
-    time_range: Optional[Dict[str, str]] = None,
-    time_ranges: Optional[List[Dict[str, str]]] = None,
-    time_increment: Optional[str] = None,
-    level: Optional[str] = None,
-    action_attribution_windows: Optional[List[str]] = None,
-    action_breakdowns: Optional[List[str]] = None,
-    action_report_time: Optional[str] = None,
-    breakdowns: Optional[List[str]] = None,
-    default_summary: bool = False,
-    use_account_attribution_setting: bool = False,
-    use_unified_attribution_setting: bool = True,
-    filtering: Optional[List[dict]] = None,
-    sort: Optional[str] = None,
-    limit: Optional[int] = None,
-    after: Optional[str] = None,
-    before: Optional[str] = None,
-    offset: Optional[int] = None,
-    since: Optional[str] = None,
-    until: Optional[str] = None,
-    locale: Optional[str] = None
-) -> Dict[str, Any]:
-    """Builds the common parameter dictionary for insights API calls."""
-    
-    # Use the generic parameter builder first
-    params = _prepare_params(
-        params,
-        fields=fields,
-        level=level,
-        action_attribution_windows=action_attribution_windows,
-        action_breakdowns=action_breakdowns,
-        action_report_time=action_report_time,
-        breakdowns=breakdowns,
-        filtering=filtering,
-        sort=sort,
-        limit=limit,
-        after=after,
-        before=before,
-        offset=offset,
-        locale=locale
-    )
+    A worker is restarted no sooner than WORKER_RESTART_DELAY_SECONDS after its
+    previous start, so one that fails on start-up does not spin.
+    """
+    restarted = []
+    now = time.time()
+    for index, process in enumerate(processes):
+        if process.poll() is None or now - started_at[index] < WORKER_RESTART_DELAY_SECONDS:
+            continue
+        print(f"Worker {index} exited with code {process.returncode}, restarting it", file=sys.stderr)
+        processes[index], started_at[index] = start_worker(index), now
+        restarted.append(index)
+    return restarted
 
-    # Handle time parameters (specific logic for insights)
-    time_params_provided = time_range or time_ranges or since or until
-    if not time_params_provided and date_preset:
-        params['date_preset'] = date_preset
-    if time_range:
-        params['time_range'] = json.dumps(time_range)
-    if time_ranges:
-        params['time_ranges'] = json.dumps(time_ranges)
-    if time_increment and time_increment != 'all_days': # API default is all_days
-        params['time_increment'] = time_increment
-        
-    # Time-based pagination (only if specific time range isn't set)
-    if not time_range and not time_ranges:
-        if since:
-            params['since'] = since
-        if until:
-            params['until'] = until
 
-    # Boolean flags need specific handling ('true'/'false' strings)
-    if default_summary:
-        params['default_summary'] = 'true'
-    if use_account_attribution_setting:
-        params['use_account_attribution_setting'] = 'true'
-    # Only add unified if True (it defaults to False in API if omitted)
-    if use_unified_attribution_setting:
-        params['use_unified_attribution_setting'] = 'true'
+def _serve_worker_pool(host: str, port: int, workers: int) -> None:
+    """Starts the worker processes and proxies client connections to them until stopped."""
+    processes = [_start_worker(index) for index in range(workers)]
+    started_at = [time.time()] * workers
+    open_connections = [0] * workers
 
-    return params
+    async def supervise():
+        while True:
+            await asyncio.sleep(WORKER_CHECK_SECONDS)
+            _restart_exited_workers(processes, started_at, _start_worker)
+
+    async def serve():
+        server = await asyncio.start_server(
+            lambda reader, writer: _proxy_to_worker(reader, writer, port, open_connections), host, port
+        )
+        supervisor = asyncio.ensure_future(supervise())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            supervisor.cancel()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def _run_server() -> None:
+    """Runs the server with the transport, address and worker count given on the command line."""
+    transport = _get_cli_option('--transport', 'stdio')
+    if transport not in MCP_TRANSPORTS:
+        raise Exception(f"--transport must be one of {MCP_TRANSPORTS}, got {transport!r}")
+    host = _get_cli_option('--host', mcp.settings.host)
+    port = int(_get_cli_option('--port', str(mcp.settings.port)))
+    workers = int(_get_cli_option('--workers', '1'))
+    worker_index = _get_cli_option('--worker-index')
+    global FB_GRAPH_URL
+    FB_GRAPH_URL = _get_cli_option('--graph-url', FB_GRAPH_URL).rstrip('/')
 
+    if transport == 'sse' and workers > 1 and worker_index is None:
+        _serve_worker_pool(host, port, workers)
+        return
+    if worker_index is not None:
+        global SHARED_CACHE_ENABLED
+        SHARED_CACHE_ENABLED = True
+        mcp.settings.host, mcp.settings.port = '127.0.0.1', port + 1 + int(worker_index)
+        mcp.settings.message_path = f"/w{worker_index}/messages/"
+    else:
+        mcp.settings.host, mcp.settings.port = host, port
+    _start_cache_snapshots()
+    _start_warmup()
+    mcp.run(transport=transport)
 
 
 # --- MCP Tools ---
 @mcp.tool()
 def list_ad_accounts() -> Dict:
-    """List down the ad accounts and their names associated with your Facebook account"""
+    """List down the ad accounts and their names associated with your Facebook account
+    (cached for 5 minutes)"""
+    cached = _ACCOUNT_LIST_CACHE
+    if cached and cached['expires_at'] > time.time():
+        return cached['response']
     # This uses a specific endpoint structure not fitting _fetch_node/_fetch_edge easily
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/me"
@@ -207,7 +4517,9 @@ def list_ad_accounts() -> Dict:
         'access_token': access_token,
         'fields': 'adaccounts{name}' # Specific field structure
     }
-    return _make_graph_api_call(url, params)
+    response = _make_graph_api_call(url, params)
+    _ACCOUNT_LIST_CACHE.update(response=response, expires_at=time.time() + ACCOUNT_LIST_CACHE_TTL_SECONDS)
+    return response
 
 
 @mcp.tool()
@@ -220,11 +4532,15 @@ def get_details_of_ad_account(act_id: str, fields: list[str] = None) -> Dict:
                 balance, amount_spent, attribution_spec, account_id, business,
                 business_city, brand_safety_content_filter_levels, currency,
                 created_time, id.
+                Fields loaded within the last 5 minutes (e.g. by the start-up
+                warm-up) are served from the local entity store, except
+                balance, amount_spent and spend_cap, which are always fetched.
     Returns:    
         A dictionary containing the details of the ad account
     """
     effective_fields = fields if fields is not None else DEFAULT_AD_ACCOUNT_FIELDS
-    return _fetch_node(node_id=act_id, fields=effective_fields)
+    params = _prepare_params({'access_token': _get_fb_access_token()}, fields=effective_fields)
+    return _fetch_entity('adaccount', act_id, params)
 
 
 # --- Insigbts API Tools ---
@@ -253,7 +4569,8 @@ def get_adaccount_insights(
     offset: Optional[int] = None,
     since: Optional[str] = None,
     until: Optional[str] = None,
-    locale: Optional[str] = None
+    locale: Optional[str] = None,
+    format: str = 'json'
 ) -> Dict:
     """Retrieves performance insights for a specified Facebook ad account.
 
@@ -262,6 +4579,12 @@ def get_adaccount_insights(
     various options for filtering, time breakdowns, and attribution settings. Note that
     some metrics returned might be estimated or in development.
 
+    Responses are cached briefly. When finer-grained rows for the same query are already
+    cached (e.g. level='ad' with time_increment=1), a request for a coarser 'level' or
+    'time_increment' is rolled up locally: additive metrics are summed and ctr, cpc, cpm
+    and cost_per_action_type are recomputed from their numerators. Requests involving
+    non-additive metrics such as reach or frequency always go to the API.
+
     Args:
         act_id (str): The target ad account ID, prefixed with 'act_', e.g., 'act_1234567890'.
         fields (Optional[List[str]]): A list of specific metrics and fields to retrieve.
@@ -333,6 +4656,17 @@ def get_adaccount_insights(
             are not set), the end timestamp (Unix or strtotime value).
         locale (Optional[str]): The locale for text responses (e.g., 'en_US'). This controls 
             language and formatting of text fields in the response.
+        format (str): Output format of the 'data' rows.
+            - 'json': Rows exactly as returned by the API (default).
+            - 'flat': List fields such as 'actions', 'action_values' and 'cost_per_action_type'
+              are pivoted into numeric columns named '<field>:<action_type>' (plus
+              '<field>:<action_type>:<window>' per requested attribution window), and
+              'roas:<action_type>' / 'cpa:<action_type>' columns are derived from spend.
+            - 'columnar': A compact column-oriented payload for large reports: 'columns'
+              lists the column names, 'data' maps each name to its value array (metrics
+              parsed to numbers, action lists pivoted as in 'flat'), and repetitive string
+              columns such as campaign_name or breakdown values are dictionary-encoded:
+              their 'data' array holds indexes into 'dictionaries'[name].
 
     Returns:
         Dict: A dictionary containing the requested ad account insights. The main results
@@ -365,7 +4699,7 @@ def get_adaccount_insights(
         time_range=time_range,
         time_ranges=time_ranges,
         time_increment=time_increment,
-        level=level,
+        level=_default_insights_level(act_id, level),
         action_attribution_windows=action_attribution_windows,
         action_breakdowns=action_breakdowns,
         action_report_time=action_report_time,
@@ -384,7 +4718,7 @@ def get_adaccount_insights(
         locale=locale
     )
 
-    return _make_graph_api_call(url, params)
+    return _shape_insights_response(_cached_insights_call(act_id, url, params), format)
 
 @mcp.tool()
 def get_campaign_insights(
@@ -410,7 +4744,8 @@ def get_campaign_insights(
     offset: Optional[int] = None,
     since: Optional[str] = None,
     until: Optional[str] = None,
-    locale: Optional[str] = None
+    locale: Optional[str] = None,
+    format: str = 'json'
 ) -> Dict:
     """Retrieves performance insights for a specific Facebook ad campaign.
 
@@ -461,6 +4796,17 @@ def get_campaign_insights(
         until (Optional[str]): End timestamp for time-based pagination (if time ranges absent).
         locale (Optional[str]): The locale for text responses (e.g., 'en_US'). This controls 
             language and formatting of text fields in the response.
+        format (str): Output format of the 'data' rows.
+            - 'json': Rows exactly as returned by the API (default).
+            - 'flat': List fields such as 'actions', 'action_values' and 'cost_per_action_type'
+              are pivoted into numeric columns named '<field>:<action_type>' (plus
+              '<field>:<action_type>:<window>' per requested attribution window), and
+              'roas:<action_type>' / 'cpa:<action_type>' columns are derived from spend.
+            - 'columnar': A compact column-oriented payload for large reports: 'columns'
+              lists the column names, 'data' maps each name to its value array (metrics
+              parsed to numbers, action lists pivoted as in 'flat'), and repetitive string
+              columns such as campaign_name or breakdown values are dictionary-encoded:
+              their 'data' array holds indexes into 'dictionaries'[name].
 
     Returns:
         Dict: A dictionary containing the requested campaign insights, with 'data' and 'paging' keys.
@@ -513,7 +4859,7 @@ def get_campaign_insights(
         until=until,
         locale=locale
     )
-    return _make_graph_api_call(url, params)
+    return _shape_insights_response(_cached_insights_call(campaign_id, url, params), format)
 
 @mcp.tool()
 def get_adset_insights(
@@ -539,7 +4885,8 @@ def get_adset_insights(
     offset: Optional[int] = None,
     since: Optional[str] = None,
     until: Optional[str] = None,
-    locale: Optional[str] = None
+    locale: Optional[str] = None,
+    format: str = 'json'
 ) -> Dict:
     """Retrieves performance insights for a specific Facebook ad set.
 
@@ -584,6 +4931,17 @@ def get_adset_insights(
         until (Optional[str]): End timestamp for time-based pagination (if time ranges absent).
         locale (Optional[str]): The locale for text responses (e.g., 'en_US'). This controls 
             language and formatting of text fields in the response.
+        format (str): Output format of the 'data' rows.
+            - 'json': Rows exactly as returned by the API (default).
+            - 'flat': List fields such as 'actions', 'action_values' and 'cost_per_action_type'
+              are pivoted into numeric columns named '<field>:<action_type>' (plus
+              '<field>:<action_type>:<window>' per requested attribution window), and
+              'roas:<action_type>' / 'cpa:<action_type>' columns are derived from spend.
+            - 'columnar': A compact column-oriented payload for large reports: 'columns'
+              lists the column names, 'data' maps each name to its value array (metrics
+              parsed to numbers, action lists pivoted as in 'flat'), and repetitive string
+              columns such as campaign_name or breakdown values are dictionary-encoded:
+              their 'data' array holds indexes into 'dictionaries'[name].
     
     Returns:    
         Dict: A dictionary containing the requested ad set insights, with 'data' and 'paging' keys.
@@ -637,7 +4995,7 @@ def get_adset_insights(
         locale=locale
     )
 
-    return _make_graph_api_call(url, params)
+    return _shape_insights_response(_cached_insights_call(adset_id, url, params), format)
 
 
 @mcp.tool()
@@ -664,7 +5022,8 @@ def get_ad_insights(
     offset: Optional[int] = None,
     since: Optional[str] = None,
     until: Optional[str] = None,
-    locale: Optional[str] = None
+    locale: Optional[str] = None,
+    format: str = 'json'
 ) -> Dict:  
     """Retrieves detailed performance insights for a specific Facebook ad.
 
@@ -712,6 +5071,17 @@ def get_ad_insights(
         until (Optional[str]): End timestamp for time-based pagination (if time ranges absent).
         locale (Optional[str]): The locale for text responses (e.g., 'en_US'). This controls 
             language and formatting of text fields in the response.
+        format (str): Output format of the 'data' rows.
+            - 'json': Rows exactly as returned by the API (default).
+            - 'flat': List fields such as 'actions', 'action_values' and 'cost_per_action_type'
+              are pivoted into numeric columns named '<field>:<action_type>' (plus
+              '<field>:<action_type>:<window>' per requested attribution window), and
+              'roas:<action_type>' / 'cpa:<action_type>' columns are derived from spend.
+            - 'columnar': A compact column-oriented payload for large reports: 'columns'
+              lists the column names, 'data' maps each name to its value array (metrics
+              parsed to numbers, action lists pivoted as in 'flat'), and repetitive string
+              columns such as campaign_name or breakdown values are dictionary-encoded:
+              their 'data' array holds indexes into 'dictionaries'[name].
     
     Returns:    
         Dict: A dictionary containing the requested ad insights, with 'data' and 'paging' keys.
@@ -772,7 +5142,7 @@ def get_ad_insights(
         locale=locale
     )
 
-    return _make_graph_api_call(url, params)
+    return _shape_insights_response(_cached_insights_call(ad_id, url, params), format)
 
 
 @mcp.tool()
@@ -802,7 +5172,9 @@ def fetch_pagination_url(url: str) -> Dict:
     # so we don't use the _make_graph_api_call helper here.
     response = requests.get(url)
     response.raise_for_status()
-    return response.json()
+    result = _json_loads(response.content)
+    _ingest_entities(url, {}, result)
+    return result
 
 
 # --- Ad Creative Tools ---
@@ -1020,6 +5392,166 @@ def get_ad_creatives_by_ad_id(
     return _make_graph_api_call(url, params)
 
 
+@mcp.tool()
+def get_ad_creatives_bulk(
+    ad_ids: Optional[List[str]] = None,
+    adset_id: Optional[str] = None,
+    campaign_id: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> Dict:
+    """Retrieves the creatives of many ads at once, fetching each distinct creative only once.
+
+    Instead of calling `get_ad_creatives_by_ad_id` per ad, this tool resolves every ad's
+    creative ID (with one listing of the ad set's or campaign's ads, and/or multi-ID
+    lookups for explicit ad IDs), deduplicates the creative IDs and fetches the unique
+    creatives in multi-ID requests of up to 50 IDs. Ads and creatives whose requested
+    fields are fresh in the local entity store are not fetched again.
+
+    Args:
+        ad_ids (Optional[List[str]]): IDs of the ads whose creatives to retrieve.
+        adset_id (Optional[str]): Retrieve the creatives of every ad in this ad set.
+        campaign_id (Optional[str]): Retrieve the creatives of every ad in this campaign.
+        fields (Optional[List[str]]): Creative fields to retrieve. Defaults to the fields
+            kept in the account mirror: 'id', 'name', 'account_id', 'status', 'title',
+            'body', 'image_hash', 'image_url', 'thumbnail_url', 'video_id', 'link_url',
+            'url_tags', 'call_to_action_type', 'object_story_id' and
+            'effective_object_story_id'. See `get_ad_creative_by_id` for more fields.
+
+    Returns:
+        Dict: 'ads' maps each ad ID to its creative ID (None if the ad has no readable
+              creative), 'creatives' maps each unique creative ID to its details (deleted
+              or inaccessible creatives are left out), 'missing_ad_ids' lists the
+              requested ad IDs that are deleted or inaccessible, and 'summary' reports the number of ads, unique creatives and how many
+              creatives were served from the entity store.
+
+    Example:
+        ```python
+        result = get_ad_creatives_bulk(campaign_id="23843211234567", fields=["name", "body", "image_url"])
+        for ad_id, creative_id in result["ads"].items():
+            print(ad_id, result["creatives"][creative_id]["name"])
+        ```
+    """
+    if not (ad_ids or adset_id or campaign_id):
+        raise ValueError("Provide ad_ids, adset_id or campaign_id")
+    fields = list(dict.fromkeys(['id'] + (fields or MIRROR_FIELDS['adcreatives'])))
+    ads, missing_ad_ids = {}, []
+    for parent_id in filter(None, [adset_id, campaign_id]):
+        ads.update(_resolve_ad_creative_ids(parent_id=parent_id)[0])
+    if ad_ids:
+        resolved, missing_ad_ids = _resolve_ad_creative_ids(ad_ids=ad_ids)
+        ads.update(resolved)
+
+    creatives, missing = {}, []
+    for creative_id in dict.fromkeys(filter(None, ads.values())):
+        creative = _entity_store_get('adcreative', creative_id, ','.join(fields))
+        if creative is not None:
+            creatives[creative_id] = creative
+        else:
+            missing.append(creative_id)
+    from_store = len(creatives)
+    for creative in _fetch_creatives_by_ids(missing, fields) if missing else []:
+        creatives[creative['id']] = creative
+
+    return {
+        'ads': ads,
+        'creatives': creatives,
+        'missing_ad_ids': missing_ad_ids,
+        'summary': {'ads': len(ads), 'unique_creatives': len(creatives), 'creatives_from_store': from_store},
+    }
+
+
+@mcp.tool()
+def get_ad_previews(
+    ad_formats: List[str],
+    ad_ids: Optional[List[str]] = None,
+    creative_ids: Optional[List[str]] = None
+) -> Dict:
+    """Renders previews of many ads or creatives in one or more ad formats.
+
+    Uses the Graph API 'previews' edge of each creative. Ads are first mapped to their
+    creatives (see `get_ad_creatives_bulk`), so ads sharing a creative are rendered
+    once. The requests for all (creative, format) pairs run concurrently, and each
+    rendered iframe body is cached for 1 hour, so rendering the
+    same creative and format again costs no API call.
+
+    Args:
+        ad_formats (List[str]): The placements to render, e.g. 'DESKTOP_FEED_STANDARD',
+            'MOBILE_FEED_STANDARD', 'INSTAGRAM_STANDARD', 'INSTAGRAM_STORY',
+            'FACEBOOK_STORY_MOBILE', 'RIGHT_COLUMN_STANDARD', 'MARKETPLACE_MOBILE'.
+        ad_ids (Optional[List[str]]): IDs of the ads to preview.
+        creative_ids (Optional[List[str]]): IDs of ad creatives to preview.
+
+    Returns:
+        Dict: 'previews' maps each creative ID to {ad_format: iframe HTML}, 'ads' maps
+              each requested ad ID to its creative ID, 'missing_ad_ids' lists the ad IDs
+              that are deleted or inaccessible, 'errors' lists the (creative, format) pairs
+              that failed with their error, and 'summary' counts requested, cached,
+              fetched and failed renders.
+
+    Example:
+        ```python
+        result = get_ad_previews(
+            ad_formats=["DESKTOP_FEED_STANDARD", "INSTAGRAM_STORY"],
+            ad_ids=["23843211234567", "23843211234568"]
+        )
+        creative_id = result["ads"]["23843211234567"]
+        html = result["previews"][creative_id]["INSTAGRAM_STORY"]
+        ```
+    """
+    if not (ad_ids or creative_ids):
+        raise ValueError("Provide ad_ids or creative_ids")
+    ads, missing_ad_ids = _resolve_ad_creative_ids(ad_ids=ad_ids) if ad_ids else ({}, [])
+    creatives = list(dict.fromkeys(list(creative_ids or []) + [c for c in ads.values() if c]))
+    result = _render_previews(creatives, list(dict.fromkeys(ad_formats)))
+    result['ads'] = ads
+    result['missing_ad_ids'] = missing_ad_ids
+    return result
+
+
+@mcp.tool()
+def download_creative_assets(
+    creative_ids: Optional[List[str]] = None,
+    urls: Optional[List[str]] = None,
+    include_thumbnails: bool = True
+) -> Dict:
+    """Downloads creative images and thumbnails to a local cache and returns their file paths.
+
+    Image fields of the creatives are read from the local entity store when fresh, otherwise
+    fetched in multi-ID requests. Assets are deduplicated before downloading: images by
+    'image_hash', other URLs by their CDN file path (ignoring the signed query string), and
+    identical content is stored once under its SHA-256. Downloads run concurrently over a
+    pooled HTTP session. Files live under the server's state directory ('assets/'), which
+    is kept below 1 GB by evicting the least recently used files, so
+    repeat analyses read from disk instead of downloading again.
+
+    Args:
+        creative_ids (Optional[List[str]]): IDs of ad creatives whose 'image_url' (and
+            'thumbnail_url') should be downloaded.
+        urls (Optional[List[str]]): Additional asset URLs to download as-is, e.g. an
+            'image_url' taken from an earlier response.
+        include_thumbnails (bool): Whether to download each creative's 'thumbnail_url' too.
+            Default is True.
+
+    Returns:
+        Dict: 'assets', one entry per asset with 'creative_id' and 'kind' ('image',
+              'thumbnail' or 'url'), 'url', 'image_hash' where known, and then either
+              'path', 'sha256', 'bytes', 'content_type' and 'cached' (True when no
+              download was needed) or 'error'. 'summary' counts downloads, cache hits,
+              failures, bytes downloaded, evicted files and the cache's total size.
+
+    Example:
+        ```python
+        result = download_creative_assets(creative_ids=["120210000000001", "120210000000002"])
+        for asset in result["assets"]:
+            print(asset["creative_id"], asset["kind"], asset.get("path"))
+        ```
+    """
+    assets = _resolve_creative_assets(creative_ids or [], include_thumbnails)
+    assets.extend({'creative_id': None, 'kind': 'url', 'url': url} for url in urls or [])
+    summary = _fetch_assets(assets)
+    return {'assets': assets, 'summary': summary}
+
+
 # --- Ad Tools ---
 
 @mcp.tool()
@@ -1028,7 +5560,9 @@ def get_ad_by_id(ad_id: str, fields: Optional[List[str]] = None) -> Dict:
     
     This function accesses the Facebook Graph API to retrieve information about a
     single ad object, including details about its status, targeting, creative, budget,
-    and performance metrics.
+    and performance metrics. When explicit fields are requested and all of them were
+    seen recently in an earlier listing or lookup, the ad is served from the local
+    entity store without an API call.
     
     Args:
         ad_id (str): The ID of the ad to retrieve information for.
@@ -1068,7 +5602,6 @@ def get_ad_by_id(ad_id: str, fields: Optional[List[str]] = None) -> Dict:
         ```
     """
     access_token = _get_fb_access_token()
-    url = f"{FB_GRAPH_URL}/{ad_id}"
     params = {
         'access_token': access_token
     }
@@ -1076,7 +5609,7 @@ def get_ad_by_id(ad_id: str, fields: Optional[List[str]] = None) -> Dict:
     if fields:
         params['fields'] = ','.join(fields)
     
-    return _make_graph_api_call(url, params)
+    return _fetch_entity('ad', ad_id, params)
 
 
 @mcp.tool()
@@ -1095,7 +5628,9 @@ def get_ads_by_adaccount(
     """Retrieves ads from a specific Facebook ad account.
     
     This function allows querying all ads belonging to a specific ad account with
-    various filtering options, pagination, and field selection.
+    various filtering options, pagination, and field selection. If the account has been
+    loaded with `sync_adaccount_mirror`, requests without filtering, date or 'before'
+    parameters are answered from the local mirror instead of the Graph API.
     
     Args:
         act_id (str): The ID of the ad account to retrieve ads from, prefixed with 'act_', 
@@ -1160,6 +5695,11 @@ def get_ads_by_adaccount(
             )
         ```
     """
+    if not (filtering or before or date_preset or time_range):
+        mirrored = _read_from_mirror(act_id, 'ads', fields, limit, after, updated_since, effective_status)
+        if mirrored is not None:
+            return mirrored
+
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/{act_id}/ads"
     params = {
@@ -1402,6 +5942,8 @@ def get_adset_by_id(adset_id: str, fields: Optional[List[str]] = None) -> Dict:
     
     This function accesses the Facebook Graph API to retrieve information about a
     single ad set, including details about its targeting, budget, scheduling, and status.
+    When explicit fields are requested and all of them were seen recently in an earlier
+    listing or lookup, the ad set is served from the local entity store.
     
     Args:
         adset_id (str): The ID of the ad set to retrieve information for.
@@ -1473,7 +6015,6 @@ def get_adset_by_id(adset_id: str, fields: Optional[List[str]] = None) -> Dict:
         ```
     """
     access_token = _get_fb_access_token()
-    url = f"{FB_GRAPH_URL}/{adset_id}"
     params = {
         'access_token': access_token
     }
@@ -1481,7 +6022,7 @@ def get_adset_by_id(adset_id: str, fields: Optional[List[str]] = None) -> Dict:
     if fields:
         params['fields'] = ','.join(fields)
     
-    return _make_graph_api_call(url, params)
+    return _fetch_entity('adset', adset_id, params)
 
 
 @mcp.tool()
@@ -1493,7 +6034,8 @@ def get_adsets_by_ids(
     """Retrieves detailed information about multiple Facebook ad sets by their IDs.
     
     This function allows batch retrieval of multiple ad sets in a single API call,
-    improving efficiency when you need data for several ad sets.
+    improving efficiency when you need data for several ad sets. Ad sets whose
+    requested fields are all fresh in the local entity store are not re-fetched.
     
     Args:
         adset_ids (List[str]): A list of ad set IDs to retrieve information for.
@@ -1507,7 +6049,8 @@ def get_adsets_by_ids(
     
     Returns:
         Dict: A dictionary where keys are the ad set IDs and values are the
-              corresponding ad set details.
+              corresponding ad set details. IDs that the Graph API recently reported
+              as deleted or inaccessible are left out instead of failing the request.
     
     Example:
         ```python
@@ -1523,11 +6066,25 @@ def get_adsets_by_ids(
             print(adsets["23843211234567"]["name"])
         ```
     """
+    # IDs recently reported as deleted or inaccessible would fail the whole request
+    adset_ids = _drop_known_bad_ids(adset_ids)
+    if not adset_ids:
+        return {}
+
+    cached = {}
+    if fields and not date_format:
+        for adset_id in adset_ids:
+            adset = _entity_store_get('adset', adset_id, ','.join(fields))
+            if adset is not None:
+                cached[adset_id] = adset
+        if len(cached) == len(adset_ids):
+            return cached
+
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/"
     params = {
         'access_token': access_token,
-        'ids': ','.join(adset_ids)
+        'ids': ','.join(adset_id for adset_id in adset_ids if adset_id not in cached)
     }
     
     if fields:
@@ -1536,7 +6093,14 @@ def get_adsets_by_ids(
     if date_format:
         params['date_format'] = date_format
     
-    return _make_graph_api_call(url, params)
+    fetched = _make_graph_api_call(url, params)
+    if not date_format:
+        for adset in fetched.values():
+            _entity_store_put('adset', adset, params.get('fields'))
+    if not cached:
+        return fetched
+    return {adset_id: cached.get(adset_id, fetched.get(adset_id)) for adset_id in adset_ids
+            if adset_id in cached or adset_id in fetched}
 
 
 @mcp.tool()
@@ -1556,7 +6120,9 @@ def get_adsets_by_adaccount(
     """Retrieves ad sets from a specific Facebook ad account.
     
     This function allows querying all ad sets belonging to a specific ad account with
-    various filtering options, pagination, and field selection.
+    various filtering options, pagination, and field selection. If the account has been
+    loaded with `sync_adaccount_mirror`, requests without filtering, date or 'before'
+    parameters are answered from the local mirror instead of the Graph API.
     
     Args:
         act_id (str): The ID of the ad account to retrieve ad sets from, prefixed with 'act_', 
@@ -1627,6 +6193,11 @@ def get_adsets_by_adaccount(
             )
         ```
     """
+    if not (filtering or before or date_preset or time_range or date_format):
+        mirrored = _read_from_mirror(act_id, 'adsets', fields, limit, after, updated_since, effective_status)
+        if mirrored is not None:
+            return mirrored
+
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/{act_id}/adsets"
     params = {
@@ -1784,7 +6355,9 @@ def get_campaign_by_id(
     
     This function accesses the Facebook Graph API to retrieve information about a
     single campaign, including details about its objective, status, budget settings,
-    and other campaign-level configurations.
+    and other campaign-level configurations. When explicit fields are requested and all
+    of them were seen recently in an earlier listing or lookup, the campaign is served
+    from the local entity store.
     
     Args:
         campaign_id (str): The ID of the campaign to retrieve information for.
@@ -1864,7 +6437,6 @@ def get_campaign_by_id(
         ```
     """
     access_token = _get_fb_access_token()
-    url = f"{FB_GRAPH_URL}/{campaign_id}"
     params = {
         'access_token': access_token
     }
@@ -1875,7 +6447,7 @@ def get_campaign_by_id(
     if date_format:
         params['date_format'] = date_format
     
-    return _make_graph_api_call(url, params)
+    return _fetch_entity('campaign', campaign_id, params)
 
 @mcp.tool()
 def get_campaigns_by_adaccount(
@@ -1899,7 +6471,9 @@ def get_campaigns_by_adaccount(
     """Retrieves campaigns from a specific Facebook ad account.
     
     This function allows querying all campaigns belonging to a specific ad account with
-    various filtering options, pagination, and field selection.
+    various filtering options, pagination, and field selection. If the account has been
+    loaded with `sync_adaccount_mirror`, requests without filtering, date or 'before'
+    parameters are answered from the local mirror instead of the Graph API.
     
     Args:
         act_id (str): The ID of the ad account to retrieve campaigns from, prefixed with 'act_', 
@@ -1991,6 +6565,16 @@ def get_campaigns_by_adaccount(
             )
         ```
     """
+    uses_api_only_params = (
+        filtering or before or date_preset or time_range or date_format
+        or is_completed is not None or special_ad_categories or objective
+        or buyer_guarantee_agreement_status or include_drafts is not None
+    )
+    if not uses_api_only_params:
+        mirrored = _read_from_mirror(act_id, 'campaigns', fields, limit, after, updated_since, effective_status)
+        if mirrored is not None:
+            return mirrored
+
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/{act_id}/campaigns"
     params = {
@@ -2055,7 +6639,8 @@ def get_activities_by_adaccount(
     before: Optional[str] = None,
     time_range: Optional[Dict[str, str]] = None,
     since: Optional[str] = None,
-    until: Optional[str] = None
+    until: Optional[str] = None,
+    tail: bool = False
 ) -> Dict:
     """Retrieves activities for a Facebook ad account.
     
@@ -2097,12 +6682,18 @@ def get_activities_by_adaccount(
             of the time range for returned activities. Ignored if 'time_range' is provided.
         until (Optional[str]): End date in YYYY-MM-DD format. Defines the end 
             of the time range for returned activities. Ignored if 'time_range' is provided.
+        tail (bool): If True, returns only events that are new since the previous tail call.
+            A persisted checkpoint (latest event_time plus dedup keys) limits the request to
+            newer events, all pages are fetched automatically and new events are appended to
+            a local event log. 'limit', 'after', 'before', 'time_range' and 'until' are
+            ignored; 'since' only seeds the very first poll. Default: False.
     
     Returns:
         Dict: A dictionary containing the requested activities. The main results are in the 'data'
               list, and pagination info is in the 'paging' object. Each activity object contains
               information about who made the change, what was changed, when it occurred, and
-              the specific details of the change.
+              the specific details of the change. In tail mode, 'data' holds the new events in
+              chronological order and 'checkpoint' and 'log_path' replace 'paging'.
     
     Example:
         ```python
@@ -2134,8 +6725,14 @@ def get_activities_by_adaccount(
                 fields=["event_time", "actor_name", "object_type", "translated_event_type"],
                 after=next_page_cursor
             )
+        
+        # Ask what changed since the last check
+        changes = get_activities_by_adaccount(act_id="act_123456789", tail=True)
         ```
     """
+    if tail:
+        return _tail_activities(act_id, fields=fields, since=since)
+
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/{act_id}/activities"
     params = {
@@ -2177,7 +6774,8 @@ def get_activities_by_adset(
     before: Optional[str] = None,
     time_range: Optional[Dict[str, str]] = None,
     since: Optional[str] = None,
-    until: Optional[str] = None
+    until: Optional[str] = None,
+    tail: bool = False
 ) -> Dict:
     """Retrieves activities for a Facebook ad set.
     
@@ -2217,12 +6815,18 @@ def get_activities_by_adset(
             of the time range for returned activities. Ignored if 'time_range' is provided.
         until (Optional[str]): End date in YYYY-MM-DD format. Defines the end 
             of the time range for returned activities. Ignored if 'time_range' is provided.
+        tail (bool): If True, returns only events that are new since the previous tail call.
+            A persisted checkpoint (latest event_time plus dedup keys) limits the request to
+            newer events, all pages are fetched automatically and new events are appended to
+            a local event log. 'limit', 'after', 'before', 'time_range' and 'until' are
+            ignored; 'since' only seeds the very first poll. Default: False.
     
     Returns:
         Dict: A dictionary containing the requested activities. The main results are in the 'data'
               list, and pagination info is in the 'paging' object. Each activity object contains
               information about who made the change, what was changed, when it occurred, and
-              the specific details of the change.
+              the specific details of the change. In tail mode, 'data' holds the new events in
+              chronological order and 'checkpoint' and 'log_path' replace 'paging'.
     
     Example:
         ```python
@@ -2245,8 +6849,14 @@ def get_activities_by_adset(
             limit=50,
             fields=["event_time", "actor_name", "translated_event_type"]
         )
+        
+        # Ask what changed since the last check
+        changes = get_activities_by_adset(adset_id="123456789", tail=True)
         ```
     """
+    if tail:
+        return _tail_activities(adset_id, fields=fields, since=since)
+
     access_token = _get_fb_access_token()
     url = f"{FB_GRAPH_URL}/{adset_id}/activities"
     params = {
@@ -2277,7 +6887,646 @@ def get_activities_by_adset(
     return _make_graph_api_call(url, params)
 
 
+# --- Account Mirror Tools ---
+
+@mcp.tool()
+def sync_adaccount_mirror(act_id: str, full: bool = False) -> Dict:
+    """Loads or refreshes the local mirror of an ad account's structure.
+
+    The mirror holds the account's campaigns, ad sets, ads and ad creatives. The first
+    call performs a full load. Later calls request only campaigns, ad sets and ads
+    updated since the previous sync (using the 'updated_since' parameter) and merge
+    them in, so refreshing even a large account costs a few small requests.
+
+    Once an account is mirrored, `get_campaigns_by_adaccount`, `get_adsets_by_adaccount`
+    and `get_ads_by_adaccount` answer from the mirror when the request only uses
+    mirrored fields, 'limit', 'after', 'updated_since' and 'effective_status'. A mirror
+    older than 5 minutes is delta-synced automatically before being read; while the
+    activity poller keeps the account current (server started with
+    --activity-invalidation, see `run_activity_invalidation`) the allowed age extends
+    to 1 hour.
+
+    Args:
+        act_id (str): The ID of the ad account to mirror, prefixed with 'act_',
+                      e.g., 'act_1234567890'.
+        full (bool): If True, discards the existing mirror and reloads everything.
+                     Default is False.
+
+    Returns:
+        Dict: A summary of the sync with 'sync_type' ('full', 'delta', or 'shared' when
+              a fresher mirror synced by another server process was adopted from
+              the shared cache), the 'updated_since' watermark used, the number of
+              objects 'changed' per edge and the 'totals' now held per edge.
+
+    Example:
+        ```python
+        # Initial load, then cheap delta refreshes
+        sync_adaccount_mirror(act_id="act_123456789")
+        summary = sync_adaccount_mirror(act_id="act_123456789")
+        print(summary["changed"])  # e.g. {'campaigns': 0, 'adsets': 2, 'ads': 5, 'adcreatives': 1}
+        ```
+    """
+    return _sync_account_mirror(act_id, full=full)
+
+
+@mcp.tool()
+def run_activity_invalidation(act_id: str) -> Dict:
+    """Applies an ad account's latest activity events to the local caches right away.
+
+    When started with --activity-invalidation, the server polls the 'activities' edge of
+    every mirrored account, and of every account with cached insights, once a minute in
+    the background, until the account's cached data goes unused for an hour. Each change event (budget, status, targeting updates, new objects, ...) re-fetches the
+    named campaign, ad set or ad in the mirror and evicts the cached insights responses
+    that depend on it or on its parent objects. Use this tool to apply pending changes
+    immediately, for example right after editing objects in Ads Manager.
+
+    Args:
+        act_id (str): The ID of the ad account, prefixed with 'act_', e.g., 'act_1234567890'.
+
+    Returns:
+        Dict: A summary with the number of new 'events', the 'changed_objects' IDs, whether
+              an account-level change was seen, how many mirror objects were refreshed and
+              how many insights cache entries were evicted.
+
+    Example:
+        ```python
+        result = run_activity_invalidation(act_id="act_123456789")
+        print(result["insights_entries_evicted"])
+        ```
+    """
+    _register_invalidation_account(act_id)
+    return _invalidate_from_activities(act_id)
+
+
+# --- Hierarchy Tools ---
+
+@mcp.tool()
+def get_object_hierarchy(object_id: str, include_descendants: bool = True) -> Dict:
+    """Looks up the parents and children of an ad, ad set, campaign or ad account locally.
+
+    The server indexes the ad → ad set → campaign → account relationships found in every
+    listing, lookup and insights response (any row carrying 'adset_id', 'campaign_id' or
+    'account_id'). This tool reads that index without calling the Graph API, e.g. to find
+    the campaign owning an ad before calling `get_campaign_insights`. Objects that have
+    not appeared in an earlier response are not indexed; list or mirror their account
+    first (see `sync_adaccount_mirror`).
+
+    Args:
+        object_id (str): The ID of an ad, ad set or campaign, or an ad account ID
+                         (with or without the 'act_' prefix).
+        include_descendants (bool): Whether to include the known child ad sets and ads.
+                                    Default is True.
+
+    Returns:
+        Dict: 'object_id', its 'level' ('ad', 'adset', 'campaign', 'account' or None when
+              the object is not indexed), 'ancestors' (e.g. {'adset_id': ..., 'campaign_id':
+              ..., 'account_id': 'act_...'}) and, if requested, 'descendants' as lists of
+              IDs per level.
+
+    Example:
+        ```python
+        hierarchy = get_object_hierarchy(object_id="23843211234567", include_descendants=False)
+        campaign_id = hierarchy["ancestors"].get("campaign_id")
+        ```
+    """
+    result = {
+        'object_id': object_id,
+        'level': _hierarchy_level(object_id),
+        'ancestors': _hierarchy_ancestors(object_id),
+    }
+    if include_descendants:
+        result['descendants'] = {
+            level: sorted(_hierarchy_descendants(object_id, level)) for level in ['campaign', 'adset', 'ad']
+            if result['level'] and HIERARCHY_LEVELS.index(level) < HIERARCHY_LEVELS.index(result['level'])
+        }
+    return result
+
+
+# --- Query Planning Tools ---
+
+@mcp.tool()
+def plan_insights_query(
+    object_id: str,
+    fields: Optional[List[str]] = None,
+    date_preset: str = 'last_30d',
+    time_range: Optional[Dict[str, str]] = None,
+    time_ranges: Optional[List[Dict[str, str]]] = None,
+    time_increment: str = 'all_days',
+    level: Optional[str] = None,
+    action_attribution_windows: Optional[List[str]] = None,
+    action_breakdowns: Optional[List[str]] = None,
+    action_report_time: Optional[str] = None,
+    breakdowns: Optional[List[str]] = None,
+    default_summary: bool = False,
+    use_account_attribution_setting: bool = False,
+    use_unified_attribution_setting: bool = True,
+    filtering: Optional[List[dict]] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    locale: Optional[str] = None
+) -> Dict:
+    """Estimates the cost of an insights query and picks how to run it, without running it.
+
+    Takes the same parameters as `get_adaccount_insights` / `get_campaign_insights` /
+    `get_adset_insights` / `get_ad_insights` (without pagination cursors) and returns a
+    dry-run plan. Row counts are estimated from the number of objects at the requested
+    level (taken from the account mirror or the hierarchy index when available, otherwise
+    from typical fan-outs), the number of time buckets and typical breakdown
+    cardinalities. They are upper bounds, since objects without delivery return no rows.
+
+    Strategies, cheapest first:
+        - 'local_cache' / 'local_rollup': answered from cached insights, no requests.
+        - 'single_call': one request, paginated.
+        - 'time_split': one request per date chunk (listed in 'calls' as 'time_range').
+        - 'per_campaign_fanout': one request per campaign (listed as 'filtering').
+        - 'async_report': too large for synchronous requests; run as an asynchronous
+          report job.
+
+    Args:
+        object_id (str): The ad account ID (prefixed with 'act_'), campaign, ad set or ad ID
+                         the query would run against.
+        fields, date_preset, time_range, time_ranges, time_increment, level,
+        action_attribution_windows, action_breakdowns, action_report_time, breakdowns,
+        default_summary, use_account_attribution_setting, use_unified_attribution_setting,
+        filtering, sort, limit, since, until, locale: As for `get_adaccount_insights`.
+            'level' defaults to 'account' for ad accounts and to the object's own level
+            otherwise.
+
+    Returns:
+        Dict: The plan, with:
+              - 'strategy' and 'reason'.
+              - 'estimate': 'rows', 'days', 'time_buckets_per_object', 'objects',
+                'object_count_source' ('exact', 'account_mirror', 'hierarchy_index' or
+                'default'), 'breakdown_cardinality', 'page_size', 'api_calls',
+                'requests' and 'rate_limit_points'.
+              - 'calls': The parameter overrides of each call the strategy makes (at most
+                100, see 'calls_truncated').
+              - 'alternatives': Other viable strategies with their request counts.
+
+    Example:
+        ```python
+        plan = plan_insights_query(
+            object_id="act_123456789",
+            fields=["ad_id", "spend", "impressions"],
+            level="ad",
+            time_range={"since": "2024-01-01", "until": "2024-12-31"},
+            time_increment="1",
+            breakdowns=["age", "gender"]
+        )
+        print(plan["strategy"], plan["estimate"]["requests"])
+        ```
+    """
+    params = _build_insights_params(
+        params={'access_token': _get_fb_access_token()},
+        fields=fields,
+        date_preset=date_preset,
+        time_range=time_range,
+        time_ranges=time_ranges,
+        time_increment=time_increment,
+        level=_default_insights_level(object_id, level),
+        action_attribution_windows=action_attribution_windows,
+        action_breakdowns=action_breakdowns,
+        action_report_time=action_report_time,
+        breakdowns=breakdowns,
+        default_summary=default_summary,
+        use_account_attribution_setting=use_account_attribution_setting,
+        use_unified_attribution_setting=use_unified_attribution_setting,
+        filtering=filtering,
+        sort=sort,
+        limit=limit,
+        since=since,
+        until=until,
+        locale=locale
+    )
+    return _plan_insights_query(object_id, params)
+
+
+# --- Export Tools ---
+
+@mcp.tool()
+def export_query_to_file(
+    query: str,
+    object_id: str,
+    params: Optional[Dict[str, Any]] = None,
+    file_format: str = 'ndjson',
+    output_path: Optional[str] = None
+) -> Dict:
+    """Runs an insights or listing query over all pages and streams the rows to a local file.
+
+    Use this instead of the inline tools for large results, e.g. a full-account daily
+    level='ad' report. Pages are fetched one after another and written immediately, so
+    memory use stays constant. The rows themselves are not returned.
+
+    Args:
+        query (str): What to fetch from 'object_id'. Options:
+            - 'insights': The insights edge. 'params' takes the same arguments as the
+              insights tools, e.g. fields, date_preset, time_range, time_increment,
+              level, breakdowns, action_attribution_windows, filtering.
+            - 'campaigns', 'adsets', 'ads', 'adcreatives', 'activities': The listing
+              edge of that name. 'params' takes the listing arguments, e.g. fields,
+              filtering, effective_status, updated_since, time_range.
+        object_id (str): The object to query, e.g. 'act_1234567890' or a campaign ID.
+        params (Optional[Dict[str, Any]]): Query parameters as described above. 'limit'
+            fixes the page size; if omitted, the page size is tuned automatically from
+            the response times and sizes seen for this kind of query. Pagination is
+            handled automatically.
+        file_format (str): Output format. Options:
+            - 'ndjson': One JSON object per line, rows exactly as returned (default).
+            - 'csv': One column per field; action lists are pivoted into
+              '<field>:<action_type>' columns and other nested values JSON-encoded.
+              The header lists every column found in any row.
+            - 'parquet': Same columns as 'csv' with numeric metric columns. Requires
+              the optional 'pyarrow' package.
+        output_path (Optional[str]): Where to write the file. Defaults to a timestamped
+            file in the 'exports' folder of the server's state directory.
+
+    Returns:
+        Dict: 'path' of the written file, 'format', 'row_count', number of 'pages',
+              file size in 'bytes', and the 'schema' as a list of {'name', 'type'} entries.
+
+    Example:
+        ```python
+        export = export_query_to_file(
+            query="insights",
+            object_id="act_123456789",
+            params={
+                "fields": ["ad_id", "ad_name", "impressions", "spend", "actions"],
+                "level": "ad",
+                "time_increment": "1",
+                "date_preset": "last_90d"
+            },
+            file_format="csv"
+        )
+        print(export["path"], export["row_count"])
+        ```
+    """
+    return _export_query(query, object_id, params=params, file_format=file_format, output_path=output_path)
+
+
+# --- Result Handle Tools ---
+
+@mcp.tool()
+def query_to_result_handle(
+    query: str,
+    object_id: str,
+    params: Optional[Dict[str, Any]] = None
+) -> Dict:
+    """Runs a query over all pages and keeps the result on the server behind a handle.
+
+    Instead of returning every row, this returns a handle and a short summary. Use
+    `read_result_handle` (or the 'result://{handle}/{offset}/{limit}' resource) to read
+    row ranges, selected columns or filtered subsets later without calling the Graph API
+    again. Results are held in memory, spilled to disk when memory is tight, and the least
+    recently used ones are discarded once the store is full.
+
+    Args:
+        query (str): What to fetch from 'object_id': 'insights', 'campaigns', 'adsets',
+            'ads', 'adcreatives' or 'activities'. See `export_query_to_file`.
+        object_id (str): The object to query, e.g. 'act_1234567890' or a campaign ID.
+        params (Optional[Dict[str, Any]]): Query parameters, exactly as for
+            `export_query_to_file`. Pagination is handled automatically.
+
+    Returns:
+        Dict: The 'handle', the 'row_count', the stored size in 'bytes', all 'columns'
+              seen and a 'preview' of the first rows.
+
+    Example:
+        ```python
+        result = query_to_result_handle(
+            query="ads",
+            object_id="act_123456789",
+            params={"fields": ["id", "name", "effective_status", "adset_id"]}
+        )
+        paused = read_result_handle(
+            handle=result["handle"],
+            filters=[{"field": "effective_status", "operator": "EQUAL", "value": "PAUSED"}]
+        )
+        ```
+    """
+    url, request_params = _build_export_request(query, object_id, params)
+    rows = _iter_graph_rows(url, request_params, adaptive=not (params or {}).get('limit'))
+    return _store_result(query, object_id, rows)
+
+
+@mcp.tool()
+def read_result_handle(
+    handle: str,
+    offset: int = 0,
+    limit: int = 100,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[dict]] = None
+) -> Dict:
+    """Reads a slice of a result stored by `query_to_result_handle`.
+
+    Args:
+        handle (str): The handle returned by `query_to_result_handle`.
+        offset (int): Index of the first matching row to return. Default is 0.
+        limit (int): Maximum number of rows to return. Default is 100.
+        columns (Optional[List[str]]): Only return these fields of each row. If None, all
+            fields are returned.
+        filters (Optional[List[dict]]): Filter objects with 'field', 'operator' and 'value'
+            keys, as in the Graph API 'filtering' parameter. Operators: 'EQUAL',
+            'NOT_EQUAL', 'GREATER_THAN', 'GREATER_THAN_OR_EQUAL', 'LESS_THAN',
+            'LESS_THAN_OR_EQUAL', 'IN', 'NOT_IN', 'CONTAIN', 'NOT_CONTAIN'.
+            Comparisons are numeric for the GREATER/LESS operators.
+
+    Returns:
+        Dict: The requested rows in 'data', the total number of 'matched_rows' and the
+              'next_offset' to use for the following slice (None when done).
+
+    Example:
+        ```python
+        top = read_result_handle(
+            handle="res_0123456789ab",
+            columns=["ad_id", "spend"],
+            filters=[{"field": "spend", "operator": "GREATER_THAN", "value": 100}],
+            limit=20
+        )
+        ```
+    """
+    return _read_result(handle, offset=offset, limit=limit, columns=columns, filters=filters)
+
+
+@mcp.resource("result://{handle}/{offset}/{limit}", mime_type="application/json")
+def result_handle_slice(handle: str, offset: str, limit: str) -> str:
+    """A row range of a result stored by `query_to_result_handle`."""
+    return _json_dumps(_read_result(handle, offset=int(offset), limit=int(limit)))
+
+
+# --- Background Job Tools ---
+
+@mcp.tool()
+def start_background_job(kind: str, params: Dict[str, Any]) -> Dict:
+    """Starts a long-running operation in the background and returns its job ID immediately.
+
+    Jobs run on a worker pool (4 at a time), so large operations cannot hit
+    client timeouts. Follow a job with `wait_for_job` (which sends MCP progress
+    notifications) or `get_job_status`, stop it with `cancel_job`, and continue an
+    interrupted, failed or cancelled job from its last checkpoint with `resume_job`,
+    also after a server restart.
+
+    Args:
+        kind (str): The kind of job:
+            - 'export': Streams a query to a file, like `export_query_to_file`. Params:
+              'query', 'object_id', optional 'params', 'file_format' (default 'ndjson')
+              and 'output_path'. NDJSON exports resume from the last completed page;
+              CSV and Parquet exports restart when resumed.
+            - 'fanout': Runs one query for each of many objects (e.g. insights for many
+              ad accounts) into one NDJSON file whose rows carry a 'source_id' field.
+              Params: 'query', 'object_ids' and optional 'params'. Objects that fail are
+              listed in the result instead of failing the job; resuming skips completed
+              objects.
+            - 'backfill': Loads daily insights history under a rate limit budget; see
+              `start_insights_backfill` for its parameters.
+        params (Dict[str, Any]): The job's parameters as described above. 'query' is
+            'insights' or a listing edge ('campaigns', 'adsets', 'ads', 'adcreatives',
+            'activities'), and 'params' holds that query's parameters.
+
+    Returns:
+        Dict: The job's 'id', 'kind', 'status' ('queued'), 'params' and 'progress'.
+
+    Example:
+        ```python
+        job = start_background_job(
+            kind="fanout",
+            params={
+                "query": "insights",
+                "object_ids": ["act_111", "act_222", "act_333"],
+                "params": {"fields": ["spend", "impressions"], "date_preset": "last_30d"}
+            }
+        )
+        status = get_job_status(job_id=job["id"])
+        ```
+    """
+    return _start_job(kind, params)
+
+
+@mcp.tool()
+def get_job_status(job_id: str, preview_rows: int = 0) -> Dict:
+    """Returns the status, progress and (partial) result of a background job.
+
+    Args:
+        job_id (str): The ID returned by `start_background_job`.
+        preview_rows (int): Number of rows to include from the start of the job's output
+            file, including rows written before the job finished. Default is 0.
+
+    Returns:
+        Dict: 'status' ('queued', 'running', 'completed', 'failed', 'cancelled' or
+              'interrupted' when the server stopped while it was active), 'progress'
+              ({'done', 'total', 'message'}), 'partial_result' (output path and rows so
+              far), 'result' once completed, 'error' if it failed, timestamps and, if
+              requested, 'preview'.
+    """
+    return _job_summary(_get_job(job_id), preview_rows=preview_rows)
+
+
+@mcp.tool()
+def list_jobs(status: Optional[str] = None) -> Dict:
+    """Lists background jobs, newest first, including jobs from earlier server runs.
+
+    Args:
+        status (Optional[str]): Only list jobs with this status, e.g. 'running' or
+                                'interrupted'.
+
+    Returns:
+        Dict: 'jobs', each with 'id', 'kind', 'status', 'progress', 'created_at' and
+              'finished_at'.
+    """
+    _load_jobs()
+    with _JOBS_LOCK:
+        jobs = sorted(_JOBS.values(), key=lambda job: job['created_at'], reverse=True)
+    return {'jobs': [
+        {key: job.get(key) for key in ('id', 'kind', 'status', 'progress', 'created_at', 'finished_at')}
+        for job in jobs if status is None or job['status'] == status
+    ]}
+
+
+@mcp.tool()
+def cancel_job(job_id: str) -> Dict:
+    """Requests cancellation of a queued or running background job.
+
+    A running job stops at its next checkpoint (after the current page or object) and
+    keeps its partial output, so it can later be continued with `resume_job`.
+
+    Args:
+        job_id (str): The ID of the job to cancel.
+
+    Returns:
+        Dict: The job's current summary.
+    """
+    job = _get_job(job_id)
+    if job['status'] in JOB_ACTIVE_STATUSES:
+        _JOB_CANCEL_EVENTS[job_id].set()
+    return _job_summary(job)
+
+
+@mcp.tool()
+def resume_job(job_id: str) -> Dict:
+    """Continues an interrupted, failed or cancelled background job from its last checkpoint.
+
+    Args:
+        job_id (str): The ID of the job to resume.
+
+    Returns:
+        Dict: The job's summary, with 'status' 'queued'.
+    """
+    job = _get_job(job_id)
+    if job['status'] not in JOB_RESUMABLE_STATUSES:
+        raise ValueError(f"Job {job_id} is {job['status']}; only {', '.join(JOB_RESUMABLE_STATUSES)} jobs can be resumed")
+    _submit_job(job)
+    return _job_summary(job)
+
+
+@mcp.tool()
+async def wait_for_job(job_id: str, timeout_seconds: float = 60, ctx: Context = None) -> Dict:
+    """Waits for a background job to finish, sending MCP progress notifications meanwhile.
+
+    Progress notifications are sent whenever the job's progress changes, if the client
+    asked for them (by passing a progress token). Returns early when the timeout expires;
+    call again to keep waiting.
+
+    Args:
+        job_id (str): The ID of the job to wait for.
+        timeout_seconds (float): Maximum time to wait. Default is 60.
+
+    Returns:
+        Dict: The job's summary, as from `get_job_status`.
+    """
+    job = _get_job(job_id)
+    deadline = time.monotonic() + timeout_seconds
+    last_progress = None
+    while True:
+        progress = job['progress']
+        if ctx is not None and progress != last_progress:
+            last_progress = dict(progress)
+            await ctx.report_progress(progress['done'], progress['total'])
+        if job['status'] not in JOB_ACTIVE_STATUSES or time.monotonic() >= deadline:
+            return _job_summary(job)
+        await asyncio.sleep(min(JOB_WAIT_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+
+
+@mcp.tool()
+def start_insights_backfill(
+    act_ids: List[str],
+    since: str,
+    until: Optional[str] = None,
+    levels: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None,
+    chunk: str = 'month',
+    reserved_budget_pct: float = BACKFILL_RESERVED_BUDGET_PCT,
+    params: Optional[Dict[str, Any]] = None
+) -> Dict:
+    """Starts a background job that pulls daily insights history for ad accounts.
+
+    The date range is split into calendar months (or single days) per account and level.
+    Chunks are queued newest first and run on 3 concurrent workers. Before
+    each chunk, the rate limit usage Graph reported in recent response headers
+    (X-App-Usage, X-Ad-Account-Usage, X-Business-Use-Case-Usage) is checked, and workers
+    pause while less than `reserved_budget_pct` percent is left, so interactive tool calls
+    keep working. Each finished chunk is written to its own NDJSON file and checkpointed;
+    after a crash or restart, `resume_job` only runs the missing chunks. Follow the job
+    with `wait_for_job` or `get_job_status`.
+
+    Args:
+        act_ids (List[str]): The ad accounts to backfill, e.g. ['act_1234567890'].
+        since (str): First day to load, 'YYYY-MM-DD'. Clamped to the 37 months of history
+                     Graph keeps.
+        until (Optional[str]): Last day to load, 'YYYY-MM-DD'. Defaults to yesterday.
+        levels (Optional[List[str]]): Insights levels to load, any of 'account', 'campaign',
+                                      'adset', 'ad'. Default is ['ad'].
+        fields (Optional[List[str]]): Metrics to load. The ID and name columns of the level
+            and its parents are always included. Default: impressions, clicks, spend,
+            reach, frequency, actions and action_values.
+        chunk (str): 'month' (default) or 'day'. Use 'day' for very large accounts.
+        reserved_budget_pct (float): Share of every rate limit, in percent, kept free for
+                                     interactive calls. Default is 25.
+        params (Optional[Dict[str, Any]]): Extra insights parameters such as 'breakdowns'
+                                           or 'action_attribution_windows'.
+
+    Returns:
+        Dict: The job summary from `start_background_job`. When complete, its 'result'
+              holds the output 'directory' (one file per account, level and chunk), the
+              number of chunks, how many completed, the failed chunks with their errors,
+              and the total 'row_count'.
+
+    Example:
+        ```python
+        job = start_insights_backfill(
+            act_ids=["act_123456789"],
+            since="2023-01-01",
+            levels=["campaign", "ad"]
+        )
+        status = wait_for_job(job_id=job["id"], timeout_seconds=300)
+        ```
+    """
+    return _start_job('backfill', {
+        'act_ids': act_ids, 'since': since, 'until': until or None, 'levels': levels or None,
+        'fields': fields, 'chunk': chunk, 'reserved_budget_pct': reserved_budget_pct, 'params': params,
+    })
+
+
+# --- Diagnostics Tools ---
+
+@mcp.tool()
+def get_server_diagnostics() -> Dict:
+    """Reports the internal state of the server's caches and protection mechanisms.
+
+    Useful when tool calls fail fast or seem slow: it shows which circuit breakers are
+    open (and when they will allow a trial request again), the tuned page sizes per
+    endpoint family, the rate limit usage Graph last reported and how much is held in
+    the local caches.
+
+    Returns:
+        Dict: A dictionary with:
+              - 'circuit_breakers': Per breaker key ('family:insights', 'family:node_reads',
+                'family:activities', 'account:act_...') its 'state' ('closed', 'open' or
+                'half_open'), recent request and failure counts, and 'retry_after_seconds'
+                while not closed.
+              - 'adaptive_page_limits': Current page size per endpoint family.
+              - 'rate_limit_usage': Per scope ('app', 'account:act_...',
+                'buc:<id>:<use case>') the usage percentage from the last response
+                headers of the past 5 minutes, with the estimated
+                seconds until access is regained.
+              - 'caches': Entry counts of the insights response cache, account mirrors,
+                result handles, accounts under activity-driven invalidation, object
+                IDs known to be deleted or inaccessible, the entity store, the
+                hierarchy index and rendered ad previews.
+              - 'warmup': The start-up warm-up's 'state' ('disabled', 'running' or
+                'done') and the status of each item it loads ('ok' or 'error: ...').
+              - 'coalesced_requests': How many calls waited for an identical
+                in-flight request instead of sending their own.
+              - 'snapshot': The cache snapshot file, when it was last saved (and its
+                compressed size) and what was restored from it at start-up.
+
+    Example:
+        ```python
+        diagnostics = get_server_diagnostics()
+        open_breakers = {k: v for k, v in diagnostics["circuit_breakers"].items() if v["state"] != "closed"}
+        ```
+    """
+    return {
+        'circuit_breakers': _breaker_snapshot(),
+        'adaptive_page_limits': dict(_ADAPTIVE_PAGE_LIMITS),
+        'rate_limit_usage': _rate_usage_snapshot(),
+        'caches': {
+            'insights_responses': len(_RESPONSE_CACHE),
+            'account_mirrors': len(_ACCOUNT_MIRRORS),
+            'result_handles': len(_RESULT_HANDLES),
+            'invalidation_accounts': len(_INVALIDATION_ACCOUNTS),
+            'known_bad_object_ids': len(_NEGATIVE_CACHE),
+            'entities': len(_ENTITY_STORE),
+            'hierarchy_objects': len(_HIERARCHY_SLOTS),
+            'ad_previews': len(_PREVIEW_CACHE),
+        },
+        'warmup': {**_WARMUP_STATUS, 'items': dict(_WARMUP_STATUS['items'])},
+        'coalesced_requests': _COALESCED_CALLS,
+        'snapshot': dict(_SNAPSHOT_STATUS),
+    }
+
+
 if __name__ == "__main__":
     _get_fb_access_token()
-    mcp.run(transport='stdio')
+    _run_server()
     
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""Shared fixtures: a freshly imported server module and a fake Graph API."""
+import importlib
+import json
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TOKEN = 'TEST_TOKEN'
+
+
+class FakeResponse:
+    """Stands in for requests.Response, including streaming."""
+
+    def __init__(self, body, status_code=200, headers=None):
+        self.content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.text = self.content.decode('utf-8')
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            error = requests.exceptions.HTTPError(f"{self.status_code} error")
+            error.response = self
+            raise error
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def graph_error(code, subcode=None, message='error', status=400):
+    """Builds a Graph API error response."""
+    error = {'code': code, 'message': message}
+    if subcode is not None:
+        error['error_subcode'] = subcode
+    return FakeResponse({'error': error}, status)
+
+
+class FakeGraph:
+    """Replaces requests.get; `handler(path, query)` returns a dict or a FakeResponse.
+
+    `path` is the URL path without the API version, e.g. 'act_1/insights' ('' for
+    multi-ID requests), and `query` merges the URL query with the params.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.handler = lambda path, query: {}
+
+    def __call__(self, url, params=None, **kwargs):
+        parsed = urlparse(url)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        query.update({key: str(value) for key, value in (params or {}).items()})
+        path = parsed.path.strip('/').split('/', 1)[1] if parsed.path.strip('/').count('/') else ''
+        self.calls.append((path, query))
+        result = self.handler(path, query)
+        return result if isinstance(result, FakeResponse) else FakeResponse(result)
+
+    def paths(self):
+        return [path for path, _ in self.calls]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """The server module, re-imported so every test starts with empty caches."""
+    monkeypatch.setattr(sys, 'argv', ['server.py', '--fb-token', TOKEN])
+    import server as module
+    module = importlib.reload(module)
+    module.STATE_DIR = str(tmp_path / 'state')
+    module.SHARED_CACHE_ENABLED = False
+    return module
+
+
+@pytest.fixture
+def graph(server, monkeypatch):
+    fake = FakeGraph()
+    monkeypatch.setattr(server.requests, 'get', fake)
+    return fake
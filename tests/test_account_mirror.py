@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from conftest import graph_error
+
+ACCOUNT = {
+    'campaigns': [{'id': 'c1', 'name': 'C', 'account_id': '1', 'effective_status': 'ACTIVE'}],
+    'adsets': [{'id': 's1', 'name': 'S', 'account_id': '1', 'campaign_id': 'c1', 'effective_status': 'ACTIVE'}],
+    'ads': [{'id': 'a1', 'name': 'A', 'account_id': '1', 'campaign_id': 'c1', 'adset_id': 's1',
+             'effective_status': 'ACTIVE', 'creative': {'id': 'cr1'}}],
+    'adcreatives': [{'id': 'cr1', 'name': 'Old title'}],
+}
+
+
+def serve(graph, edges, creatives=None):
+    def handler(path, query):
+        if path.startswith('act_1/'):
+            return {'data': edges.get(path.split('/')[1], [])}
+        return {i: {'id': i, **(creatives or {}).get(i, {})} for i in query['ids'].split(',')}
+    graph.handler = handler
+
+
+def test_delta_sync_asks_for_changes_since_the_watermark(server, graph):
+    serve(graph, ACCOUNT)
+    first = server._sync_account_mirror('act_1')
+    assert first['sync_type'] == 'full' and first['totals']['adcreatives'] == 1
+    watermark = server._ACCOUNT_MIRRORS['act_1']['watermark']
+    assert watermark <= time.time() - server.MIRROR_WATERMARK_OVERLAP_SECONDS
+
+    graph.calls.clear()
+    updated_campaign = {**ACCOUNT['campaigns'][0], 'name': 'Renamed'}
+    serve(graph, {'campaigns': [updated_campaign]})
+    second = server._sync_account_mirror('act_1')
+    assert second['sync_type'] == 'delta' and second['updated_since'] == watermark
+    assert {path: query.get('updated_since') for path, query in graph.calls} == {
+        'act_1/campaigns': str(watermark), 'act_1/adsets': str(watermark), 'act_1/ads': str(watermark)}
+    assert server._ACCOUNT_MIRRORS['act_1']['objects']['campaigns']['c1']['name'] == 'Renamed'
+    assert second['changed'] == {'campaigns': 1, 'adsets': 0, 'ads': 0, 'adcreatives': 0}
+
+
+def test_delta_sync_refreshes_creatives_of_updated_ads(server, graph):
+    serve(graph, ACCOUNT)
+    server._sync_account_mirror('act_1')
+
+    updated_ad = {**ACCOUNT['ads'][0], 'name': 'A2'}
+    new_ad = {**updated_ad, 'id': 'a2', 'creative': {'id': 'cr2'}}
+    serve(graph, {'ads': [updated_ad, new_ad]},
+          creatives={'cr1': {'name': 'New title'}, 'cr2': {'name': 'Second'}})
+    server._sync_account_mirror('act_1')
+
+    [(_, query)] = [call for call in graph.calls if call[0] == '']
+    assert query['ids'] == 'cr1,cr2'
+    creatives = server._ACCOUNT_MIRRORS['act_1']['objects']['adcreatives']
+    assert {i: c['name'] for i, c in creatives.items()} == {'cr1': 'New title', 'cr2': 'Second'}
+
+
+def test_mirror_is_readable_while_a_sync_waits_on_graph(server, graph):
+    serve(graph, ACCOUNT)
+    server._sync_account_mirror('act_1')
+    release = threading.Event()
+
+    def slow(path, query):
+        release.wait(5)
+        return {'data': []}
+    graph.handler = slow
+    sync = threading.Thread(target=server._sync_account_mirror, args=('act_1',))
+    sync.start()
+    try:
+        read = []
+        reader = threading.Thread(target=lambda: read.append(
+            server._read_from_mirror('act_1', 'ads', ['id', 'name'], None, None, None, None)))
+        reader.start()
+        reader.join(2)
+        assert read == [{'data': [{'id': 'a1', 'name': 'A'}], 'paging': {'cursors': {'before': 'mirror:0'}}}]
+    finally:
+        release.set()
+        sync.join(5)
+
+
+def test_sync_stamps_only_the_objects_it_fetched(server, graph, monkeypatch):
+    serve(graph, ACCOUNT)
+    server._sync_account_mirror('act_1')
+    synced = time.time()
+    # A direct read later saw a newer name for the ad set
+    server._entity_store_put('adset', {'id': 's1', 'name': 'Newer'}, 'id,name')
+
+    monkeypatch.setattr(server.time, 'time', lambda: synced + server.ENTITY_FIELD_MAX_AGE_SECONDS + 1)
+    serve(graph, {'campaigns': [{**ACCOUNT['campaigns'][0], 'name': 'Renamed'}]})
+    server._sync_account_mirror('act_1')
+
+    assert server._entity_store_get('campaign', 'c1', 'id,name') == {'id': 'c1', 'name': 'Renamed'}
+    assert server._entity_store_get('ad', 'a1', 'id,name') is None
+    assert server._ENTITY_STORE[('adset', 's1')]['values']['name'] == 'Newer'
+
+
+def test_failed_delta_sync_falls_back_to_the_api(server, graph):
+    serve(graph, ACCOUNT)
+    server._sync_account_mirror('act_1')
+    server._ACCOUNT_MIRRORS['act_1']['synced_at'] = 0
+
+    live = {'id': 'c1', 'name': 'Live'}
+    graph.handler = lambda path, query: (
+        graph_error(2, message='Service temporarily unavailable', status=503) if path == 'act_1/adsets'
+        else {'data': [live]} if path == 'act_1/campaigns' and 'updated_since' not in query else {'data': []}
+    )
+    assert server.get_campaigns_by_adaccount('act_1', fields=['name'])['data'] == [live]
+
+
+def test_malformed_mirror_cursor_is_rejected(server, graph):
+    serve(graph, ACCOUNT)
+    server._sync_account_mirror('act_1')
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        server.get_campaigns_by_adaccount('act_1', fields=['name'], after='mirror:abc')
@@ -0,0 +1,120 @@
+import time
+
+from conftest import graph_error
+
+
+def recent(seconds_ago):
+    return time.strftime('%Y-%m-%dT%H:%M:%S+0000', time.gmtime(time.time() - seconds_ago))
+
+
+CAMPAIGNS = [
+    {'id': 'c1', 'name': 'One', 'account_id': '1', 'effective_status': 'ACTIVE'},
+    {'id': 'c2', 'name': 'Two', 'account_id': '1', 'effective_status': 'ACTIVE'},
+    {'id': 'c3', 'name': 'Three', 'account_id': '1', 'effective_status': 'ACTIVE'},
+]
+EVENTS = [
+    {'event_time': recent(600), 'event_type': 'update_campaign_name',
+     'object_id': 'c1', 'object_type': 'CAMPAIGN'},
+    {'event_time': recent(300), 'event_type': 'update_campaign_run_status',
+     'object_id': 'c2', 'object_type': 'CAMPAIGN'},
+]
+
+
+def mirrored_account(server, graph, refresh):
+    """Mirrors act_1, then serves the two change events and `refresh` for re-fetches."""
+    def handler(path, query):
+        if path == 'act_1/campaigns':
+            return {'data': CAMPAIGNS}
+        if path == 'act_1/activities':
+            return {'data': EVENTS}
+        if path.startswith('act_1/'):
+            return {'data': []}
+        return refresh(path, query)
+    graph.handler = handler
+    server._sync_account_mirror('act_1')
+    return server._ACCOUNT_MIRRORS['act_1']
+
+
+def test_refresh_retries_without_ids_the_error_names(server, graph):
+    def refresh(path, query):
+        ids = query['ids'].split(',')
+        if 'c2' in ids:
+            return graph_error(803, message='Some of the aliases you requested do not exist: c2')
+        return {i: {'id': i, 'name': 'Renamed', 'account_id': '1', 'effective_status': 'ACTIVE'} for i in ids}
+    mirror = mirrored_account(server, graph, refresh)
+
+    result = server._invalidate_from_activities('act_1')
+
+    assert result['mirror_objects_refreshed'] == 1
+    assert mirror['objects']['campaigns']['c1']['name'] == 'Renamed'
+    assert 'c2' not in mirror['objects']['campaigns']
+    assert 'c3' in mirror['objects']['campaigns']
+
+
+def test_refresh_falls_back_to_single_reads(server, graph):
+    def refresh(path, query):
+        if path == '':
+            return graph_error(100, 33, 'Unsupported get request')
+        if path == 'c2':
+            return graph_error(100, 33, 'Object with ID c2 does not exist')
+        return {'id': path, 'name': 'Renamed', 'account_id': '1', 'effective_status': 'ACTIVE'}
+    mirror = mirrored_account(server, graph, refresh)
+
+    server._invalidate_from_activities('act_1')
+
+    assert mirror['objects']['campaigns']['c1']['name'] == 'Renamed'
+    assert 'c2' not in mirror['objects']['campaigns']
+    assert {'c1', 'c2'} <= set(graph.paths())
+
+
+def test_failed_refresh_keeps_objects_and_forces_a_sync(server, graph):
+    mirror = mirrored_account(server, graph, lambda path, query: graph_error(1, message='Unknown error', status=500))
+
+    server._invalidate_from_activities('act_1')
+
+    assert set(mirror['objects']['campaigns']) == {'c1', 'c2', 'c3'}
+    assert mirror['synced_at'] == 0
+
+
+def test_every_process_applies_the_events(server, graph, monkeypatch):
+    mirrored_account(server, graph, lambda path, query: {
+        i: {'id': i, 'name': 'Renamed', 'account_id': '1', 'effective_status': 'ACTIVE'}
+        for i in query['ids'].split(',')})
+
+    assert server._invalidate_from_activities('act_1')['changed_objects'] == ['c1', 'c2']
+    assert server._invalidate_from_activities('act_1')['changed_objects'] == []
+    monkeypatch.setattr(server.os, 'getpid', lambda: 1)  # Another worker sharing the log
+    assert server._invalidate_from_activities('act_1')['changed_objects'] == ['c1', 'c2']
+
+
+def test_events_from_before_the_process_window_are_skipped(server, graph, monkeypatch):
+    EVENTS.insert(0, {'event_time': recent(server.MIRROR_MAX_AGE_INVALIDATED_SECONDS + 600),
+                      'event_type': 'update_campaign_name', 'object_id': 'c3', 'object_type': 'CAMPAIGN'})
+    try:
+        mirrored_account(server, graph, lambda path, query: {})
+        server._tail_activities('act_1')  # Logged before this worker polled
+        monkeypatch.setattr(server, '_INVALIDATION_STARTED_AT', time.time())
+        assert server._invalidate_from_activities('act_1')['changed_objects'] == ['c1', 'c2']
+    finally:
+        del EVENTS[0]
+
+
+def test_poller_is_off_by_default(server):
+    server._register_invalidation_account('act_1')
+    assert server._INVALIDATION_ACCOUNTS == {} and server._INVALIDATION_THREAD is None
+
+
+def test_idle_accounts_stop_being_polled(server, graph, monkeypatch):
+    monkeypatch.setattr(server, 'ACTIVITY_INVALIDATION_ENABLED', True)
+    monkeypatch.setattr(server, '_invalidation_loop', lambda: None)
+    graph.handler = lambda path, query: {'data': EVENTS}
+    server._register_invalidation_account('act_1')
+    server._register_invalidation_account('act_2')
+    server._invalidate_from_activities('act_1')
+    checkpoint_path = f"{server._get_state_dir('activities')}/act_1.checkpoint.json"
+    assert server._invalidation_consumer() in server._load_json_file(checkpoint_path, {})['consumer_offsets']
+
+    server._INVALIDATION_LAST_USED['act_1'] -= server.ACTIVITY_INVALIDATION_IDLE_SECONDS + 1
+    assert server._expire_idle_invalidation_accounts() == ['act_1']
+    assert list(server._INVALIDATION_ACCOUNTS) == ['act_2']
+    assert server._load_json_file(checkpoint_path, {})['consumer_offsets'] == {}
@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def event(minute, object_id='c1', event_type='update_campaign_name'):
+    return {'event_time': f"2024-05-01T10:{minute:02d}:00+0000", 'event_type': event_type,
+            'object_id': object_id, 'object_type': 'CAMPAIGN'}
+
+
+def serve(graph, events):
+    graph.handler = lambda path, query: {'data': list(reversed(events))}
+
+
+def test_polls_log_only_new_events(server, graph):
+    serve(graph, [event(0), event(5)])
+    first = server._tail_activities('act_1')
+    assert [e['event_time'] for e in first['data']] == ['2024-05-01T10:00:00+0000', '2024-05-01T10:05:00+0000']
+
+    # The edge repeats the high-water event; a second event at the same second is new
+    serve(graph, [event(5), event(5, object_id='c2'), event(9)])
+    second = server._tail_activities('act_1')
+    assert [(e['object_id'], e['event_time'][14:16]) for e in second['data']] == [('c2', '05'), ('c1', '09')]
+    assert second['checkpoint']['logged_events'] == 4
+    assert graph.calls[1][1]['since'] == str(int(server._parse_graph_time(event(5)['event_time'])))
+
+
+def test_each_consumer_reads_every_event_once(server, graph):
+    serve(graph, [event(0), event(1)])
+    assert len(server._tail_activities('act_1', consumer='a')['data']) == 2
+    assert len(server._tail_activities('act_1', consumer='a')['data']) == 0
+    assert len(server._tail_activities('act_1', consumer='b')['data']) == 2
+
+
+def test_lines_written_after_the_last_checkpoint_are_dropped(server, graph):
+    serve(graph, [event(0)])
+    result = server._tail_activities('act_1')
+    log_path = result['log_path']
+    with open(log_path, 'a', encoding='utf-8') as log_file:  # Crash after append, before save
+        log_file.write('{"event_time": "2024-05-01T10:30:00+0000", "partial": true}\n')
+
+    serve(graph, [event(0), event(2)])
+    result = server._tail_activities('act_1')
+    assert [e['event_time'][14:16] for e in result['data']] == ['02']
+    with open(log_path, encoding='utf-8') as log_file:
+        assert [line for line in log_file if 'partial' in line] == []
+    assert result['checkpoint']['logged_events'] == 2
+    assert os.path.getsize(log_path) == server._load_json_file(
+        log_path.replace('.ndjson', '.checkpoint.json'), {})['log_bytes']
+
+
+def test_idle_consumers_are_forgotten(server, graph, monkeypatch):
+    serve(graph, [event(0)])
+    server._tail_activities('act_1', consumer='gone')
+    now = time.time()
+    monkeypatch.setattr(server.time, 'time', lambda: now + server.ACTIVITY_CONSUMER_IDLE_SECONDS + 1)
+    result = server._tail_activities('act_1', consumer='live')
+    checkpoint = server._load_json_file(result['log_path'].replace('.ndjson', '.checkpoint.json'), {})
+    assert set(checkpoint['consumer_offsets']) == set(checkpoint['consumer_seen']) == {'live'}
+
+
+@pytest.mark.skipif(fcntl is None, reason='needs fcntl')
+def test_log_lock_excludes_other_processes(server):
+    with server._activity_log_lock('act_1'):
+        with open(os.path.join(server._get_state_dir('activities'), 'act_1.lock'), 'a') as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with open(os.path.join(server._get_state_dir('activities'), 'act_1.lock'), 'a') as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def test_log_is_compacted_below_the_slowest_consumer(server, graph, monkeypatch):
+    monkeypatch.setattr(server, 'ACTIVITY_LOG_COMPACT_BYTES', 1)
+    serve(graph, [event(0), event(1)])
+    server._tail_activities('act_1', consumer='fast')
+    server._tail_activities('act_1', consumer='slow')
+    serve(graph, [event(1), event(2)])
+    result = server._tail_activities('act_1', consumer='fast')
+    with open(result['log_path']) as log_file:
+        assert [server._json_loads(line)['event_time'][14:16] for line in log_file] == ['02']
+
+    assert [e['event_time'][14:16] for e in server._tail_activities('act_1', consumer='slow')['data']] == ['02']
+    assert [e['event_time'][14:16] for e in server._tail_activities('act_1', consumer='new')['data']] == []
+    assert server._tail_activities('act_1', consumer='fast')['checkpoint']['logged_events'] == 3
+
+
+@pytest.mark.parametrize('checkpoint_saved', [True, False])
+def test_interrupted_compaction_is_finished_or_undone(server, graph, checkpoint_saved):
+    serve(graph, [event(0), event(1)])
+    log_path = server._tail_activities('act_1', consumer='a')['log_path']
+    checkpoint_path = log_path.replace('.ndjson', '.checkpoint.json')
+    checkpoint = server._load_json_file(checkpoint_path, {})
+    with open(log_path, 'rb') as log_file:
+        first_line = log_file.readline()
+        rest = log_file.read()
+    start = len(first_line)
+    with open(f"{log_path}.{start}.tmp", 'wb') as compacted:
+        compacted.write(rest)
+    if checkpoint_saved:  # Crash between saving the checkpoint and replacing the log
+        server._save_json_file(checkpoint_path, dict(checkpoint, log_start=start))
+
+    serve(graph, [])
+    assert server._tail_activities('act_1', consumer='b')['data'] == [
+        server._json_loads(line) for line in ([rest] if checkpoint_saved else [first_line, rest])]
+    with open(log_path, 'rb') as log_file:
+        assert log_file.read() == (rest if checkpoint_saved else first_line + rest)
+    assert not os.path.exists(f"{log_path}.{start}.tmp")
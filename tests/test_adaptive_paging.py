@@ -0,0 +1,49 @@
+import json
+
+from conftest import graph_error
+
+
+def reduce_data_error():
+    return graph_error(1, message="Please reduce the amount of data you're asking for, then retry your request", status=500)
+
+
+def test_reduce_data_error_halves_the_page_size(server, graph):
+    graph.handler = lambda path, query: reduce_data_error() if query['limit'] == '100' else {'data': [{'id': '1'}]}
+    result = server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/ads", {'limit': 100, 'access_token': 'x'})
+    assert result == {'data': [{'id': '1'}]}
+    assert [query['limit'] for _, query in graph.calls] == ['100', '50']
+    assert server._adaptive_page_limit('ads') == 50
+
+
+def test_page_size_never_grows_past_a_rejected_limit(server):
+    server._ADAPTIVE_PAGE_CEILINGS['ads'] = 200
+    url = f"{server.FB_GRAPH_URL}/act_1/ads"
+    server._record_page_stats(url, {'limit': 150}, elapsed=0.1, size=1000, rows=150)
+    assert server._adaptive_page_limit('ads') == 199
+
+
+def test_daily_insights_range_is_split_in_two(server, graph):
+    def handler(path, query):
+        time_range = json.loads(query['time_range'])
+        if time_range == {'since': '2024-01-01', 'until': '2024-01-04'}:
+            return reduce_data_error()
+        return {'data': [{'date_start': time_range['since'], 'date_stop': time_range['until']}]}
+    graph.handler = handler
+    result = server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/insights", {
+        'time_range': json.dumps({'since': '2024-01-01', 'until': '2024-01-04'}),
+        'time_increment': 1, 'access_token': 'x',
+    })
+    assert [row['date_start'] for row in result['data']] == ['2024-01-01', '2024-01-03']
+
+
+def test_insights_fields_are_split_and_joined_back(server, graph):
+    def handler(path, query):
+        fields = query['fields'].split(',')
+        if 'spend' in fields and 'clicks' in fields:
+            return reduce_data_error()
+        return {'data': [{'ad_id': 'a', **{field: '1' for field in fields if field != 'ad_id'}}]}
+    graph.handler = handler
+    result = server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/insights", {
+        'fields': 'spend,clicks', 'level': 'ad', 'access_token': 'x',
+    })
+    assert result == {'data': [{'spend': '1', 'clicks': '1'}], 'paging': {}}
@@ -0,0 +1,32 @@
+from conftest import FakeResponse
+
+CDN = 'https://scontent.xx.fbcdn.net/v/t45.1600-4/123_n.jpg'
+
+
+def test_key_drops_only_signature_parameters(server):
+    signed = [f"{CDN}?stp=dst-jpg_s600x600&_nc_cat=1&_nc_sid=a&oh=00_AA&oe=6650",
+              f"{CDN}?_nc_cat=7&stp=dst-jpg_s600x600&_nc_ohc=x&oh=00_BB&oe=6651"]
+    assert server._asset_key(signed[0]) == server._asset_key(signed[1]) == f"url:{CDN[8:]}?stp=dst-jpg_s600x600"
+    assert server._asset_key(f"{CDN}?stp=dst-jpg_s100x100&oh=1") != server._asset_key(signed[0])
+    assert server._asset_key(f"{CDN}?oh=1&oe=2") == f"url:{CDN[8:]}"
+    assert server._asset_key(signed[0], image_hash='abc') == 'hash:abc'
+
+
+def test_signed_variants_download_once_and_sizes_separately(server, monkeypatch):
+    downloads = []
+
+    class Session:
+        def get(self, url, **kwargs):
+            downloads.append(url)
+            size = url.split('stp=')[1].split('&')[0]
+            return FakeResponse(f"image {size}".encode(), headers={'Content-Type': 'image/jpeg'})
+    monkeypatch.setattr(server, '_asset_session', lambda: Session())
+
+    assets = [{'url': f"{CDN}?stp=s600&oh=1&oe=1"}, {'url': f"{CDN}?stp=s600&oh=2&oe=2&_nc_sid=z"},
+              {'url': f"{CDN}?stp=s100&oh=3&oe=3"}]
+    summary = server._fetch_assets(assets)
+
+    assert len(downloads) == 2 and summary['downloaded'] == 2
+    assert assets[0]['sha256'] == assets[1]['sha256'] != assets[2]['sha256']
+    again = server._fetch_assets([{'url': f"{CDN}?stp=s100&oh=9&oe=9"}])
+    assert again['cache_hits'] == 1 and len(downloads) == 2
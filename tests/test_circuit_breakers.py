@@ -0,0 +1,40 @@
+import pytest
+import requests
+
+from conftest import FakeResponse, graph_error
+
+
+def test_breaker_opens_after_repeated_server_errors(server, graph):
+    graph.handler = lambda path, query: FakeResponse({'error': {'code': 2, 'message': 'down'}}, 500)
+    for i in range(server.BREAKER_MIN_REQUESTS):
+        with pytest.raises(requests.exceptions.HTTPError):
+            server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/insights", {'since': i})
+    with pytest.raises(server.CircuitOpenError) as raised:
+        server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/insights", {'since': 'next'})
+    assert raised.value.key == 'family:insights'
+    assert len(graph.calls) == server.BREAKER_MIN_REQUESTS
+    assert server._breaker_snapshot()['account:act_1']['state'] == 'open'
+
+
+def test_bad_requests_do_not_open_the_breaker(server, graph):
+    graph.handler = lambda path, query: graph_error(100, message='Invalid parameter')
+    for i in range(server.BREAKER_MIN_REQUESTS + 1):
+        with pytest.raises(requests.exceptions.HTTPError):
+            server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/ads", {'since': i})
+    assert server._breaker_snapshot()['family:node_reads']['state'] == 'closed'
+
+
+def test_half_open_trial_success_closes_the_breaker(server, graph):
+    server._BREAKERS['family:insights'] = {**server._new_breaker(), 'state': 'open', 'opened_at': 0}
+    graph.handler = lambda path, query: {'data': []}
+    assert server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/insights", {}) == {'data': []}
+    assert server._breaker_snapshot()['family:insights']['state'] == 'closed'
+
+
+def test_half_open_trial_failure_doubles_the_cool_down(server, graph):
+    server._BREAKERS['family:insights'] = {**server._new_breaker(), 'state': 'open', 'opened_at': 0}
+    graph.handler = lambda path, query: FakeResponse({'error': {'code': 2}}, 503)
+    with pytest.raises(requests.exceptions.HTTPError):
+        server._make_graph_api_call(f"{server.FB_GRAPH_URL}/act_1/insights", {})
+    breaker = server._BREAKERS['family:insights']
+    assert (breaker['state'], breaker['open_seconds']) == ('open', 2 * server.BREAKER_OPEN_SECONDS)
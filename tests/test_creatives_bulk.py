@@ -0,0 +1,45 @@
+from conftest import graph_error
+
+
+ADS = {'data': [{'id': 'a1', 'creative': {'id': 'c1'}}, {'id': 'a2', 'creative': {'id': 'c1'}},
+                {'id': 'a3', 'creative': {'id': 'c2'}}]}
+
+
+def creatives_handler(path, query):
+    if path == 'as_1/ads':
+        return ADS
+    return {creative_id: {'id': creative_id, 'name': f"Creative {creative_id}"}
+            for creative_id in query['ids'].split(',')}
+
+
+def test_shared_creatives_are_fetched_once(server, graph):
+    graph.handler = creatives_handler
+    result = server.get_ad_creatives_bulk(adset_id='as_1', fields=['name'])
+    assert result['ads'] == {'a1': 'c1', 'a2': 'c1', 'a3': 'c2'}
+    assert set(result['creatives']) == {'c1', 'c2'}
+    creative_requests = [query for path, query in graph.calls if path == '']
+    assert [query['ids'].split(',') for query in creative_requests] == [['c1', 'c2']]
+
+
+def test_fresh_creatives_come_from_the_entity_store(server, graph):
+    graph.handler = creatives_handler
+    server.get_ad_creatives_bulk(adset_id='as_1', fields=['name'])
+    graph.calls.clear()
+    result = server.get_ad_creatives_bulk(adset_id='as_1', fields=['name'])
+    assert result['creatives']['c2'] == {'id': 'c2', 'name': 'Creative c2'}
+    assert graph.paths() == ['as_1/ads']
+
+
+def test_deleted_ad_is_reported_instead_of_failing_the_call(server, graph):
+    def handler(path, query):
+        ids = query.get('ids', '').split(',')
+        if 'a_gone' in ids:
+            return graph_error(803, message='Some of the aliases you requested do not exist: a_gone')
+        if path == '' and query['fields'] == 'creative':
+            return {ad_id: {'id': ad_id, 'creative': {'id': 'c1'}} for ad_id in ids}
+        return creatives_handler(path, query)
+    graph.handler = handler
+    result = server.get_ad_creatives_bulk(ad_ids=['a1', 'a_gone'], fields=['name'])
+    assert result['ads'] == {'a1': 'c1'}
+    assert result['missing_ad_ids'] == ['a_gone']
+    assert set(result['creatives']) == {'c1'}
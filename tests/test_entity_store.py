@@ -0,0 +1,27 @@
+def test_listing_answers_single_object_lookups(server, graph):
+    graph.handler = lambda path, query: {'data': [
+        {'id': '1', 'name': 'Ad 1', 'status': 'ACTIVE', 'creative': {'id': 'c1', 'title': 'Hello'}},
+        {'id': '2', 'name': 'Ad 2'},
+    ]}
+    server.get_ads_by_adaccount('act_1', fields=['name', 'status', 'creative{id,title}'])
+    graph.calls.clear()
+
+    assert server.get_ad_by_id('1', fields=['name', 'status']) == {'id': '1', 'name': 'Ad 1', 'status': 'ACTIVE'}
+    # A requested field Graph left out is known to be unset
+    assert server.get_ad_by_id('2', fields=['status']) == {'id': '2'}
+    # Expanded references are stored as entities of their own
+    assert server._entity_store_get('adcreative', 'c1', 'title') == {'id': 'c1', 'title': 'Hello'}
+    assert graph.calls == []
+
+
+def test_unknown_or_stale_fields_go_to_the_api(server, graph, monkeypatch):
+    graph.handler = lambda path, query: {'data': [{'id': '1', 'name': 'Ad 1'}]} if path.endswith('/ads') else {
+        'id': '1', 'name': 'Ad 1', 'status': 'PAUSED'}
+    server.get_ads_by_adaccount('act_1', fields=['name'])
+
+    server.get_ad_by_id('1', fields=['name', 'status'])
+    assert graph.paths()[-1] == '1'
+
+    monkeypatch.setattr(server, 'ENTITY_FIELD_MAX_AGE_SECONDS', -1)
+    server.get_ad_by_id('1', fields=['name'])
+    assert len(graph.calls) == 3
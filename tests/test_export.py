@@ -0,0 +1,60 @@
+import csv
+import json
+
+import pytest
+
+ROWS = [
+    {'ad_id': '1', 'impressions': '10', 'spend': '1.5', 'note': '5'},
+    {'ad_id': '2', 'impressions': '20', 'spend': '2', 'note': 'n/a',
+     'actions': [{'action_type': 'link_click', 'value': '3'}]},
+]
+
+
+def test_csv_header_covers_columns_first_seen_in_later_rows(server, tmp_path):
+    path = tmp_path / 'out.csv'
+    result = server._export_rows(iter(ROWS), 'csv', str(path))
+
+    assert result['schema'] == {'ad_id': 'string', 'impressions': 'number', 'spend': 'number', 'note': 'string',
+                                'actions:link_click': 'number', 'cpa:link_click': 'number'}
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['actions:link_click'] == '' and rows[1]['actions:link_click'] == '3.0'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.csv']
+
+
+def test_parquet_types_cover_every_row(server, tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'out.parquet'
+    rows = ROWS * (server.PARQUET_ROW_GROUP_ROWS // 2 + 1)
+    result = server._export_rows(iter(rows), 'parquet', str(path))
+
+    table = pyarrow_parquet.read_table(path)
+    assert table.num_rows == result['row_count'] == len(rows)
+    assert str(table.schema.field('note').type) == 'string'
+    assert str(table.schema.field('actions:link_click').type) == 'double'
+    assert table.column('actions:link_click').to_pylist()[:2] == [None, 3.0]
+
+
+def test_ndjson_schema_widens_types(server, tmp_path):
+    path = tmp_path / 'out.ndjson'
+    result = server._export_rows(iter(ROWS), 'ndjson', str(path))
+    assert result['schema']['note'] == 'string' and result['schema']['actions'] == 'list'
+    assert [json.loads(line) for line in open(path)] == ROWS
+
+
+def test_empty_parquet_export_writes_a_file(server, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'empty.parquet'
+    assert server._export_rows(iter([]), 'parquet', str(path)) == {'row_count': 0, 'schema': {}}
+    assert path.exists()
+
+
+def test_csv_keeps_nested_lists_as_json(server, tmp_path):
+    path = tmp_path / 'ads.csv'
+    tracking_specs = [{'action.type': ['offsite_conversion'], 'fb_pixel': ['1']}]
+    server._export_rows(iter([{'id': '1', 'adlabels': [{'id': 'l1'}], 'tracking_specs': tracking_specs}]),
+                        'csv', str(path))
+    with open(path, newline='') as f:
+        row = next(csv.DictReader(f))
+    assert json.loads(row['adlabels']) == [{'id': 'l1'}]
+    assert json.loads(row['tracking_specs']) == tracking_specs
@@ -0,0 +1,38 @@
+def index_ad(server, ad_id, adset_id='s1', campaign_id='c1', account_id='1'):
+    server._index_hierarchy({'ad_id': ad_id, 'adset_id': adset_id, 'campaign_id': campaign_id,
+                             'account_id': account_id})
+
+
+def test_ancestors_and_descendants(server):
+    index_ad(server, 'a1')
+    server._index_hierarchy({'id': 'a2', 'adset_id': 's2'}, 'ad')
+    server._index_hierarchy({'id': 's2', 'campaign_id': 'c1'}, 'adset')
+
+    assert server._hierarchy_ancestors('a2') == {'adset_id': 's2', 'campaign_id': 'c1', 'account_id': 'act_1'}
+    assert sorted(server._hierarchy_descendants('c1', 'ad')) == ['a1', 'a2']
+    assert server._hierarchy_level('s2') == 'adset'
+
+
+def test_account_ids_resolve_without_the_prefix(server):
+    index_ad(server, 'a1')
+    result = server.get_object_hierarchy('1')
+    assert result['level'] == 'account'
+    assert result['descendants'] == {'campaign': ['c1'], 'adset': ['s1'], 'ad': ['a1']}
+    assert server._hierarchy_level('a1') == 'ad'  # Other IDs are looked up as given
+
+
+def test_least_recently_seen_objects_are_forgotten(server, monkeypatch):
+    monkeypatch.setattr(server, 'HIERARCHY_MAX_OBJECTS', 6)
+    index_ad(server, 'a1')
+    index_ad(server, 'a2')  # a1, a2, s1, c1, act_1: five objects
+    index_ad(server, 'a3', adset_id='s9', campaign_id='c9', account_id='9')  # Pushes out a1, a2, s1
+
+    assert len(server._HIERARCHY_SLOTS) == 6
+    assert server._hierarchy_level('a1') is None and server._hierarchy_level('s1') is None
+    assert server._hierarchy_descendants('c1') == []
+    assert server._hierarchy_ancestors('a3') == {'adset_id': 's9', 'campaign_id': 'c9', 'account_id': 'act_9'}
+
+    allocated = len(server._HIERARCHY_IDS)
+    index_ad(server, 'a4')  # Reuses freed slots
+    assert server._hierarchy_ancestors('a4') == {'adset_id': 's1', 'campaign_id': 'c1', 'account_id': 'act_1'}
+    assert len(server._HIERARCHY_IDS) == allocated
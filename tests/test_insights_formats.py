@@ -0,0 +1,46 @@
+import math
+
+ROWS = [
+    {'ad_id': '1', 'campaign_name': 'Spring', 'spend': '10', 'impressions': '100',
+     'actions': [{'action_type': 'purchase', 'value': '2', '7d_click': '1'}],
+     'action_values': [{'action_type': 'purchase', 'value': '50'}]},
+    {'ad_id': '2', 'campaign_name': 'Spring', 'spend': 'n/a', 'impressions': '300',
+     'actions': [{'action_type': 'purchase', 'value': '4', 'weird_window': 'n/a'},
+                 {'action_type': 'link_click', 'action_device': 'iphone', 'value': '7'}]},
+]
+
+
+def test_flat_pivots_actions_and_derives_ratios(server):
+    flat = server._flatten_insights_rows(ROWS)
+    assert flat[0] == {'ad_id': '1', 'campaign_name': 'Spring', 'spend': '10', 'impressions': '100',
+                       'actions:purchase': 2.0, 'actions:purchase:7d_click': 1.0, 'cpa:purchase': 5.0,
+                       'action_values:purchase': 50.0, 'roas:purchase': 5.0}
+    # Non-numeric spend and metric values are left out instead of failing the response
+    assert flat[1] == {'ad_id': '2', 'campaign_name': 'Spring', 'spend': 'n/a', 'impressions': '300',
+                       'actions:purchase': 4.0, 'actions:link_click:iphone': 7.0}
+
+
+def test_columnar_parses_metrics_and_dictionary_encodes_strings(server):
+    shaped = server._shape_insights_response({'data': ROWS, 'paging': {}}, 'columnar')
+    assert shaped['paging'] == {} and shaped['row_count'] == 2
+    assert shaped['columns'][:4] == ['ad_id', 'campaign_name', 'spend', 'impressions']
+    assert shaped['data']['ad_id'] == ['1', '2']
+    assert shaped['data']['impressions'] == [100, 300]
+    assert shaped['dictionaries']['campaign_name'] == ['Spring'] and shaped['data']['campaign_name'] == [0, 0]
+    assert shaped['data']['actions:purchase'] == [2.0, 4.0]
+    assert shaped['data']['roas:purchase'] == [5.0, None]
+
+
+def test_pivot_columns_are_nan_where_missing(server):
+    columns = server._pivot_action_lists(ROWS)
+    assert math.isnan(columns['actions:link_click:iphone'][0]) and columns['actions:link_click:iphone'][1] == 7.0
+
+
+def test_lists_that_are_not_action_lists_are_kept(server):
+    rows = [{'id': '1', 'adlabels': [{'id': 'l1', 'name': 'Sale'}],
+             'actions': [{'action_type': 'purchase', 'value': '1'}]}]
+    assert server._flatten_insights_rows(rows) == [
+        {'id': '1', 'adlabels': [{'id': 'l1', 'name': 'Sale'}], 'actions:purchase': 1.0}]
+    columnar = server._to_columnar(rows)
+    assert columnar['columns'] == ['id', 'adlabels', 'actions:purchase']
+    assert columnar['data']['adlabels'] == [[{'id': 'l1', 'name': 'Sale'}]]
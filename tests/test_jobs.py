@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import graph_error
+
+
+def day(days_ago):
+    return (datetime.now() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+
+
+def wait(server, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = server._JOBS[job_id]
+        if job['status'] not in server.JOB_ACTIVE_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_unexpected_chunk_error_fails_only_that_chunk(server, graph):
+    broken_day = day(2)
+
+    def handler(path, query):
+        time_range = json.loads(query['time_range'])
+        if time_range['since'] == broken_day:
+            raise RuntimeError('unexpected')
+        return {'data': [{'ad_id': '1', 'date_start': time_range['since'], 'impressions': '5'}]}
+    graph.handler = handler
+
+    job = server._start_job('backfill', {'act_ids': ['1'], 'since': day(3), 'until': day(1), 'chunk': 'day'})
+    job = wait(server, job['id'])
+
+    assert job['status'] == 'completed'
+    result = job['result']
+    assert result['chunks'] == 3 and result['completed'] == 2 and result['row_count'] == 2
+    assert result['failed'] == {f"act_1/ad/{broken_day}_{broken_day}": 'RuntimeError: unexpected'}
+
+
+@pytest.mark.parametrize('params, message', [
+    ({'since': '2024/01/01'}, 'YYYY-MM-DD'),
+    ({'params': ['breakdowns']}, 'must be a dict'),
+    ({'params': {'level': 'campaign'}}, 'cannot set'),
+    ({'params': {'breakdown': ['age']}}, 'Invalid insights parameters'),
+])
+def test_backfill_parameters_are_checked_before_queueing(server, params, message):
+    with pytest.raises(ValueError, match=message):
+        server._start_job('backfill', {'act_ids': ['act_1'], 'since': day(10), **params})
+    assert server._JOBS == {}
+
+
+def fanout_handler(path, query):
+    if path == 'as_2/ads':
+        return graph_error(100, message='Invalid parameter')
+    return {'data': [{'id': f"{path.split('/')[0]}_ad"}]}
+
+
+def test_fanout_records_failed_objects_and_tags_rows(server, graph):
+    graph.handler = fanout_handler
+    job = server._start_job('fanout', {'query': 'ads', 'object_ids': ['as_1', 'as_2', 'as_3']})
+    job = wait(server, job['id'])
+
+    assert job['status'] == 'completed'
+    assert job['result']['completed'] == 2 and list(job['result']['failed']) == ['as_2']
+    with open(job['result']['path']) as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [{'id': 'as_1_ad', 'source_id': 'as_1'}, {'id': 'as_3_ad', 'source_id': 'as_3'}]
+
+
+def test_interrupted_job_resumes_from_its_checkpoint(server, graph):
+    graph.handler = fanout_handler
+    job = wait(server, server._start_job('fanout', {'query': 'ads', 'object_ids': ['as_1', 'as_3']})['id'])
+    with open(job['result']['path'], 'rb') as f:
+        first_object = f.readline()
+    with open(job['result']['path'], 'ab') as f:
+        f.write(b'{"id": "half-written')
+    # As left by a server stopped while the second object was being fetched
+    server._save_json_file(server._job_path(job['id']), dict(
+        job, status='running', result=None,
+        checkpoint={'completed': ['as_1'], 'failed': {}, 'rows': 1, 'offset': len(first_object)},
+    ))
+    server._JOBS.clear()
+    server._JOBS_LOADED = False
+    assert server._get_job(job['id'])['status'] == 'interrupted'
+
+    graph.calls.clear()
+    server.resume_job(job['id'])
+    job = wait(server, job['id'])
+    assert job['status'] == 'completed' and job['result']['row_count'] == 2
+    assert graph.paths() == ['as_3/ads']
+    with open(job['result']['path']) as f:
+        assert [json.loads(line)['source_id'] for line in f] == ['as_1', 'as_3']
+
+
+def test_cancelled_job_stops_at_its_next_checkpoint(server, graph):
+    started, release = threading.Event(), threading.Event()
+
+    def handler(path, query):
+        started.set()
+        release.wait(5)
+        return {'data': [{'id': 'ad'}]}
+    graph.handler = handler
+    job_id = server._start_job('fanout', {'query': 'ads', 'object_ids': ['as_1', 'as_2', 'as_3']})['id']
+    assert started.wait(5)
+    server.cancel_job(job_id)
+    release.set()
+    job = wait(server, job_id)
+    assert job['status'] == 'cancelled'
+    assert job['checkpoint']['completed'] == ['as_1']
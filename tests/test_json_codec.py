@@ -0,0 +1,16 @@
+import json
+
+import pytest
+
+PAYLOAD = {'data': [{'ad_id': '1', 'name': 'Café', 'spend': '1.5', 'actions': [{'action_type': 'x', 'value': '2'}]}]}
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_codec_round_trips_with_either_backend(server, monkeypatch, use_orjson):
+    if use_orjson and server.orjson is None:
+        pytest.skip('orjson is not installed')
+    if not use_orjson:
+        monkeypatch.setattr(server, 'orjson', None)
+    text = server._json_dumps(PAYLOAD)
+    assert isinstance(text, str) and json.loads(text) == PAYLOAD
+    assert server._json_loads(text) == server._json_loads(text.encode('utf-8')) == PAYLOAD
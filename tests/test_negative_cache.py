@@ -0,0 +1,54 @@
+import pytest
+import requests
+
+from conftest import graph_error
+
+
+def test_deleted_node_fails_locally_until_expiry(server, graph):
+    graph.handler = lambda path, query: graph_error(100, 33, 'Object with ID 123 does not exist')
+    with pytest.raises(requests.exceptions.HTTPError):
+        server._fetch_node('123', fields=['name'])
+    with pytest.raises(server.KnownBadObjectError):
+        server._fetch_node('123', fields=['name'])
+    # Edges of a known-missing object are not requested either
+    with pytest.raises(server.KnownBadObjectError):
+        server._fetch_edge('123', 'ads')
+    assert len(graph.calls) == 1
+
+
+@pytest.mark.parametrize('error', [
+    graph_error(100, 33, 'Unsupported get request'),
+    graph_error(10, message='Application does not have permission for this action'),
+    graph_error(200, message='Requires ads_read permission'),
+])
+def test_edge_errors_do_not_blacklist_the_object(server, graph, error):
+    graph.handler = lambda path, query: error if path.endswith('/activities') else {'id': 'act_1'}
+    with pytest.raises(requests.exceptions.HTTPError):
+        server._fetch_edge('act_1', 'activities')
+    assert server._fetch_node('act_1', fields=['id']) == {'id': 'act_1'}
+    assert server._negative_cache_lookup('act_1') is None
+
+
+def test_permission_errors_on_nodes_are_not_cached(server, graph):
+    graph.handler = lambda path, query: graph_error(200, message='Permissions error')
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            server._fetch_node('123')
+    assert len(graph.calls) == 2
+
+
+def test_multi_id_request_records_the_missing_aliases(server, graph):
+    graph.handler = lambda path, query: graph_error(803, message='Some of the aliases you requested do not exist: 2')
+    with pytest.raises(requests.exceptions.HTTPError):
+        server._make_graph_api_call(f"{server.FB_GRAPH_URL}/", {'ids': '1,2', 'access_token': 'x'})
+    assert server._negative_cache_lookup('2')[0] == 'not_found'
+    assert server._negative_cache_lookup('1') is None
+    assert server._drop_known_bad_ids(['1', '2']) == ['1']
+
+
+def test_success_clears_a_cached_miss(server, graph):
+    server._negative_cache_add('123', 'not_found')
+    server._NEGATIVE_CACHE['123'] = ('not_found', 0)
+    graph.handler = lambda path, query: {'id': '123'}
+    assert server._fetch_node('123') == {'id': '123'}
+    assert server._negative_cache_lookup('123') is None
@@ -0,0 +1,25 @@
+import pytest
+
+ROWS = {'data': [{'account_id': '1', 'impressions': '10', 'spend': '1'}]}
+
+
+@pytest.mark.parametrize('tool_level, plan_level', [('account', None), (None, None), (None, 'account')])
+def test_planner_sees_what_the_insights_tool_cached(server, graph, tool_level, plan_level):
+    graph.handler = lambda path, query: ROWS
+    server.get_adaccount_insights('act_1', level=tool_level)
+    plan = server.plan_insights_query('act_1', level=plan_level)
+    assert plan['strategy'] == 'local_cache'
+    assert plan['estimate']['requests'] == 0
+
+
+def test_ad_level_plan_counts_mirrored_ads(server, graph):
+    server._ACCOUNT_MIRRORS['act_1'] = {
+        'objects': {'campaigns': {}, 'adsets': {}, 'adcreatives': {},
+                    'ads': {str(i): {'id': str(i), 'effective_status': 'ACTIVE'} for i in range(30)}},
+        'watermark': 0, 'synced_at': 0}
+    plan = server.plan_insights_query('act_1', level='ad', time_increment='1',
+                                      time_range={'since': '2024-01-01', 'until': '2024-01-10'})
+    assert plan['level'] == 'ad'
+    assert plan['estimate']['objects'] == 30 and plan['estimate']['object_count_source'] == 'account_mirror'
+    assert plan['estimate']['rows'] == 300
+    assert graph.calls == []
@@ -0,0 +1,16 @@
+from conftest import graph_error
+
+
+def test_previews_are_cached_per_creative_and_format(server, graph):
+    graph.handler = lambda path, query: (
+        graph_error(100, message='Invalid ad_format') if query['ad_format'] == 'BAD'
+        else {'data': [{'body': f"<iframe {path.split('/')[0]} {query['ad_format']}>"}]}
+    )
+    first = server.get_ad_previews(['MOBILE_FEED_STANDARD', 'BAD'], creative_ids=['c1', 'c2'])
+    assert first['previews']['c1'] == {'MOBILE_FEED_STANDARD': '<iframe c1 MOBILE_FEED_STANDARD>'}
+    assert sorted(error['creative_id'] for error in first['errors']) == ['c1', 'c2']
+    assert first['summary'] == {'requested': 4, 'from_cache': 0, 'fetched': 2, 'failed': 2}
+
+    graph.calls.clear()
+    second = server.get_ad_previews(['MOBILE_FEED_STANDARD'], creative_ids=['c1', 'c2'])
+    assert second['summary']['from_cache'] == 2 and graph.calls == []
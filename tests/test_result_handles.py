@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+ROWS = [{'ad_id': str(i), 'spend': str(i), 'name': f"Ad {i}"} for i in range(10)]
+
+
+def test_slices_projects_and_filters_a_stored_result(server):
+    summary = server._store_result('ads', 'act_1', iter(ROWS))
+    assert summary['row_count'] == 10 and summary['columns'] == ['ad_id', 'spend', 'name']
+    assert len(summary['preview']) == server.RESULT_HANDLE_PREVIEW_ROWS
+
+    page = server._read_result(summary['handle'], offset=2, limit=3, columns=['ad_id'])
+    assert page['data'] == [{'ad_id': '2'}, {'ad_id': '3'}, {'ad_id': '4'}]
+    assert page['next_offset'] == 5
+
+    expensive = server._read_result(summary['handle'],
+                                    filters=[{'field': 'spend', 'operator': 'GREATER_THAN', 'value': 7}])
+    assert [row['ad_id'] for row in expensive['data']] == ['8', '9']
+    assert expensive['matched_rows'] == 2 and expensive['next_offset'] is None
+
+
+def test_results_over_the_memory_budget_spill_to_disk(server, monkeypatch):
+    monkeypatch.setattr(server, 'RESULT_STORE_MEMORY_BYTES', 200)
+    first = server._store_result('ads', 'act_1', iter(ROWS))['handle']
+    second = server._store_result('ads', 'act_1', iter(ROWS[:2]))['handle']
+    spilled = server._RESULT_HANDLES[first]
+    assert spilled['rows'] is None and os.path.exists(spilled['path'])
+    assert server._RESULT_HANDLES[second]['rows'] is not None
+    assert server._read_result(first, offset=9)['data'] == [ROWS[9]]
+
+
+def test_least_recently_used_results_are_dropped_past_the_total_budget(server, monkeypatch):
+    monkeypatch.setattr(server, 'RESULT_STORE_MAX_BYTES', 600)
+    old = server._store_result('ads', 'act_1', iter(ROWS))['handle']
+    server._store_result('ads', 'act_1', iter(ROWS))
+    with pytest.raises(Exception, match='Unknown or expired'):
+        server._read_result(old)
@@ -0,0 +1,48 @@
+DAILY_AD_ROWS = {'data': [
+    {'campaign_id': 'c1', 'ad_id': 'a1', 'impressions': '100', 'clicks': '5', 'spend': '2.5',
+     'actions': [{'action_type': 'purchase', 'value': '1'}], 'date_start': '2024-01-01', 'date_stop': '2024-01-01'},
+    {'campaign_id': 'c1', 'ad_id': 'a2', 'impressions': '300', 'clicks': '15', 'spend': '7.5',
+     'actions': [{'action_type': 'purchase', 'value': '3'}], 'date_start': '2024-01-02', 'date_stop': '2024-01-02'},
+    {'campaign_id': 'c2', 'ad_id': 'a3', 'impressions': '50', 'clicks': '0', 'spend': '1',
+     'actions': [], 'date_start': '2024-01-02', 'date_stop': '2024-01-02'},
+]}
+FIELDS = ['campaign_id', 'ad_id', 'impressions', 'clicks', 'spend', 'actions']
+TIME_RANGE = {'since': '2024-01-01', 'until': '2024-01-02'}
+
+
+def load_daily_ad_rows(server, graph):
+    graph.handler = lambda path, query: DAILY_AD_ROWS
+    server.get_adaccount_insights('act_1', fields=FIELDS, level='ad', time_range=TIME_RANGE, time_increment='1')
+    assert len(graph.calls) == 1
+
+
+def test_coarser_query_is_rolled_up_from_cached_rows(server, graph):
+    load_daily_ad_rows(server, graph)
+    result = server.get_adaccount_insights(
+        'act_1', fields=['campaign_id', 'impressions', 'ctr', 'cost_per_action_type'],
+        level='campaign', time_range=TIME_RANGE, time_increment='all_days'
+    )
+    assert len(graph.calls) == 1
+    by_campaign = {row['campaign_id']: row for row in result['data']}
+    assert by_campaign['c1']['impressions'] == '400'
+    assert by_campaign['c1']['ctr'] == '5'
+    assert by_campaign['c1']['cost_per_action_type'] == [{'action_type': 'purchase', 'value': '2.5'}]
+    assert by_campaign['c1']['date_start'] == '2024-01-01' and by_campaign['c1']['date_stop'] == '2024-01-02'
+    assert by_campaign['c2']['ctr'] == '0'
+
+
+def test_sub_range_of_daily_rows_is_served_locally(server, graph):
+    load_daily_ad_rows(server, graph)
+    result = server.get_adaccount_insights(
+        'act_1', fields=['impressions', 'spend'], level='account',
+        time_range={'since': '2024-01-02', 'until': '2024-01-02'}, time_increment='all_days'
+    )
+    assert len(graph.calls) == 1
+    assert result['data'] == [{'impressions': '350', 'spend': '8.5', 'date_start': '2024-01-02', 'date_stop': '2024-01-02'}]
+
+
+def test_non_additive_metrics_go_to_the_api(server, graph):
+    load_daily_ad_rows(server, graph)
+    server.get_adaccount_insights('act_1', fields=['campaign_id', 'reach'], level='campaign',
+                                  time_range=TIME_RANGE, time_increment='all_days')
+    assert len(graph.calls) == 2
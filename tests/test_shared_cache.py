@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from conftest import TOKEN
+
+
+@pytest.fixture
+def shared(server, monkeypatch):
+    monkeypatch.setattr(server, 'SHARED_CACHE_ENABLED', True)
+    monkeypatch.setattr(server, 'SHARED_CACHE_POLL_SECONDS', 0.01)
+    return server
+
+
+def test_token_is_not_stored(shared):
+    value = {'paging': {'next': f"https://graph.facebook.com/v22.0/act_1/insights?access_token={TOKEN}&after=x"}}
+    shared._shared_cache_put('insights:k', value, time.time() + 60, 'act_1', ['c1'])
+
+    db = sqlite3.connect(f"{shared._get_state_dir()}/{shared.SHARED_CACHE_FILE}")
+    assert TOKEN not in db.execute('SELECT value FROM entries').fetchone()[0]
+    assert shared._shared_cache_get('insights:k') == value
+    assert shared._shared_cache_scan('insights:') == {'insights:k': value}
+
+
+def test_entries_expire_and_are_evicted_by_dependency(shared):
+    shared._shared_cache_put('insights:old', 1, time.time() - 1)
+    shared._shared_cache_put('insights:a', 2, time.time() + 60, 'act_1', ['c1'])
+    shared._shared_cache_put('insights:b', 3, time.time() + 60, 'act_2', ['c2'])
+    assert shared._shared_cache_get('insights:old') is None
+
+    assert shared._shared_cache_evict('insights:', object_ids=['c1']) == 1
+    assert shared._shared_cache_scan('insights:') == {'insights:b': 3}
+    assert shared._shared_cache_evict('insights:', act_id='act_2') == 1
+
+
+def test_only_one_caller_loads_a_key(shared):
+    loads, results = [], []
+    started = threading.Event()
+
+    def load():
+        loads.append(1)
+        started.set()
+        time.sleep(0.2)
+        shared._shared_cache_put('k', 'value', time.time() + 60)
+        return 'value'
+
+    def call():
+        results.append(shared._shared_singleflight('k', lambda: shared._shared_cache_get('k'), load))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)  # A different thread owns a different lease
+    follower.start()
+    leader.join()
+    follower.join()
+    assert loads == [1] and results == ['value', 'value']
+
+
+def test_expired_lease_is_taken_over(shared, monkeypatch):
+    assert shared._shared_lease('k')
+    monkeypatch.setattr(shared.os, 'getpid', lambda: 1)  # Another process
+    assert not shared._shared_lease('k')
+    now = time.time()
+    monkeypatch.setattr(shared.time, 'time', lambda: now + shared.SHARED_CACHE_LEASE_SECONDS + 1)
+    assert shared._shared_lease('k')
+
+
+def test_waiting_for_a_mirror_lease_blocks_only_that_account(shared, graph, monkeypatch):
+    graph.handler = lambda path, query: {'data': [{'id': '9', 'name': 'C', 'account_id': '1'}]
+                                         if path == 'act_1/campaigns' else []}
+    with monkeypatch.context() as other_process:
+        other_process.setattr(shared.os, 'getpid', lambda: 1)
+        assert shared._shared_lease('mirror:act_1')
+    shared._ACCOUNT_MIRRORS['act_2'] = {
+        'objects': {edge: {} for edge in shared.MIRROR_EDGES}, 'watermark': 0, 'synced_at': time.time()}
+
+    waiting = threading.Thread(target=shared._sync_account_mirror, args=('act_1',))
+    waiting.start()
+    time.sleep(0.1)
+    finished = []
+    reader = threading.Thread(target=lambda: finished.append(
+        shared._read_from_mirror('act_2', 'campaigns', None, None, None, None, None)))
+    reader.start()
+    reader.join(2)
+    assert finished == [{'data': [], 'paging': {'cursors': {'before': 'mirror:0'}}}]
+    assert waiting.is_alive()
+
+    db = sqlite3.connect(f"{shared._get_state_dir()}/{shared.SHARED_CACHE_FILE}")
+    with db:
+        db.execute('DELETE FROM leases')
+    waiting.join(5)
+    assert list(shared._ACCOUNT_MIRRORS['act_1']['objects']['campaigns']) == ['9']
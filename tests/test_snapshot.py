@@ -0,0 +1,47 @@
+import gzip
+import importlib
+import threading
+import time
+
+from conftest import TOKEN
+
+
+def test_caches_survive_a_restart_without_writing_the_token(server, graph):
+    graph.handler = lambda path, query: {'data': [{'ad_id': '7', 'account_id': '1', 'impressions': '10'}],
+                                         'paging': {'next': f"https://x/?access_token={TOKEN}&after=1"}}
+    response = server._cached_insights_call('act_1', f"{server.FB_GRAPH_URL}/act_1/insights", {'level': 'ad'})
+    server._ACCOUNT_MIRRORS['act_1'] = {'objects': {edge: {} for edge in server.MIRROR_EDGES},
+                                        'watermark': 1, 'synced_at': time.time()}
+    server._ACCOUNT_MIRRORS['act_1']['objects']['ads']['7'] = {'id': '7'}
+    path = server._save_cache_snapshot()['path']
+    with open(path, 'rb') as f:
+        assert TOKEN.encode() not in gzip.decompress(f.read())
+
+    state_dir = server.STATE_DIR
+    restarted = importlib.reload(server)
+    restarted.STATE_DIR = state_dir
+    restored = restarted._restore_cache_snapshot()
+    assert restored['responses'] == 1 and restored['mirrors'] == 1
+    assert list(restarted._RESPONSE_CACHE.values())[0]['response'] == response
+    assert restarted._ACCOUNT_MIRRORS['act_1']['objects']['ads'] == {'7': {'id': '7'}}
+
+
+def test_busy_mirrors_do_not_hold_up_the_snapshot(server, monkeypatch):
+    monkeypatch.setattr(server, 'SNAPSHOT_LOCK_TIMEOUT_SECONDS', 0.1)
+    server._ACCOUNT_MIRRORS['act_1'] = {'objects': {edge: {} for edge in server.MIRROR_EDGES},
+                                        'watermark': 1, 'synced_at': time.time()}
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with server._MIRROR_LOCK:
+            held.set()
+            release.wait(5)
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait()
+    try:
+        assert server._collect_cache_snapshot()['mirrors'] == {}
+    finally:
+        release.set()
+        holder.join()
+    assert list(server._collect_cache_snapshot()['mirrors']) == ['act_1']
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+import requests
+
+from conftest import FakeResponse, graph_error
+
+ROWS = [{'ad_id': str(i), 'ad_name': 'Café ☕ ' * i, 'impressions': str(i * 10)} for i in range(40)]
+
+
+def stream(server):
+    rows = []
+    generator = server._stream_graph_page(f"{server.FB_GRAPH_URL}/act_1/insights", {})
+    while True:
+        try:
+            rows.append(next(generator))
+        except StopIteration as stop:
+            return rows, stop.value
+
+
+@pytest.mark.parametrize('chunk_bytes', [1, 7, 64 * 1024])
+def test_rows_decode_across_any_chunk_boundary(server, graph, monkeypatch, chunk_bytes):
+    monkeypatch.setattr(server, 'STREAM_CHUNK_BYTES', chunk_bytes)
+    body = {'data': ROWS, 'paging': {'cursors': {'after': 'x'}}, 'summary': {'total': 40}}
+    raw = json.dumps(body, ensure_ascii=False, indent=1).encode('utf-8')  # Multi-byte characters split too
+    graph.handler = lambda path, query: FakeResponse(raw)
+    rows, envelope = stream(server)
+    assert rows == ROWS
+    assert envelope == {'paging': {'cursors': {'after': 'x'}}, 'summary': {'total': 40}}
+
+
+def test_truncated_response_raises(server, graph):
+    response = FakeResponse({'data': ROWS})
+    response.content = response.content[:-20]
+    graph.handler = lambda path, query: response
+    with pytest.raises(ValueError):
+        stream(server)
+
+
+def test_export_reports_pages(server, graph, tmp_path):
+    def handler(path, query):
+        if query.get('after') == '2':
+            return {'data': ROWS[20:]}
+        return {'data': ROWS[:20], 'paging': {'next': f"{server.FB_GRAPH_URL}/act_1/campaigns?after=2"}}
+    graph.handler = handler
+    result = server._export_query('campaigns', 'act_1', {'fields': ['ad_id']}, output_path=str(tmp_path / 'c.ndjson'))
+    assert result['pages'] == 2 and result['row_count'] == 40
+    assert [json.loads(line) for line in open(tmp_path / 'c.ndjson')] == ROWS
+
+
+def test_errors_are_logged_to_stderr_without_the_token(server, graph, capsys):
+    graph.handler = lambda path, query: graph_error(100, message='Invalid parameter')
+    with pytest.raises(requests.exceptions.HTTPError):
+        list(server._stream_graph_page(f"{server.FB_GRAPH_URL}/act_1/insights", {'access_token': 'SECRET'}))
+    captured = capsys.readouterr()
+    assert 'Error making Graph API call' in captured.err
+    assert 'Error making Graph API call' not in captured.out
+    assert 'SECRET' not in captured.err
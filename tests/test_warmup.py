@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+
+def test_warmup_is_off_unless_requested(server, monkeypatch):
+    assert server._warmup_config()['enabled'] is False
+    monkeypatch.setattr(sys, 'argv', sys.argv + ['--warmup'])
+    assert server._warmup_config()['enabled'] is True
+
+
+def test_no_warmup_overrides_the_config_file(server, monkeypatch):
+    with open(os.path.join(server._get_state_dir(), server.WARMUP_CONFIG_FILE), 'w') as f:
+        json.dump({'enabled': True}, f)
+    assert server._warmup_config()['enabled'] is True
+    monkeypatch.setattr(sys, 'argv', sys.argv + ['--no-warmup'])
+    assert server._warmup_config()['enabled'] is False
+
+
+def test_account_spend_is_never_served_from_the_entity_store(server, graph):
+    graph.handler = lambda path, query: {
+        'id': 'act_1', 'account_id': '1', 'name': 'Shop', 'amount_spent': str(len(graph.calls))
+    }
+    first = server.get_details_of_ad_account('act_1', fields=['name', 'amount_spent'])
+    second = server.get_details_of_ad_account('act_1', fields=['name', 'amount_spent'])
+    assert (first['amount_spent'], second['amount_spent']) == ('1', '2')
+    # Fields that do not move with spend are still answered locally
+    assert server.get_details_of_ad_account('act_1', fields=['name']) == {'id': 'act_1', 'name': 'Shop'}
+    assert len(graph.calls) == 2
+
+
+def test_warmed_account_details_are_served_locally(server, graph):
+    graph.handler = lambda path, query: {'id': 'act_1', 'account_id': '1', 'name': 'Shop', 'currency': 'EUR'}
+    config = dict(server.WARMUP_DEFAULTS, accounts=['act_1'], mirror=False)
+    assert server._run_warmup(config)['items'] == {'account:act_1': 'ok'}
+    assert 'balance' not in graph.calls[0][1]['fields'].split(',')
+
+    graph.calls.clear()
+    details = server.get_details_of_ad_account('act_1', fields=['name', 'currency'])
+    assert details == {'id': 'act_1', 'name': 'Shop', 'currency': 'EUR'}
+    assert graph.calls == []
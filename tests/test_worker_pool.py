@@ -0,0 +1,22 @@
+class FakeProcess:
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+def test_exited_workers_are_restarted(server):
+    processes = [FakeProcess(), FakeProcess(returncode=-9)]
+    started_at = [0.0, 0.0]
+    assert server._restart_exited_workers(processes, started_at, lambda index: FakeProcess()) == [1]
+    assert processes[1].poll() is None
+    assert started_at[1] > 0
+
+
+def test_a_worker_failing_on_start_is_not_restarted_in_a_loop(server):
+    processes = [FakeProcess(returncode=1)]
+    started_at = [server.time.time()]
+    assert server._restart_exited_workers(processes, started_at, lambda index: FakeProcess()) == []
+    started_at[0] -= server.WORKER_RESTART_DELAY_SECONDS
+    assert server._restart_exited_workers(processes, started_at, lambda index: FakeProcess()) == [0]